@@ -0,0 +1,484 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Sequence, TypeVar
+
+import numba
+import numpy
+import numpy.typing as npt
+import pandas
+
+from recval import __version__
+from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL, SEED
+from recval.evaluator import EvalBackend, RecEvaluator
+from recval.holdout import HoldoutIndex
+from recval.metrics.metrics_utils import get_hit_rank_cutoffs
+from recval.profiling import memory_usage, reset_peak_rss
+from recval.utils import get_topk
+
+T = TypeVar("T")
+
+# metrics evaluated together by each benchmark case
+METRIC_SETS: dict[str, list[str]] = {
+    "accuracy": ["recall", "precision", "f1_score", "hit_rate"],
+    "ranking": ["ndcg", "map", "mrr", "r_precision"],
+}
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    """Synthetic dataset size and evaluator configuration of a benchmark case
+
+    Attributes:
+        n_users (int): number of users, one score row each.
+        n_items (int): number of items, one score column each.
+        cutoffs (tuple[int, ...]): cutoffs of the evaluator.
+        metric_set (str): name of the metrics evaluated, a key of `METRIC_SETS`.
+        backend (str): backend of the evaluator.
+    """
+
+    n_users: int
+    n_items: int
+    cutoffs: tuple[int, ...]
+    metric_set: str
+    backend: str
+
+    @property
+    def name(self) -> str:
+        """Unique name of the case, used to match it against the baseline"""
+        cutoffs = "_".join(str(cutoff) for cutoff in self.cutoffs)
+        return (
+            f"{self.backend}-{self.metric_set}-u{self.n_users}-i{self.n_items}"
+            f"-k{cutoffs}"
+        )
+
+
+@dataclass
+class StageTiming:
+    """Cost of a stage
+
+    Attributes:
+        wall_time (float): fastest wall time over the repeats, in seconds.
+        peak_rss_mb (float): largest resident set size of the process while running the stage, in MiB.
+        rss_increase_mb (float): largest increase of the resident set size over its value at the start of
+            the stage, in MiB, the memory the stage itself allocates.
+    """
+
+    wall_time: float
+    peak_rss_mb: float
+    rss_increase_mb: float
+
+
+@dataclass
+class BenchmarkResult:
+    """Stage timings of a benchmark case
+
+    Attributes:
+        case (BenchmarkCase): benchmarked case.
+        stages (dict[str, StageTiming]): cost of each stage, by name: building the holdout index, `get_topk`,
+            `recs_from_scores`, the hits of the backend and the `eval_from_scores` and `eval_from_recs` entry
+            points.
+    """
+
+    case: BenchmarkCase
+    stages: dict[str, StageTiming] = field(default_factory=dict)
+
+
+@dataclass
+class Regression:
+    """Measure of a stage worse than its baseline
+
+    Attributes:
+        case (str): name of the case.
+        stage (str): name of the stage.
+        measure (str): either `wall_time` or `rss_increase_mb`.
+        baseline (float): value in the baseline.
+        current (float): value in the current results.
+    """
+
+    case: str
+    stage: str
+    measure: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        """Current value relative to the baseline"""
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.case} {self.stage} {self.measure}: "
+            f"{self.baseline:.4g} -> {self.current:.4g} ({self.ratio:.2f}x)"
+        )
+
+
+def synthetic_data(
+    n_users: int,
+    n_items: int,
+    max_holdout: int = 20,
+    exponent: float = 1.0,
+    seed: int = SEED,
+) -> tuple[npt.NDArray[numpy.float32], pandas.DataFrame]:
+    """Draw scores and holdout data with power-law item popularity and user activity
+
+    The popularity of the item of rank r is proportional to r^-exponent, holdout items are drawn without
+    replacement following it through the Gumbel top-k trick. Scores are the log popularity plus independent
+    Gumbel noise, as a popularity-biased model would estimate, so that hits are skewed towards the head
+    items like on real data. The holdout size of the user of rank r is proportional to r^-exponent too,
+    between 1 and max_holdout.
+
+    Args:
+        n_users (int): number of users, ids from 0 to n_users - 1.
+        n_items (int): number of items, ids from 0 to n_items - 1.
+        max_holdout (int, optional): largest number of holdout items of a user. Defaults to 20.
+        exponent (float, optional): exponent of the power laws. Defaults to 1.0.
+        seed (int, optional): seed of the random generator. Defaults to `SEED`.
+
+    Returns:
+        tuple[npt.NDArray[numpy.float32], pandas.DataFrame]: (n_users, n_items) scores and holdout dataframe,
+        one row for each user-item pair.
+    """
+    rng = numpy.random.default_rng(seed)
+    max_holdout = min(max_holdout, n_items)
+    log_popularity = -exponent * numpy.log(numpy.arange(1, n_items + 1))
+    log_popularity = log_popularity[rng.permutation(n_items)].astype(numpy.float32)
+
+    keys = log_popularity + rng.gumbel(size=(n_users, n_items)).astype(numpy.float32)
+    holdout_items = numpy.argpartition(-keys, max_holdout - 1, axis=1)[:, :max_holdout]
+    del keys
+    activity = max_holdout * numpy.arange(1, n_users + 1) ** -exponent
+    n_holdout = numpy.maximum(1, activity.astype(numpy.int64))[rng.permutation(n_users)]
+    mask = numpy.arange(max_holdout) < n_holdout[:, None]
+    holdout_df = pandas.DataFrame(
+        {
+            DEFAULT_USER_COL: numpy.repeat(numpy.arange(n_users), n_holdout),
+            DEFAULT_ITEM_COL: holdout_items[mask],
+        }
+    )
+
+    scores = rng.gumbel(size=(n_users, n_items)).astype(numpy.float32)
+    scores += log_popularity
+    return scores, holdout_df
+
+
+def benchmark_cases(
+    n_users: Sequence[int],
+    n_items: Sequence[int],
+    cutoffs: Sequence[Sequence[int]],
+    metric_sets: Sequence[str],
+    backends: Sequence[str],
+) -> list[BenchmarkCase]:
+    """Cases of the sweep over every combination of the given values
+
+    Args:
+        n_users (Sequence[int]): numbers of users.
+        n_items (Sequence[int]): numbers of items.
+        cutoffs (Sequence[Sequence[int]]): cutoffs of the evaluator.
+        metric_sets (Sequence[str]): names of the metric sets, keys of `METRIC_SETS`.
+        backends (Sequence[str]): backends of the evaluator.
+
+    Returns:
+        list[BenchmarkCase]: one case for each combination, sharing the datasets of consecutive cases.
+    """
+    for metric_set in metric_sets:
+        if metric_set not in METRIC_SETS:
+            raise ValueError(
+                f"Metric set {metric_set} is not supported, available ones are: {list(METRIC_SETS)}"
+            )
+    return [
+        BenchmarkCase(
+            n_users=users,
+            n_items=items,
+            cutoffs=tuple(case_cutoffs),
+            metric_set=metric_set,
+            backend=EvalBackend(backend),
+        )
+        for users, items, case_cutoffs, metric_set, backend in itertools.product(
+            n_users, n_items, cutoffs, metric_sets, backends
+        )
+    ]
+
+
+def run_case(
+    case: BenchmarkCase,
+    data: tuple[npt.NDArray[numpy.float32], pandas.DataFrame] | None = None,
+    repeat: int = 3,
+) -> BenchmarkResult:
+    """Time every stage of the evaluation of a case
+
+    Args:
+        case (BenchmarkCase): case to benchmark.
+        data (tuple[npt.NDArray[numpy.float32], pandas.DataFrame] | None, optional): scores and holdout
+            dataframe of the case. Defaults to None, drawn with `synthetic_data`.
+        repeat (int, optional): number of runs of each stage, the fastest one is kept. Defaults to 3.
+
+    Returns:
+        BenchmarkResult: timings of the stages.
+    """
+    scores, holdout_df = (
+        synthetic_data(case.n_users, case.n_items) if data is None else data
+    )
+    user_ids = numpy.arange(case.n_users)
+    evaluator = RecEvaluator(
+        metrics=METRIC_SETS[case.metric_set],
+        cutoffs=list(case.cutoffs),
+        backend=case.backend,
+    )
+    result = BenchmarkResult(case=case)
+
+    holdout, result.stages["holdout_index"] = _measure(
+        lambda: HoldoutIndex.from_frame(holdout_df), repeat
+    )
+    top_items, result.stages["get_topk"] = _measure(
+        lambda: get_topk(scores, k=evaluator.max_cutoff)[0], repeat
+    )
+    recs_df, result.stages["recs_from_scores"] = _measure(
+        lambda: RecEvaluator.recs_from_scores(
+            scores, cutoff=evaluator.max_cutoff, user_ids=user_ids
+        ),
+        repeat,
+    )
+    if case.backend == EvalBackend.PANDAS:
+        _, result.stages["hits"] = _measure(
+            lambda: list(
+                get_hit_rank_cutoffs(holdout_df, recs_df, sorted(case.cutoffs))
+            ),
+            repeat,
+        )
+    else:
+        _, result.stages["hits"] = _measure(
+            lambda: holdout.hit_matrix(top_items, rows=holdout.user_rows(user_ids)),
+            repeat,
+        )
+    _, result.stages["eval_from_scores"] = _measure(
+        lambda: evaluator.eval_from_scores(
+            scores, holdout, user_ids=user_ids, verbose=False
+        ),
+        repeat,
+    )
+    _, result.stages["eval_from_recs"] = _measure(
+        lambda: evaluator.eval_from_recs(recs_df, holdout, verbose=False), repeat
+    )
+    return result
+
+
+def run_benchmarks(
+    cases: Sequence[BenchmarkCase], repeat: int = 3
+) -> list[BenchmarkResult]:
+    """Benchmark every case, drawing the dataset of each size only once
+
+    Args:
+        cases (Sequence[BenchmarkCase]): cases to benchmark.
+        repeat (int, optional): number of runs of each stage, the fastest one is kept. Defaults to 3.
+
+    Returns:
+        list[BenchmarkResult]: timings of each case, in the same order.
+    """
+    results = []
+    data_size: tuple[int, int] | None = None
+    data = None
+    for case in cases:
+        if data_size != (case.n_users, case.n_items):
+            data = None
+            gc.collect()
+            data_size = (case.n_users, case.n_items)
+            data = synthetic_data(case.n_users, case.n_items)
+        logging.info("Benchmarking %s", case.name)
+        results.append(run_case(case, data=data, repeat=repeat))
+    return results
+
+
+def environment_info() -> dict[str, Any]:
+    """Versions and hardware the benchmarks run on, stored alongside the results
+
+    Returns:
+        dict[str, Any]: description of the environment.
+    """
+    return {
+        "recval": __version__,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "numba": numba.__version__,
+        "platform": platform.platform(),
+        "processor": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numba_threads": numba.get_num_threads(),
+    }
+
+
+def results_to_json(results: Sequence[BenchmarkResult]) -> dict[str, Any]:
+    """Machine-readable benchmark report
+
+    Args:
+        results (Sequence[BenchmarkResult]): timings of the cases.
+
+    Returns:
+        dict[str, Any]: environment and stage timings of each case, by case name.
+    """
+    return {
+        "environment": environment_info(),
+        "cases": {result.case.name: asdict(result) for result in results},
+    }
+
+
+def compare_to_baseline(
+    report: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float = 0.25,
+    min_wall_time: float = 0.01,
+    min_rss_increase_mb: float = 1.0,
+) -> list[Regression]:
+    """Find the stages slower or using more memory than in the baseline
+
+    Cases or stages missing from either report are skipped, so that the sweep can grow over time.
+
+    Args:
+        report (dict[str, Any]): current report, see `results_to_json`.
+        baseline (dict[str, Any]): baseline report.
+        tolerance (float, optional): relative increase allowed over the baseline. Defaults to 0.25.
+        min_wall_time (float, optional): absolute wall time increase, in seconds, below which a slowdown is
+            considered noise. Defaults to 0.01.
+        min_rss_increase_mb (float, optional): absolute memory increase, in MiB, below which a larger
+            allocation is considered noise. Defaults to 1.0.
+
+    Returns:
+        list[Regression]: regressed measures.
+    """
+    regressions = []
+    for name, case in report["cases"].items():
+        baseline_case = baseline["cases"].get(name)
+        if baseline_case is None:
+            continue
+        for stage, timing in case["stages"].items():
+            baseline_timing = baseline_case["stages"].get(stage)
+            if baseline_timing is None:
+                continue
+            for measure, min_increase in (
+                ("wall_time", min_wall_time),
+                ("rss_increase_mb", min_rss_increase_mb),
+            ):
+                current, previous = timing[measure], baseline_timing[measure]
+                if (
+                    current > previous * (1 + tolerance)
+                    and current - previous > min_increase
+                ):
+                    regressions.append(
+                        Regression(
+                            case=name,
+                            stage=stage,
+                            measure=measure,
+                            baseline=previous,
+                            current=current,
+                        )
+                    )
+    return regressions
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Command line entry point, `python -m recval.benchmark --help`
+
+    Args:
+        argv (Sequence[str] | None, optional): command line arguments. Defaults to None, read from sys.argv.
+
+    Returns:
+        int: exit code, 1 when a regression against the baseline is found.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m recval.benchmark",
+        description="Benchmark RecEvaluator on synthetic power-law datasets",
+    )
+    parser.add_argument("--n-users", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--n-items", type=int, nargs="+", default=[1_000, 5_000])
+    parser.add_argument(
+        "--cutoffs",
+        type=lambda value: [int(cutoff) for cutoff in value.split(",")],
+        nargs="+",
+        default=[[10], [5, 10, 20]],
+        help="comma-separated cutoffs of each evaluator, e.g. 5,10,20",
+    )
+    parser.add_argument(
+        "--metric-sets", nargs="+", choices=list(METRIC_SETS), default=list(METRIC_SETS)
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=[str(backend) for backend in EvalBackend],
+        default=[str(backend) for backend in EvalBackend],
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="path of the JSON report")
+    parser.add_argument("--baseline", help="path of the JSON report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    cases = benchmark_cases(
+        n_users=args.n_users,
+        n_items=args.n_items,
+        cutoffs=args.cutoffs,
+        metric_sets=args.metric_sets,
+        backends=args.backends,
+    )
+    report = results_to_json(run_benchmarks(cases, repeat=args.repeat))
+    for name, case in report["cases"].items():
+        stages = ", ".join(
+            f"{stage} {timing['wall_time']:.3f}s/+{timing['rss_increase_mb']:.0f}MiB"
+            for stage, timing in case["stages"].items()
+        )
+        print(f"{name}: {stages}")
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    if args.baseline is None:
+        return 0
+    with open(args.baseline, encoding="utf-8") as file:
+        regressions = compare_to_baseline(
+            report, json.load(file), tolerance=args.tolerance
+        )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+def _measure(func: Callable[[], T], repeat: int) -> tuple[T, StageTiming]:
+    """Run a stage repeatedly, measuring its fastest wall time and largest RSS
+
+    Args:
+        func (Callable[[], T]): stage to run.
+        repeat (int): number of runs.
+
+    Returns:
+        tuple[T, StageTiming]: output of the last run and cost of the stage.
+    """
+    wall_time, peak_rss, rss_increase = float("inf"), 0, 0
+    for _ in range(repeat):
+        gc.collect()
+        reset_peak_rss()
+        start_rss = memory_usage()[1]
+        start = time.perf_counter()
+        output = func()
+        wall_time = min(wall_time, time.perf_counter() - start)
+        stage_peak_rss = memory_usage()[1]
+        peak_rss = max(peak_rss, stage_peak_rss)
+        rss_increase = max(rss_increase, stage_peak_rss - start_rss)
+    return output, StageTiming(
+        wall_time=wall_time,
+        peak_rss_mb=peak_rss / 2**20,
+        rss_increase_mb=rss_increase / 2**20,
+    )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
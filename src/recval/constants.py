@@ -16,3 +16,21 @@ COL_DICT = {
 DEFAULT_K = 10
 DEFAULT_THRESHOLD = 10
 SEED = 2022
+
+# Evaluation variables
+DEFAULT_BATCH_SIZE = 10_000
+# bytes of memory-mapped scores read at once
+MMAP_BLOCK_BYTES = 64 * 2**20
+# bytes of argpartition indices computed at once, sized on the L2 cache
+TOPK_TILE_BYTES = 2**20
+# minimum number of scores for which the auto top-k engine picks numba
+AUTO_NUMBA_MIN_SIZE = 2**20
+# segment label of the results over all the users
+GLOBAL_SEGMENT = "all"
+# user shards assigned to each worker process, to balance the load across them
+SHARDS_PER_JOB = 4
+# bytes of bootstrap weights drawn at once
+BOOTSTRAP_BLOCK_BYTES = 64 * 2**20
+DEFAULT_N_RESAMPLES = 1000
+# rows of each record batch streamed from Parquet files
+PARQUET_BATCH_ROWS = 2**17
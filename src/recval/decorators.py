@@ -3,22 +3,25 @@ import time
 from functools import wraps
 from typing import Any, Callable, ParamSpec, TypeVar
 
+from .profiling import stage
+
 T = TypeVar("T")
 P = ParamSpec("P")
 
 
 def timeit(func: Callable[P, T]) -> Callable[P, T]:
     """
-    Measures execution time of a function.
+    Measures execution time of a function, recorded as a stage of the active profile.
     """
 
     @wraps(func)
     def timeit_wrapper(*args: Any, **kwargs: Any) -> T:
         start_time = time.perf_counter()
-        result = func(*args, **kwargs)
+        with stage(func.__name__):
+            result = func(*args, **kwargs)
         end_time = time.perf_counter()
         total_time = end_time - start_time
-        logging.debug("Function %s Took %.2f seconds", func.__name__, total_time)
+        logging.debug("Function %s Took %.4f seconds", func.__name__, total_time)
         return result
 
     return timeit_wrapper
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+
+import numpy
+import numpy.typing as npt
+import pandas
+
+
+def code_dtype(n_codes: int) -> numpy.dtype[Any]:
+    """Smallest signed integer dtype holding codes in [0, n_codes) plus the -1 padding, at least int32
+
+    Args:
+        n_codes (int): number of distinct codes, such as the number of users or items.
+
+    Returns:
+        numpy.dtype[Any]: int32, or int64 for more than 2^31 - 1 codes.
+    """
+    if n_codes <= numpy.iinfo(numpy.int32).max:
+        return numpy.dtype(numpy.int32)
+    return numpy.dtype(numpy.int64)
+
+
+def rank_dtype(max_rank: int) -> numpy.dtype[Any]:
+    """Smallest signed integer dtype holding ranks up to max_rank, at least int16
+
+    Args:
+        max_rank (int): largest rank, the largest cutoff.
+
+    Returns:
+        numpy.dtype[Any]: int16, or int32 for ranks above 32767.
+    """
+    if max_rank <= numpy.iinfo(numpy.int16).max:
+        return numpy.dtype(numpy.int16)
+    return numpy.dtype(numpy.int32)
+
+
+@dataclass(frozen=True)
+class IdEncoder:
+    """Map external ids, integers or strings, to dense integer codes and back
+
+    The code of an id is its position in ids, codes use the smallest dtype from `code_dtype`, hence the
+    pipeline can carry compact codes and decode them only when results are reported.
+
+    Attributes:
+        ids (npt.NDArray[numpy.generic]): unique ids, the id of each code.
+    """
+
+    ids: npt.NDArray[numpy.generic]
+
+    def __post_init__(self) -> None:
+        if not self.index.is_unique:
+            raise ValueError("ids have to be unique to be encoded")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @cached_property
+    def index(self) -> pandas.Index:
+        """Index of the ids, its hash table is built once and reused by every lookup"""
+        return pandas.Index(self.ids)
+
+    @property
+    def dtype(self) -> numpy.dtype[Any]:
+        """dtype of the codes"""
+        return code_dtype(len(self))
+
+    def encode(
+        self, values: npt.ArrayLike | pandas.Series, strict: bool = True
+    ) -> npt.NDArray[numpy.int_]:
+        """Codes of the given ids
+
+        Args:
+            values (npt.ArrayLike | pandas.Series): ids to encode.
+            strict (bool, optional): whether unknown ids raise, otherwise they are coded as -1.
+                Defaults to True.
+
+        Returns:
+            npt.NDArray[numpy.int_]: code of each id, in the dtype of the encoder.
+        """
+        codes: npt.NDArray[numpy.int_] = self.index.get_indexer(values).astype(
+            self.dtype, copy=False
+        )
+        if strict and (codes < 0).any():
+            raise ValueError("Some ids to encode are unknown to the encoder")
+        return codes
+
+    def decode(self, codes: npt.NDArray[numpy.int_]) -> npt.NDArray[numpy.generic]:
+        """Ids of the given codes
+
+        Args:
+            codes (npt.NDArray[numpy.int_]): codes to decode, without -1.
+
+        Returns:
+            npt.NDArray[numpy.generic]: id of each code.
+        """
+        return self.ids[codes]
@@ -1,122 +1,415 @@
+# pylint: disable=too-many-lines
 from __future__ import annotations
 
 import logging
 from dataclasses import dataclass, field
+from functools import wraps
+from typing import (
+    Any,
+    Callable,
+    Concatenate,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    ParamSpec,
+    TypeAlias,
+)
 
 import numpy
 import numpy.typing as npt
 import pandas
+from strenum import StrEnum
 
-from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+from recval.constants import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_ITEM_COL,
+    DEFAULT_N_RESAMPLES,
+    DEFAULT_USER_COL,
+    GLOBAL_SEGMENT,
+    PARQUET_BATCH_ROWS,
+    SEED,
+)
+from recval.encoding import IdEncoder, code_dtype, rank_dtype
+from recval.holdout import HoldoutIndex
+from recval.metrics.context import MetricContext
 from recval.metrics.metric_interface import MetricInterface
-from recval.metrics.metrics_utils import get_hit_rank
-from recval.utils import get_topk
+from recval.metrics.metrics_utils import HitMatrix, get_hit_rank_cutoffs
+from recval.parallel import resolve_n_jobs, sharded_metric_sums
+from recval.parquet import ParquetSource, read_recs_parquet
+from recval.profiling import ProfileHook, active_profile, profiled, stage
+from recval.stats import (
+    ResamplingMethod,
+    bootstrap_ci,
+    paired_bootstrap_test,
+    paired_ttest,
+    wilcoxon_test,
+)
+from recval.utils import CSRLike, ScoresLike, TopkEngine, get_topk, load_scores
 
 from .decorators import timeit
 from .metrics import MetricFactory
 
+# user ids and their estimated scores
+ScoreBatch: TypeAlias = tuple[
+    npt.NDArray[numpy.int_] | list[int], npt.NDArray[numpy.float_]
+]
+
+# ground truth data, either long-format, a sparse CSR user-item matrix or already indexed
+HoldoutData: TypeAlias = pandas.DataFrame | HoldoutIndex | CSRLike
+
+# segment of each user id
+Segments: TypeAlias = pandas.Series | Mapping[Any, Hashable]
+
+# function returning the estimated scores of the given user ids
+ScoreFn: TypeAlias = Callable[[npt.NDArray[numpy.int_]], npt.NDArray[numpy.float_]]
+
+P = ParamSpec("P")
+
+
+class EvalBackend(StrEnum):
+    """Backends available to compute the evaluation metrics"""
+
+    PANDAS = "pandas"
+    NUMPY = "numpy"
+
+
+def _profiled(
+    method: Callable[Concatenate[RecEvaluator, P], pandas.DataFrame]
+) -> Callable[Concatenate[RecEvaluator, P], pandas.DataFrame]:
+    """Profile the evaluation when the evaluator has `profile` set, returning the profile in the result frame
+
+    Evaluations called within an active profile, such as `eval_from_recs` called by `eval_from_scores`, are
+    recorded in it as nested stages.
+
+    Args:
+        method (Callable[Concatenate[RecEvaluator, P], pandas.DataFrame]): evaluation method.
+
+    Returns:
+        Callable[Concatenate[RecEvaluator, P], pandas.DataFrame]: the method, profiled.
+    """
+
+    @wraps(method)
+    def profiled_method(
+        self: RecEvaluator, /, *args: P.args, **kwargs: P.kwargs
+    ) -> pandas.DataFrame:
+        if not self.profile:
+            return method(self, *args, **kwargs)
+        profile = active_profile()
+        if profile is not None:
+            results = method(self, *args, **kwargs)
+        else:
+            with profiled(hooks=self.profile_hooks) as profile:
+                results = method(self, *args, **kwargs)
+        results.attrs["profile"] = profile
+        return results
+
+    return profiled_method
+
 
 @dataclass
-class RecEvaluator:
+class RecEvaluator:  # pylint: disable=too-many-instance-attributes
     """Main class used to evaluate recommender system algorithm
 
     Attributes:
         metrics (list[str]): metrics used for the evaluation.
         cutoffs (list[int] | npt.NDArray[numpy.int_]): list of cutoffs used to evaluate the recommendations.
+        backend (str, optional): backend used to compute hits and metrics, either `pandas` (dataframe joins) or
+            `numpy` (dense hit matrix with vectorized reductions). Defaults to `pandas`.
+        topk_engine (str, optional): engine used to retrieve the top-k items from scores, either `numpy`,
+            `numba` or `auto`. Defaults to `numpy`.
+        n_jobs (int, optional): number of processes the users are sharded across, -1 meaning one for each cpu.
+            The sharded evaluation always computes the metrics on the dense hit matrix. Defaults to 1.
+        metric_params (dict[str, dict[str, Any]], optional): keyword arguments of each metric, by metric name,
+            such as the `n_items` of `coverage` or the `item_popularity` of `novelty`. Defaults to no arguments.
+        profile (bool, optional): whether to profile the evaluations, the `Profile` of the stages run (top-k,
+            hits, each metric at each cutoff, results) is returned in the `profile` attribute of the result
+            frame, `results.attrs["profile"]`. Defaults to False.
+        profile_hooks (list[ProfileHook], optional): called at the end of every profiled stage. Defaults to no
+            hooks.
     """
 
     metrics: list[str]
     cutoffs: list[int] | npt.NDArray[numpy.int_]
+    backend: str = EvalBackend.PANDAS
+    topk_engine: str = TopkEngine.NUMPY
+    n_jobs: int = 1
+    metric_params: dict[str, dict[str, Any]] = field(default_factory=dict)
+    profile: bool = False
+    profile_hooks: list[ProfileHook] = field(default_factory=list)
     max_cutoff: int = field(init=False)
     metrics_objs: list[MetricInterface] = field(init=False, default_factory=lambda: [])
 
     def __post_init__(self) -> None:
         self.max_cutoff = max(self.cutoffs)
+        self.backend = EvalBackend(self.backend)
+        self.topk_engine = TopkEngine(self.topk_engine)
+        resolve_n_jobs(self.n_jobs)
         # convert metrics name in metrics objects
         for metric_name in self.metrics:
-            self.metrics_objs.append(MetricFactory.from_name(metric_name))
+            self.metrics_objs.append(
+                MetricFactory.from_name(
+                    metric_name, **self.metric_params.get(metric_name, {})
+                )
+            )
+        # the pandas backend only joins the hits, the sharded evaluation is always dense
+        if (
+            self.backend == EvalBackend.PANDAS
+            and self.n_jobs == 1
+            and self._uses_top_items()
+        ):
+            raise ValueError(
+                "Metrics computed from the recommended items need the numpy backend"
+            )
 
     @classmethod
     def recs_from_scores(
         cls,
-        scores: npt.NDArray[numpy.float_],
+        scores: ScoresLike,
         cutoff: int,
         user_ids: npt.NDArray[numpy.int_] | list[int] | None = None,
+        topk_engine: str = TopkEngine.NUMPY,
+        exclude: CSRLike | None = None,
+        candidates: npt.NDArray[numpy.int_] | None = None,
+        candidate_scores: bool = False,
     ) -> pandas.DataFrame:
         """Compute recommendations from estimated scores
         Args:
-            scores (npt.NDArray[numpy.float_]): estiamted scores matrix, row containing users and columns containing items
+            scores (ScoresLike): estiamted scores matrix, row containing users and columns containing items,
+                or the path of the `.npy` file containing it
             cutoff (int): cutoff used to compute recommendations
             user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): user ids associated to each row of the estimated score matrix. Defaults to None. #pylint: disable=line-too-long
+            topk_engine (str, optional): engine used to retrieve the top-k items. Defaults to `numpy`.
+            exclude (CSRLike | None, optional): sparse CSR user-item matrix of the items not to recommend,
+                one row for each row of scores. Defaults to None.
+            candidates (npt.NDArray[numpy.int_] | None, optional): items each user is ranked against, padded with
+                -1, see `get_topk`. Defaults to None.
+            candidate_scores (bool, optional): whether scores holds the scores of the candidates rather than the
+                full score matrix, see `get_topk`. Defaults to False.
 
         Returns:
-            pandas.DataFrame: recommendations dataframe
+            pandas.DataFrame: recommendations dataframe, with the rank column, int32 item indices and int16 ranks
         """
-        if user_ids is not None:
-            # check number of user_ids match with scores shape
-            num_users = len(user_ids)
-            row_scores = len(scores)
-            if num_users != row_scores:
-                raise ValueError(
-                    f"Number of user ids do not match with scores shape. # user ids: {num_users}, \
-            # rows in scores: {row_scores}"
-                )
-        else:
-            # no userids meaning we create consecutive user_ids with the same shape as scores passed
-            logging.warning(
-                "user_ids have not been passed as input, creating consecutive user_ids starting from 0"
-            )
-            user_ids = numpy.arange(scores.shape[0])
+        scores = load_scores(scores)
+        user_ids = _check_user_ids(scores=scores, user_ids=user_ids)
 
         logging.debug("Retrieving topk items")
-        top_items, _ = get_topk(scores=scores, k=cutoff)
-
-        # repreat max_cutoff times the user ids
-        users_rep = numpy.repeat(user_ids, cutoff)
-        recs_df = pandas.DataFrame(
-            zip(users_rep, top_items.flatten()),
-            columns=[DEFAULT_USER_COL, DEFAULT_ITEM_COL],
+        top_items, _ = get_topk(
+            scores=scores,
+            k=cutoff,
+            engine=topk_engine,
+            exclude=exclude,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
         )
+
+        with stage("recs_frame", rows=len(user_ids)):
+            # columns are built straight from the compact arrays, user ids are repeated once for each rank
+            recs_df = pandas.DataFrame(
+                {
+                    DEFAULT_USER_COL: numpy.repeat(user_ids, cutoff),
+                    DEFAULT_ITEM_COL: top_items.ravel(),
+                    "rank": numpy.tile(
+                        numpy.arange(1, cutoff + 1, dtype=rank_dtype(cutoff)),
+                        len(user_ids),
+                    ),
+                },
+                copy=False,
+            )
         return recs_df
 
+    @_profiled
     @timeit
     def eval_from_scores(  # pylint: disable=[too-many-arguments,too-many-locals]
         self,
-        scores: npt.NDArray[numpy.float_],
-        holdout_data: pandas.DataFrame,
+        scores: ScoresLike,
+        holdout_data: HoldoutData,
         user_ids: npt.NDArray[numpy.int_] | list[int] | None = None,
         verbose: bool = True,
         decimal_precision: int = 4,
+        exclude: CSRLike | None = None,
+        candidates: npt.NDArray[numpy.int_] | None = None,
+        candidate_scores: bool = False,
     ) -> pandas.DataFrame:
         """Evaluate recommender system from estimated scores
 
         Args:
-            scores (npt.NDArray[numpy.float_]): estiamted scores matrix, row containing users and columns containing items
-            holdout_data (pandas.DataFrame): ground truth data against which perform evaluation
-            user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): user ids associated to each row of the estimated score matrix. Defaults to None. #pylint: disable=line-too-long
+            scores (ScoresLike): estiamted scores matrix, row containing users and columns containing items,
+                or the path of the `.npy` file containing it
+            holdout_data (HoldoutData): ground truth data against which perform evaluation, either a dataframe,
+                a sparse CSR user-item matrix whose rows are the user ids, or its index built once with
+                `HoldoutIndex.from_frame` or `HoldoutIndex.from_csr`
+            user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): user ids associated to each row of the
+                estimated score matrix. Defaults to None.
             verbose (bool, optional): Wheter or not print metric results. Defaults to True.
             decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+            exclude (CSRLike | None, optional): sparse CSR user-item matrix of the items not to recommend, such as
+                the training interactions, one row for each row of scores. Defaults to None.
+            candidates (npt.NDArray[numpy.int_] | None, optional): (n_users, n_candidates) items each user is ranked
+                against, such as sampled negatives plus positives, padded with -1. Defaults to None.
+            candidate_scores (bool, optional): whether scores holds the scores of the candidates, with the same
+                shape as candidates, rather than the full score matrix. Defaults to False.
 
         Returns:
             pandas.DataFrame: dataframe containing the result metrics for each cutoff.
         """
+        # memory-mapped scores are read in blocks by get_topk
+        scores = load_scores(scores)
+        if self.n_jobs != 1:
+            user_ids = _check_user_ids(scores=scores, user_ids=user_ids)
+            holdout = _holdout_index(holdout_data)
+            indptr, indices = holdout.csr(holdout.user_rows(user_ids))
+            with stage("sharded_metric_sums", rows=len(user_ids)):
+                metric_sums, any_hit = sharded_metric_sums(
+                    self,
+                    indptr=indptr,
+                    indices=indices,
+                    n_jobs=resolve_n_jobs(self.n_jobs),
+                    scores=scores,
+                    exclude_indptr=None
+                    if exclude is None
+                    else numpy.asarray(exclude.indptr),
+                    exclude_indices=None
+                    if exclude is None
+                    else numpy.asarray(exclude.indices),
+                    candidates=candidates,
+                    candidate_scores=candidate_scores,
+                )
+            return self._results_from_sums(
+                metric_sums,
+                n_users=len(user_ids),
+                any_hit=any_hit,
+                verbose=verbose,
+                decimal_precision=decimal_precision,
+            )
+        if self.backend == EvalBackend.NUMPY:
+            hit_matrix = self._hits_from_scores(
+                scores=scores,
+                holdout_data=holdout_data,
+                user_ids=user_ids,
+                exclude=exclude,
+                candidates=candidates,
+                candidate_scores=candidate_scores,
+            )
+            return self._results_frame(
+                self._metrics_from_hits(hit_matrix),
+                verbose=verbose,
+                decimal_precision=decimal_precision,
+            )
+
+        # users are joined through their dense codes, the metrics are aggregated and never decoded
+        users = IdEncoder(_check_user_ids(scores=scores, user_ids=user_ids))
         recs_df = RecEvaluator.recs_from_scores(
-            scores=scores, user_ids=user_ids, cutoff=self.max_cutoff
+            scores=scores,
+            user_ids=numpy.arange(len(users), dtype=users.dtype),
+            cutoff=self.max_cutoff,
+            topk_engine=self.topk_engine,
+            exclude=exclude,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
+        )
+        holdout_df = (
+            holdout_data
+            if isinstance(holdout_data, pandas.DataFrame)
+            else _holdout_index(holdout_data).to_frame()
+        )
+        holdout_df = holdout_df.assign(
+            **{
+                DEFAULT_USER_COL: users.encode(
+                    holdout_df[DEFAULT_USER_COL], strict=False
+                )
+            }
         )
 
         metrics_df = self.eval_from_recs(
             recs_df=recs_df,
-            holdout_data=holdout_data,
+            holdout_data=holdout_df,
             verbose=verbose,
             decimal_precision=decimal_precision,
         )
         return metrics_df
 
+    @_profiled
+    @timeit
+    def eval_from_score_batches(  # pylint: disable=[too-many-arguments,too-many-locals]
+        self,
+        batches: Iterable[ScoreBatch] | ScoreFn,
+        holdout_data: HoldoutData,
+        user_ids: npt.NDArray[numpy.int_] | list[int] | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        verbose: bool = True,
+        decimal_precision: int = 4,
+    ) -> pandas.DataFrame:
+        """Evaluate recommender system from estimated scores streamed in user batches
+
+        Top-k items and hits are computed batch by batch and only the metric sums are kept,
+        hence the peak memory is set by the batch size and not by the whole score matrix.
+
+        Args:
+            batches (Iterable[ScoreBatch] | ScoreFn): either an iterable of `(user_ids, scores)` batches or a
+                callable returning the scores of the user ids it is called with.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation,
+                or its index built once with `HoldoutIndex.from_frame`
+            user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): users scored by the callable.
+                Defaults to None, meaning the holdout users.
+            batch_size (int, optional): number of users scored by each call of the callable. Defaults to 10_000.
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff.
+        """
+        holdout = _holdout_index(holdout_data)
+
+        if callable(batches):
+            batches = _score_batches(
+                score_fn=batches,
+                user_ids=numpy.asarray(
+                    holdout.user_ids if user_ids is None else user_ids
+                ),
+                batch_size=batch_size,
+            )
+
+        seen = numpy.zeros(holdout.n_users, dtype=numpy.bool_)
+        metric_sums = self.empty_metric_sums()
+        any_hit = False
+        for batch_user_ids, batch_scores in batches:
+            batch_user_ids = _check_user_ids(
+                scores=batch_scores, user_ids=batch_user_ids
+            )
+            rows = holdout.user_rows(batch_user_ids, all_users=False)
+            if seen[rows].any():
+                raise ValueError("Users have to be scored in a single batch")
+            seen[rows] = True
+
+            top_items, _ = get_topk(
+                scores=batch_scores, k=self.max_cutoff, engine=self.topk_engine
+            )
+            with stage("hit_matrix", rows=len(rows)):
+                hit_matrix = holdout.hit_matrix(top_items, rows=rows)
+            any_hit = any_hit or bool(hit_matrix.hits.any())
+            with stage("metric_sums", rows=len(rows)):
+                metric_sums += self.metric_sums(hit_matrix)
+
+        if not seen.all():
+            raise ValueError(
+                f"Missing predictions for some users: ground truth users: {len(seen)}, "
+                f"predicted users: {seen.sum()}"
+            )
+        return self._results_from_sums(
+            metric_sums,
+            n_users=holdout.n_users,
+            any_hit=any_hit,
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
+
+    @_profiled
     @timeit
     def eval_from_recs(
         self,
         recs_df: pandas.DataFrame,
-        holdout_data: pandas.DataFrame,
+        holdout_data: HoldoutData,
         verbose: bool = True,
         decimal_precision: int = 4,
     ) -> pandas.DataFrame:
@@ -124,41 +417,941 @@ class RecEvaluator:
 
         Args:
             recs_df (pandas.DataFrame): recommendations df.
-            holdout_data (pandas.DataFrame): ground truth data against which perform evaluation.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation, either a dataframe,
+                a sparse CSR user-item matrix whose rows are the user ids, or its index built once with
+                `HoldoutIndex.from_frame` or `HoldoutIndex.from_csr`.
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff.
+        """
+        self._add_rank(recs_df)
+        if self.n_jobs != 1:
+            holdout = _holdout_index(holdout_data)
+            top_items = holdout.encode_recs(
+                recs_df,
+                max_cutoff=self.max_cutoff,
+                item_ids=self._uses_top_items(),
+            )
+            return self._eval_top_items(
+                top_items,
+                holdout,
+                verbose=verbose,
+                decimal_precision=decimal_precision,
+            )
+        if self.backend == EvalBackend.NUMPY:
+            results = self._metrics_from_hits(
+                self._hits_from_recs(recs_df, holdout_data)
+            )
+        else:
+            if not isinstance(holdout_data, pandas.DataFrame):
+                holdout_data = _holdout_index(holdout_data).to_frame()
+            results = self._metrics_from_hit_rank(recs_df, holdout_data)
+        return self._results_frame(
+            results, verbose=verbose, decimal_precision=decimal_precision
+        )
+
+    @_profiled
+    @timeit
+    def eval_from_recs_parquet(  # pylint: disable=too-many-arguments
+        self,
+        recs_source: ParquetSource,
+        holdout_data: HoldoutData,
+        batch_size: int = PARQUET_BATCH_ROWS,
+        verbose: bool = True,
+        decimal_precision: int = 4,
+    ) -> pandas.DataFrame:
+        """Evaluate recommender system from recommendations stored in Parquet files
+
+        The user, item and rank columns are streamed one record batch at a time and encoded against the
+        holdout users and items, hence the recommendations are never held in memory as a dataframe. Metrics
+        are always computed on the dense hit matrix, whatever the backend.
+
+        Args:
+            recs_source (ParquetSource): Parquet file, directory or list of files of the recommendations,
+                having to contain the rank column.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation, or its index, see
+                `read_holdout_parquet` to read it from Parquet files.
+            batch_size (int, optional): largest number of recommendations read at once. Defaults to 2^17.
             verbose (bool, optional): Wheter or not print metric results. Defaults to True.
             decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
 
         Returns:
             pandas.DataFrame: dataframe containing the result metrics for each cutoff.
         """
+        holdout = _holdout_index(holdout_data)
+        top_items = self._encode_recs_parquet(recs_source, holdout, batch_size)
+        if self.n_jobs != 1:
+            return self._eval_top_items(
+                top_items,
+                holdout,
+                verbose=verbose,
+                decimal_precision=decimal_precision,
+            )
+        hit_matrix = self._top_items_hit_matrix(top_items, holdout)
+        if not hit_matrix.hits.any():
+            raise ValueError("No hits found in prediction data.")
+        return self._results_frame(
+            self._metrics_from_hits(hit_matrix),
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
 
+    @_profiled
+    @timeit
+    def user_metrics_from_scores(  # pylint: disable=too-many-arguments
+        self,
+        scores: ScoresLike,
+        holdout_data: HoldoutData,
+        user_ids: npt.NDArray[numpy.int_] | list[int] | None = None,
+        exclude: CSRLike | None = None,
+        candidates: npt.NDArray[numpy.int_] | None = None,
+        candidate_scores: bool = False,
+    ) -> pandas.DataFrame:
+        """Evaluate recommender system from estimated scores, keeping the metrics of each user
+
+        Args:
+            scores (ScoresLike): estiamted scores matrix, row containing users and columns containing items,
+                or the path of the `.npy` file containing it
+            holdout_data (HoldoutData): ground truth data against which perform evaluation,
+                or its index built once with `HoldoutIndex.from_frame`
+            user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): user ids associated to each row of the
+                estimated score matrix. Defaults to None.
+            exclude (CSRLike | None, optional): sparse CSR user-item matrix of the items not to recommend, see
+                `eval_from_scores`. Defaults to None.
+            candidates (npt.NDArray[numpy.int_] | None, optional): items each user is ranked against, see
+                `eval_from_scores`. Defaults to None.
+            candidate_scores (bool, optional): whether scores holds the scores of the candidates, see
+                `eval_from_scores`. Defaults to False.
+
+        Returns:
+            pandas.DataFrame: float32 `metric@cutoff` columns indexed by user id, in the order of the score rows.
+        """
+        hit_matrix = self._hits_from_scores(
+            scores=load_scores(scores),
+            holdout_data=holdout_data,
+            user_ids=user_ids,
+            exclude=exclude,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
+        )
+        return self._user_metrics_frame(hit_matrix)
+
+    @_profiled
+    @timeit
+    def user_metrics_from_recs(
+        self,
+        recs_df: pandas.DataFrame,
+        holdout_data: HoldoutData,
+    ) -> pandas.DataFrame:
+        """Evaluate recommender system from recommendations, keeping the metrics of each user
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations df.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation,
+                or its index built once with `HoldoutIndex.from_frame`.
+
+        Returns:
+            pandas.DataFrame: float32 `metric@cutoff` columns indexed by user id, sorted by user id.
+        """
+        self._add_rank(recs_df)
+        return self._user_metrics_frame(self._hits_from_recs(recs_df, holdout_data))
+
+    @_profiled
+    @timeit
+    def user_metrics_from_recs_parquet(
+        self,
+        recs_source: ParquetSource,
+        holdout_data: HoldoutData,
+        batch_size: int = PARQUET_BATCH_ROWS,
+    ) -> pandas.DataFrame:
+        """Evaluate recommendations stored in Parquet files, keeping the metrics of each user
+
+        The recommendations are streamed as in `eval_from_recs_parquet`.
+
+        Args:
+            recs_source (ParquetSource): Parquet file, directory or list of files of the recommendations,
+                having to contain the rank column.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation, or its index.
+            batch_size (int, optional): largest number of recommendations read at once. Defaults to 2^17.
+
+        Returns:
+            pandas.DataFrame: float32 `metric@cutoff` columns indexed by user id, sorted by user id, write it
+            with `write_parquet`.
+        """
+        holdout = _holdout_index(holdout_data)
+        top_items = self._encode_recs_parquet(recs_source, holdout, batch_size)
+        hit_matrix = self._top_items_hit_matrix(top_items, holdout)
+        if not hit_matrix.hits.any():
+            raise ValueError("No hits found in prediction data.")
+        return self._user_metrics_frame(hit_matrix)
+
+    @_profiled
+    @timeit
+    def eval_segments_from_scores(  # pylint: disable=too-many-arguments
+        self,
+        scores: ScoresLike,
+        holdout_data: HoldoutData,
+        segments: Segments,
+        user_ids: npt.NDArray[numpy.int_] | list[int] | None = None,
+        verbose: bool = True,
+        decimal_precision: int = 4,
+        exclude: CSRLike | None = None,
+        candidates: npt.NDArray[numpy.int_] | None = None,
+        candidate_scores: bool = False,
+    ) -> pandas.DataFrame:
+        """Evaluate recommender system from estimated scores on every segment of users, with a single hit computation
+
+        Args:
+            scores (ScoresLike): estiamted scores matrix, row containing users and columns containing items,
+                or the path of the `.npy` file containing it
+            holdout_data (HoldoutData): ground truth data against which perform evaluation,
+                or its index built once with `HoldoutIndex.from_frame`
+            segments (Segments): segment of each user, users without a segment only count in the global value.
+            user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): user ids associated to each row of the
+                estimated score matrix. Defaults to None.
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+            exclude (CSRLike | None, optional): sparse CSR user-item matrix of the items not to recommend, see
+                `eval_from_scores`. Defaults to None.
+            candidates (npt.NDArray[numpy.int_] | None, optional): items each user is ranked against, see
+                `eval_from_scores`. Defaults to None.
+            candidate_scores (bool, optional): whether scores holds the scores of the candidates, see
+                `eval_from_scores`. Defaults to False.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each segment and cutoff, the global
+            results are reported under the `all` segment.
+        """
+        hit_matrix = self._hits_from_scores(
+            scores=load_scores(scores),
+            holdout_data=holdout_data,
+            user_ids=user_ids,
+            exclude=exclude,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
+        )
+        return self._segments_frame(
+            hit_matrix,
+            segments=segments,
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
+
+    @_profiled
+    @timeit
+    def eval_segments_from_recs(
+        self,
+        recs_df: pandas.DataFrame,
+        holdout_data: HoldoutData,
+        segments: Segments,
+        verbose: bool = True,
+        decimal_precision: int = 4,
+    ) -> pandas.DataFrame:
+        """Evaluate recommender system from recommendations on every segment of users, with a single hit computation
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations df.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation,
+                or its index built once with `HoldoutIndex.from_frame`.
+            segments (Segments): segment of each user, users without a segment only count in the global value.
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each segment and cutoff, the global
+            results are reported under the `all` segment.
+        """
+        self._add_rank(recs_df)
+        return self._segments_frame(
+            self._hits_from_recs(recs_df, holdout_data),
+            segments=segments,
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
+
+    def bootstrap_ci(  # pylint: disable=too-many-arguments
+        self,
+        user_metrics: pandas.DataFrame,
+        n_resamples: int = DEFAULT_N_RESAMPLES,
+        confidence: float = 0.95,
+        method: str = ResamplingMethod.POISSON,
+        seed: int = SEED,
+        verbose: bool = True,
+        decimal_precision: int = 4,
+    ) -> pandas.DataFrame:
+        """Bootstrap confidence intervals of every metric at every cutoff
+
+        Users are resampled with a vectorized weight matrix over the per-user metrics, hence hits and
+        metrics are computed only once. Resamples are drawn by `n_jobs` threads.
+
+        Args:
+            user_metrics (pandas.DataFrame): metrics of each user, as returned by `user_metrics_from_scores` or
+                `user_metrics_from_recs`.
+            n_resamples (int, optional): number of bootstrap resamples. Defaults to 1000.
+            confidence (float, optional): confidence level of the intervals. Defaults to 0.95.
+            method (str, optional): resampling weights, either `poisson` or `multinomial`. Defaults to `poisson`.
+            seed (int, optional): seed of the random generator. Defaults to `SEED`.
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff, with the lower and upper
+            bound of their confidence interval.
+        """
+        metric_cutoffs = self._metric_cutoffs()
+        values = user_metrics[
+            [f"{metric.name_()}@{cutoff}" for metric, cutoff in metric_cutoffs]
+        ].to_numpy(dtype=numpy.float64)
+        ci_low, ci_high = bootstrap_ci(
+            values,
+            n_resamples=n_resamples,
+            confidence=confidence,
+            method=method,
+            seed=seed,
+            n_threads=resolve_n_jobs(self.n_jobs),
+        )
+        results_df = self._results_frame(
+            (
+                (cutoff, metric, float(value))
+                for (metric, cutoff), value in zip(metric_cutoffs, values.mean(axis=0))
+            ),
+            verbose=False,
+            decimal_precision=decimal_precision,
+        )
+        results_df["ci_low"] = ci_low
+        results_df["ci_high"] = ci_high
+        if verbose:
+            for row in results_df.itertuples():
+                print(
+                    f"{row.metric}@{row.cutoff}: {round(row.value, decimal_precision)} "
+                    f"[{round(row.ci_low, decimal_precision)}, {round(row.ci_high, decimal_precision)}]"
+                )
+        return results_df
+
+    @_profiled
+    @timeit
+    def compare(  # pylint: disable=[too-many-arguments,too-many-locals]
+        self,
+        preds_a: ScoresLike | pandas.DataFrame,
+        preds_b: ScoresLike | pandas.DataFrame,
+        holdout_data: HoldoutData,
+        user_ids: npt.NDArray[numpy.int_] | list[int] | None = None,
+        n_resamples: int = DEFAULT_N_RESAMPLES,
+        seed: int = SEED,
+        verbose: bool = True,
+        decimal_precision: int = 4,
+    ) -> pandas.DataFrame:
+        """Compare two recommender systems on the same holdout data with paired significance tests
+
+        The holdout data is indexed once and shared by both evaluations, the tests are computed from the
+        per-user metric differences.
+
+        Args:
+            preds_a (ScoresLike | pandas.DataFrame): estimated scores of the first model, or its recommendations
+                dataframe.
+            preds_b (ScoresLike | pandas.DataFrame): estimated scores of the second model, or its recommendations
+                dataframe.
+            holdout_data (HoldoutData): ground truth data against which perform evaluation,
+                or its index built once with `HoldoutIndex.from_frame`.
+            user_ids (npt.NDArray[numpy.int_] | list[int] | None, optional): user ids associated to each row of the
+                estimated score matrices. Defaults to None.
+            n_resamples (int, optional): number of resamples of the paired bootstrap test. Defaults to 1000.
+            seed (int, optional): seed of the paired bootstrap test. Defaults to `SEED`.
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics of both models for each cutoff, their
+            difference and the p-values of the paired t-test, Wilcoxon signed-rank test and paired bootstrap test.
+        """
+        holdout = _holdout_index(holdout_data)
+        hit_matrix_a, hit_matrix_b = (
+            self._hits_from_recs(self._add_rank(preds), holdout)
+            if isinstance(preds, pandas.DataFrame)
+            else self._hits_from_scores(
+                scores=load_scores(preds),
+                holdout_data=holdout,
+                user_ids=user_ids,
+                exclude=None,
+                candidates=None,
+                candidate_scores=False,
+            )
+            for preds in (preds_a, preds_b)
+        )
+        values_a = self._user_metric_values(hit_matrix_a)
+        values_b = self._user_metric_values(hit_matrix_b)
+        if not numpy.array_equal(hit_matrix_a.user_ids, hit_matrix_b.user_ids):
+            # both models cover every holdout user, possibly in a different order
+            values_b = values_b[
+                IdEncoder(hit_matrix_b.user_ids).encode(hit_matrix_a.user_ids)
+            ]
+        diff = values_b - values_a
+
+        metric_cutoffs = self._metric_cutoffs()
+        results_df = pandas.DataFrame(
+            {
+                "metric": [metric.name_() for metric, _ in metric_cutoffs],
+                "cutoff": [cutoff for _, cutoff in metric_cutoffs],
+                "value_a": values_a.mean(axis=0),
+                "value_b": values_b.mean(axis=0),
+                "delta": diff.mean(axis=0),
+                "ttest_pvalue": paired_ttest(diff),
+                "wilcoxon_pvalue": wilcoxon_test(diff),
+                "bootstrap_pvalue": paired_bootstrap_test(
+                    diff,
+                    n_resamples=n_resamples,
+                    seed=seed,
+                    n_threads=resolve_n_jobs(self.n_jobs),
+                ),
+            }
+        )
+        if verbose:
+            for row in results_df.itertuples():
+                print(
+                    f"{row.metric}@{row.cutoff}: {round(row.value_a, decimal_precision)} -> "
+                    f"{round(row.value_b, decimal_precision)} (delta: {round(row.delta, decimal_precision)}, "
+                    f"t-test p: {round(row.ttest_pvalue, decimal_precision)})"
+                )
+        return results_df
+
+    def metric_sums(self, hit_matrix: HitMatrix) -> npt.NDArray[numpy.float64]:
+        """Compute the partial results of every metric at every cutoff over the users
+
+        Partial results are the sums of the user values for the metrics averaged over users, and the item
+        recommendation counts for the catalogue metrics, hence they can be added across disjoint sets of users.
+
+        Args:
+            hit_matrix (HitMatrix): dense hits of the users.
+
+        Returns:
+            npt.NDArray[numpy.float64]: partial results of every metric and cutoff, concatenated in the order
+            of the result frames.
+        """
+        partials = []
+        for metric, cutoff in self._metric_cutoffs():
+            with stage(f"{metric.name_()}@{cutoff}", rows=len(hit_matrix.hits)):
+                partials.append(metric.partial_from_hits(hit_matrix, cutoff))
+        return numpy.concatenate(partials)
+
+    def empty_metric_sums(self) -> npt.NDArray[numpy.float64]:
+        """Partial results of an empty set of users, see `metric_sums`
+
+        Returns:
+            npt.NDArray[numpy.float64]: zero partial results of every metric and cutoff.
+        """
+        return numpy.zeros(
+            sum(metric.partial_size() for metric, _ in self._metric_cutoffs())
+        )
+
+    def _results_from_sums(
+        self,
+        metric_sums: npt.NDArray[numpy.float64],
+        n_users: float,
+        any_hit: bool,
+        verbose: bool,
+        decimal_precision: int,
+    ) -> pandas.DataFrame:
+        """Collect the partial results accumulated over disjoint sets of users into a dataframe
+
+        Args:
+            metric_sums (npt.NDArray[numpy.float64]): partial results over all the users, see `metric_sums`.
+            n_users (float): number of users.
+            any_hit (bool): whether any hit was found.
+            verbose (bool): Wheter or not print metric results.
+            decimal_precision (int): precision with which compute evaluation metrics.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff.
+        """
+        if not any_hit:
+            raise ValueError("No hits found in prediction data.")
+
+        metric_cutoffs = self._metric_cutoffs()
+        bounds = numpy.cumsum(
+            [0] + [metric.partial_size() for metric, _ in metric_cutoffs]
+        )
+        return self._results_frame(
+            (
+                (
+                    cutoff,
+                    metric,
+                    metric.metric_from_partial(metric_sums[start:stop], n_users),
+                )
+                for (metric, cutoff), start, stop in zip(
+                    metric_cutoffs, bounds[:-1], bounds[1:]
+                )
+            ),
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
+
+    def _hits_from_scores(
+        self,
+        scores: npt.NDArray[numpy.float_],
+        holdout_data: HoldoutData,
+        user_ids: npt.NDArray[numpy.int_] | list[int] | None,
+        exclude: CSRLike | None,
+        candidates: npt.NDArray[numpy.int_] | None,
+        candidate_scores: bool,
+    ) -> HitMatrix:
+        """Compute the hits straight from the top-k items, without building the recommendations dataframe
+
+        Args:
+            scores (npt.NDArray[numpy.float_]): estiamted scores matrix, row containing users and columns
+                containing items.
+            holdout_data (HoldoutData): ground truth data or its index.
+            user_ids (npt.NDArray[numpy.int_] | list[int] | None): user ids associated to each row of scores.
+            exclude (CSRLike | None): sparse CSR user-item matrix of the items not to recommend.
+            candidates (npt.NDArray[numpy.int_] | None): items each user is ranked against.
+            candidate_scores (bool): whether scores holds the scores of the candidates.
+
+        Returns:
+            HitMatrix: dense hits of the users, in the order of the score rows.
+        """
+        user_ids = _check_user_ids(scores=scores, user_ids=user_ids)
+        top_items, _ = get_topk(
+            scores=scores,
+            k=self.max_cutoff,
+            engine=self.topk_engine,
+            exclude=exclude,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
+        )
+        holdout = _holdout_index(holdout_data)
+        with stage("hit_matrix", rows=len(user_ids)):
+            hit_matrix = holdout.hit_matrix(top_items, rows=holdout.user_rows(user_ids))
+        if not hit_matrix.hits.any():
+            raise ValueError("No hits found in prediction data.")
+        return hit_matrix
+
+    def _hits_from_recs(
+        self,
+        recs_df: pandas.DataFrame,
+        holdout_data: HoldoutData,
+    ) -> HitMatrix:
+        """Compute the hits of the recommendations, without joining the dataframes
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations df, containing the rank column.
+            holdout_data (HoldoutData): ground truth data or its index.
+
+        Returns:
+            HitMatrix: dense hits of the users, sorted by user id.
+        """
+        hit_matrix = self._recs_hit_matrix(recs_df, _holdout_index(holdout_data))
+        if not hit_matrix.hits.any():
+            raise ValueError("No hits found in prediction data.")
+        return hit_matrix
+
+    def _recs_hit_matrix(
+        self, recs_df: pandas.DataFrame, holdout: HoldoutIndex
+    ) -> HitMatrix:
+        """Compute the hit matrix of the recommendations, which may have no hits at all
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations df, containing the rank column.
+            holdout (HoldoutIndex): index of the ground truth data.
+
+        Returns:
+            HitMatrix: dense hits of the users, sorted by user id.
+        """
+        # item ids are kept only when a metric needs them, codes are cheaper to intersect
+        with stage("encode_recs", rows=len(recs_df)):
+            top_items = holdout.encode_recs(
+                recs_df, max_cutoff=self.max_cutoff, item_ids=self._uses_top_items()
+            )
+        return self._top_items_hit_matrix(top_items, holdout)
+
+    def _encode_recs_parquet(
+        self, recs_source: ParquetSource, holdout: HoldoutIndex, batch_size: int
+    ) -> npt.NDArray[numpy.int_]:
+        """Stream the recommendations from Parquet files into the dense matrix of their item codes
+
+        Args:
+            recs_source (ParquetSource): Parquet file, directory or list of files of the recommendations.
+            holdout (HoldoutIndex): index of the ground truth data.
+            batch_size (int): largest number of recommendations read at once.
+
+        Returns:
+            npt.NDArray[numpy.int_]: (n_users, max_cutoff) item codes, or item ids when a metric needs them.
+        """
+        with stage("encode_recs"):
+            return holdout.encode_rec_batches(
+                read_recs_parquet(
+                    recs_source, max_cutoff=self.max_cutoff, batch_size=batch_size
+                ),
+                max_cutoff=self.max_cutoff,
+                item_ids=self._uses_top_items(),
+            )
+
+    def _top_items_hit_matrix(
+        self, top_items: npt.NDArray[numpy.int_], holdout: HoldoutIndex
+    ) -> HitMatrix:
+        """Compute the hit matrix of the encoded recommendations of every holdout user
+
+        Args:
+            top_items (npt.NDArray[numpy.int_]): (n_users, max_cutoff) item codes, or item ids when a metric
+                needs them, see `HoldoutIndex.encode_recs`.
+            holdout (HoldoutIndex): index of the ground truth data.
+
+        Returns:
+            HitMatrix: dense hits of the users, sorted by user id.
+        """
+        with stage("hit_matrix", rows=holdout.n_users):
+            return holdout.hit_matrix(
+                top_items,
+                rows=numpy.arange(holdout.n_users),
+                item_codes=not self._uses_top_items(),
+            )
+
+    def _eval_top_items(
+        self,
+        top_items: npt.NDArray[numpy.int_],
+        holdout: HoldoutIndex,
+        verbose: bool,
+        decimal_precision: int,
+    ) -> pandas.DataFrame:
+        """Evaluate the encoded recommendations of every holdout user, sharding them across processes
+
+        Args:
+            top_items (npt.NDArray[numpy.int_]): (n_users, max_cutoff) item codes, or item ids when a metric
+                needs them, see `HoldoutIndex.encode_recs`.
+            holdout (HoldoutIndex): index of the ground truth data.
+            verbose (bool): Wheter or not print metric results.
+            decimal_precision (int): precision with which compute evaluation metrics.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff.
+        """
+        item_ids = self._uses_top_items()
+        with stage("sharded_metric_sums", rows=holdout.n_users):
+            metric_sums, any_hit = sharded_metric_sums(
+                self,
+                indptr=holdout.indptr,
+                indices=holdout.item_indices if item_ids else holdout.indices,
+                n_jobs=resolve_n_jobs(self.n_jobs),
+                top_items=top_items,
+            )
+        return self._results_from_sums(
+            metric_sums,
+            n_users=holdout.n_users,
+            any_hit=any_hit,
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
+
+    def _add_rank(self, recs_df: pandas.DataFrame) -> pandas.DataFrame:
+        """Add the rank column to the recommendations, when missing
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations df, sorted by rank within each user.
+
+        Returns:
+            pandas.DataFrame: the same recommendations df, containing the rank column.
+        """
         if "rank" not in recs_df.columns:
             # adding rank column on recs dataframe
             recs_df["rank"] = numpy.tile(
-                numpy.arange(1, self.max_cutoff + 1),
+                numpy.arange(1, self.max_cutoff + 1, dtype=rank_dtype(self.max_cutoff)),
                 recs_df[DEFAULT_USER_COL].nunique(),
             )
+        return recs_df
+
+    def _user_metrics_frame(self, hit_matrix: HitMatrix) -> pandas.DataFrame:
+        """Collect the metrics of each user into a single float32 block, one column for each metric and cutoff
+
+        Args:
+            hit_matrix (HitMatrix): dense hits of the users.
+
+        Returns:
+            pandas.DataFrame: float32 `metric@cutoff` columns indexed by user id.
+        """
+        metric_cutoffs = self._metric_cutoffs()
+        return pandas.DataFrame(
+            self._user_metric_values(hit_matrix, dtype=numpy.float32),
+            index=pandas.Index(hit_matrix.user_ids, name=DEFAULT_USER_COL),
+            columns=[f"{metric.name_()}@{cutoff}" for metric, cutoff in metric_cutoffs],
+            copy=False,
+        )
+
+    def _uses_top_items(self) -> bool:
+        """Whether any metric needs the recommended item ids"""
+        return any(metric.uses_top_items for metric in self.metrics_objs)
+
+    def _metric_cutoffs(self) -> list[tuple[MetricInterface, int]]:
+        """Every metric at every cutoff, in the order of the result frames
+
+        Returns:
+            list[tuple[MetricInterface, int]]: metric and cutoff pairs.
+        """
+        return [
+            (metric, cutoff) for cutoff in self.cutoffs for metric in self.metrics_objs
+        ]
+
+    def _user_metric_values(
+        self, hit_matrix: HitMatrix, dtype: npt.DTypeLike = numpy.float64
+    ) -> npt.NDArray[numpy.float_]:
+        """Compute the metrics of each user, one column for each metric and cutoff
+
+        Args:
+            hit_matrix (HitMatrix): dense hits of the users.
+            dtype (npt.DTypeLike, optional): dtype of the values. Defaults to float64.
+
+        Returns:
+            npt.NDArray[numpy.float_]: (n_users, n_metrics * n_cutoffs) metric values.
+        """
+        metric_cutoffs = self._metric_cutoffs()
+        for metric in self.metrics_objs:
+            if not metric.user_averaged:
+                raise ValueError(
+                    f"{metric.name} is not averaged over users, it has no value for each user"
+                )
+        values = numpy.empty((len(hit_matrix.hits), len(metric_cutoffs)), dtype=dtype)
+        for col, (metric, cutoff) in enumerate(metric_cutoffs):
+            with stage(f"{metric.name_()}@{cutoff}", rows=len(values)):
+                values[:, col] = metric.compute_user_metric_from_hits(
+                    hit_matrix, cutoff
+                )
+        return values
+
+    def _segments_frame(
+        self,
+        hit_matrix: HitMatrix,
+        segments: Segments,
+        verbose: bool,
+        decimal_precision: int,
+    ) -> pandas.DataFrame:
+        """Average the metrics of the users within each segment, with grouped sums over the segment codes
+
+        Metrics which are not averaged over users, such as the catalogue coverage, are computed on the hits
+        of each segment.
+
+        Args:
+            hit_matrix (HitMatrix): dense hits of the users.
+            segments (Segments): segment of each user.
+            verbose (bool): Wheter or not print metric results.
+            decimal_precision (int): precision with which compute evaluation metrics.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each segment and cutoff.
+        """
+        # users without a segment are coded as -1
+        segment_codes, segment_labels = pandas.factorize(
+            pandas.Series(segments).reindex(hit_matrix.user_ids), sort=True
+        )
+        in_segment = segment_codes >= 0
+        segment_codes = segment_codes[in_segment]
+        n_segments = len(segment_labels)
+        n_users = numpy.concatenate(
+            [
+                [len(hit_matrix.hits)],
+                numpy.bincount(segment_codes, minlength=n_segments),
+            ]
+        )
+
+        # one row for the global value and one for each segment
+        values = numpy.empty(
+            (n_segments + 1, len(self.cutoffs), len(self.metrics_objs))
+        )
+        segment_rows = None
+        for i, cutoff in enumerate(self.cutoffs):
+            for j, metric in enumerate(self.metrics_objs):
+                if not metric.user_averaged:
+                    if segment_rows is None:
+                        users = numpy.flatnonzero(in_segment)
+                        segment_rows = numpy.split(
+                            users[numpy.argsort(segment_codes, kind="stable")],
+                            numpy.cumsum(n_users[1:-1]),
+                        )
+                    values[0, i, j] = metric.compute_metric_from_hits(
+                        hit_matrix, cutoff
+                    )
+                    values[1:, i, j] = [
+                        metric.compute_metric_from_hits(hit_matrix.take(rows), cutoff)
+                        for rows in segment_rows
+                    ]
+                    continue
+                user_values = metric.compute_user_metric_from_hits(hit_matrix, cutoff)
+                values[0, i, j] = user_values.mean()
+                values[1:, i, j] = (
+                    numpy.bincount(
+                        segment_codes,
+                        weights=user_values[in_segment],
+                        minlength=n_segments,
+                    )
+                    / n_users[1:]
+                )
 
+        segment_list = [GLOBAL_SEGMENT, *segment_labels]
+        results_df = pandas.DataFrame(
+            {
+                "segment": numpy.repeat(
+                    numpy.array(segment_list, dtype=object), values[0].size
+                ),
+                "metric": numpy.tile(
+                    [metric.name_() for metric in self.metrics_objs],
+                    (n_segments + 1) * len(self.cutoffs),
+                ),
+                "cutoff": numpy.tile(
+                    numpy.repeat(self.cutoffs, len(self.metrics_objs)), n_segments + 1
+                ),
+                "value": values.ravel(),
+                "n_users": numpy.repeat(n_users, values[0].size),
+            }
+        )
+        if verbose:
+            for row in results_df.itertuples():
+                print(
+                    f"{row.segment} - {row.metric}@{row.cutoff}: {round(row.value, decimal_precision)}"
+                )
+        return results_df
+
+    def _metrics_from_hits(
+        self, hit_matrix: HitMatrix
+    ) -> Iterator[tuple[int, MetricInterface, float]]:
+        """Compute every metric at every cutoff from the dense hit matrix
+
+        Args:
+            hit_matrix (HitMatrix): dense hits of the users.
+
+        Yields:
+            Iterator[tuple[int, MetricInterface, float]]: cutoff, metric and its value.
+        """
+        for cutoff in self.cutoffs:
+            for metric in self.metrics_objs:
+                with stage(f"{metric.name_()}@{cutoff}", rows=len(hit_matrix.hits)):
+                    value = metric.compute_metric_from_hits(hit_matrix, cutoff)
+                yield cutoff, metric, value
+
+    def _metrics_from_hit_rank(
+        self, recs_df: pandas.DataFrame, holdout_data: pandas.DataFrame
+    ) -> Iterator[tuple[int, MetricInterface, float]]:
+        """Compute every metric at every cutoff from the hit dataframes
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations df, containing the rank column.
+            holdout_data (pandas.DataFrame): ground truth data against which perform evaluation.
+
+        Yields:
+            Iterator[tuple[int, MetricInterface, float]]: cutoff, metric and its value.
+        """
+        # join recommendations and holdout once, hits at each cutoff are filtered from the max_cutoff ones
+        hit_ranks = get_hit_rank_cutoffs(
+            ground_truth_df=holdout_data,
+            pred_df=recs_df,
+            cutoffs=list(self.cutoffs),
+        )
+        for cutoff, df_hit, df_hit_count in hit_ranks:
+            # intermediate results are computed once and shared by the metrics at this cutoff
+            context = MetricContext(
+                df_hit=df_hit, df_hit_count=df_hit_count, cutoff=cutoff
+            )
+            for metric in self.metrics_objs:
+                with stage(f"{metric.name_()}@{cutoff}", rows=len(df_hit_count)):
+                    value = metric.compute_metric_from_context(context)
+                yield cutoff, metric, value
+
+    @staticmethod
+    def _results_frame(
+        results: Iterable[tuple[int, MetricInterface, float]],
+        verbose: bool,
+        decimal_precision: int,
+    ) -> pandas.DataFrame:
+        """Collect the metric results into a dataframe
+
+        Args:
+            results (Iterable[tuple[int, MetricInterface, float]]): cutoff, metric and its value.
+            verbose (bool): Wheter or not print metric results.
+            decimal_precision (int): precision with which compute evaluation metrics.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff.
+        """
+        # metrics are computed lazily, while the results are collected
+        with stage("metrics"):
+            results = list(results)
         metric_name_list = []
         cutoff_list = []
         metric_res_list = []
-        for cutoff in self.cutoffs:
-            # filter recs on current cutoff
-            recs_df_cutoff = recs_df[recs_df["rank"] <= cutoff]
-            df_hit, df_hit_count = get_hit_rank(
-                ground_truth_df=holdout_data, pred_df=recs_df_cutoff
+        for cutoff, metric, res in results:
+            # append results
+            metric_name_list.append(metric.name_())
+            cutoff_list.append(cutoff)
+            metric_res_list.append(res)
+
+            if verbose:
+                print(f"{metric.name_()}@{cutoff}: {round(res, decimal_precision)}")
+        with stage("results", rows=len(results)):
+            return pandas.DataFrame(
+                zip(metric_name_list, cutoff_list, metric_res_list),
+                columns=["metric", "cutoff", "value"],
             )
-            for metric in self.metrics_objs:
-                res = metric(df_hit, df_hit_count, cutoff)
 
-                # append results
-                metric_name_list.append(metric.name_())
-                cutoff_list.append(cutoff)
-                metric_res_list.append(res)
 
-                if verbose:
-                    print(f"{metric.name_()}@{cutoff}: {round(res, decimal_precision)}")
-        return pandas.DataFrame(
-            zip(metric_name_list, cutoff_list, metric_res_list),
-            columns=["metric", "cutoff", "value"],
-        )
+def _holdout_index(holdout_data: HoldoutData) -> HoldoutIndex:
+    """Index the holdout data, unless it is already indexed
+
+    Args:
+        holdout_data (HoldoutData): ground truth data or its index.
+
+    Returns:
+        HoldoutIndex: index of the ground truth data.
+    """
+    if isinstance(holdout_data, HoldoutIndex):
+        return holdout_data
+    with stage("holdout_index"):
+        if isinstance(holdout_data, pandas.DataFrame):
+            return HoldoutIndex.from_frame(holdout_data)
+        return HoldoutIndex.from_csr(holdout_data)
+
+
+def _check_user_ids(
+    scores: npt.NDArray[numpy.float_],
+    user_ids: npt.NDArray[numpy.int_] | list[int] | None,
+) -> npt.NDArray[numpy.int_]:
+    """Check the user ids match the rows of the score matrix, create them when not passed
+
+    Args:
+        scores (npt.NDArray[numpy.float_]): estiamted scores matrix, row containing users and columns containing items
+        user_ids (npt.NDArray[numpy.int_] | list[int] | None): user ids associated to each row of the scores matrix.
+
+    Returns:
+        npt.NDArray[numpy.int_]: user ids associated to each row of the estimated score matrix.
+    """
+    if user_ids is not None:
+        # check number of user_ids match with scores shape
+        num_users = len(user_ids)
+        row_scores = len(scores)
+        if num_users != row_scores:
+            raise ValueError(
+                f"Number of user ids do not match with scores shape. # user ids: {num_users}, \
+        # rows in scores: {row_scores}"
+            )
+        return numpy.asarray(user_ids)
+    # no userids meaning we create consecutive user_ids with the same shape as scores passed
+    logging.warning(
+        "user_ids have not been passed as input, creating consecutive user_ids starting from 0"
+    )
+    return numpy.arange(scores.shape[0], dtype=code_dtype(scores.shape[0]))
+
+
+def _score_batches(
+    score_fn: ScoreFn,
+    user_ids: npt.NDArray[Any],
+    batch_size: int,
+) -> Iterator[ScoreBatch]:
+    """Score the users in consecutive batches
+
+    Args:
+        score_fn (ScoreFn): returns the scores of the users
+        user_ids (npt.NDArray[Any]): users to score
+        batch_size (int): number of users scored at once
+
+    Yields:
+        Iterator[ScoreBatch]: user ids and scores of each batch
+    """
+    for start in range(0, len(user_ids), batch_size):
+        batch_user_ids = user_ids[start : start + batch_size]
+        yield batch_user_ids, score_fn(batch_user_ids)
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterable
+
+import numpy
+import numpy.typing as npt
+import pandas
+
+from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+from recval.encoding import IdEncoder
+from recval.metrics.metrics_utils import (
+    HitMatrix,
+    csr_take_rows,
+    get_hit_matrix_from_topk,
+)
+from recval.utils import CSRLike
+
+
+@dataclass(frozen=True)
+class HoldoutIndex:
+    """Ground truth data encoded once and reused across evaluations
+
+    Users and items are encoded as integer codes sorted by their ids, the items of every user are stored
+    as CSR-style arrays. The number of ground truth items and the ideal DCG of each user are cached, so
+    that repeated evaluations against the same holdout only pay for the recommendation side.
+
+    Attributes:
+        user_ids (npt.NDArray[numpy.generic]): sorted ids of the holdout users, one for each CSR row.
+        item_ids (npt.NDArray[numpy.generic]): sorted ids of the holdout items.
+        indptr (npt.NDArray[numpy.int64]): CSR index pointer, one row per user.
+        indices (npt.NDArray[numpy.int64]): item codes of each user, sorted within each row.
+        actual (npt.NDArray[numpy.int64]): number of ground truth items of each user.
+        idcg (dict[int, npt.NDArray[numpy.float_]]): ideal DCG of each user at each cutoff, filled lazily.
+    """
+
+    user_ids: npt.NDArray[numpy.generic]
+    item_ids: npt.NDArray[numpy.generic]
+    indptr: npt.NDArray[numpy.int64]
+    indices: npt.NDArray[numpy.int64]
+    actual: npt.NDArray[numpy.int64]
+    idcg: dict[int, npt.NDArray[numpy.float_]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    @classmethod
+    def from_frame(
+        cls,
+        holdout_df: pandas.DataFrame,
+        col_user: str = DEFAULT_USER_COL,
+        col_item: str = DEFAULT_ITEM_COL,
+    ) -> HoldoutIndex:
+        """Build the index from the holdout dataframe
+
+        Args:
+            holdout_df (pandas.DataFrame): ground truth data, one row for each user-item pair
+            col_user (str, optional): column name for user. Defaults to user_id.
+            col_item (str, optional): column name for item. Defaults to item_id.
+
+        Returns:
+            HoldoutIndex: index of the holdout data
+        """
+        user_codes, user_ids = pandas.factorize(holdout_df[col_user], sort=True)
+        item_codes, item_ids = pandas.factorize(holdout_df[col_item], sort=True)
+        actual = numpy.bincount(user_codes, minlength=len(user_ids)).astype(numpy.int64)
+        indptr = numpy.zeros(len(user_ids) + 1, dtype=numpy.int64)
+        numpy.cumsum(actual, out=indptr[1:])
+        order = numpy.lexsort((item_codes, user_codes))
+        return cls(
+            user_ids=numpy.asarray(user_ids),
+            item_ids=numpy.asarray(item_ids),
+            indptr=indptr,
+            indices=item_codes[order].astype(numpy.int64),
+            actual=actual,
+        )
+
+    @classmethod
+    def from_csr(
+        cls,
+        holdout_csr: CSRLike,
+        user_ids: npt.NDArray[numpy.generic] | list[int] | None = None,
+    ) -> HoldoutIndex:
+        """Build the index straight from a sparse CSR user-item matrix, without a long-format dataframe
+
+        Items are the column indices of the matrix, rows without items are not holdout users.
+
+        Args:
+            holdout_csr (CSRLike): ground truth user-item matrix, such as `scipy.sparse.csr_matrix`
+            user_ids (npt.NDArray[numpy.generic] | list[int] | None, optional): unique user id associated to each
+                row. Defaults to None, meaning the row indices.
+
+        Returns:
+            HoldoutIndex: index of the holdout data
+        """
+        n_rows, n_items = holdout_csr.shape
+        indptr = numpy.asarray(holdout_csr.indptr, dtype=numpy.int64)
+        indices = numpy.asarray(holdout_csr.indices, dtype=numpy.int64)
+        row_ids = numpy.arange(n_rows) if user_ids is None else numpy.asarray(user_ids)
+        if len(row_ids) != n_rows:
+            raise ValueError(
+                f"Number of user ids do not match with the holdout rows. # user ids: {len(row_ids)}, \
+        # rows in holdout: {n_rows}"
+            )
+
+        if not (row_ids[1:] > row_ids[:-1]).all():
+            # users are sorted by id, as in `from_frame`
+            order = numpy.argsort(row_ids, kind="stable")
+            row_ids = row_ids[order]
+            indptr, indices = csr_take_rows(indptr, indices, rows=order)
+
+        rows = numpy.repeat(numpy.arange(n_rows, dtype=numpy.int64), numpy.diff(indptr))
+        same_row = rows[1:] == rows[:-1]
+        # canonical matrices have sorted indices without duplicates, the others are sorted here
+        if not (indices[1:] > indices[:-1])[same_row].all():
+            order = numpy.lexsort((indices, rows))
+            rows, indices = rows[order], indices[order]
+            keep = numpy.ones(len(indices), dtype=numpy.bool_)
+            keep[1:] = (rows[1:] != rows[:-1]) | (indices[1:] != indices[:-1])
+            rows, indices = rows[keep], indices[keep]
+
+        counts = numpy.bincount(rows, minlength=n_rows)
+        non_empty = counts > 0
+        actual = counts[non_empty].astype(numpy.int64)
+        indptr = numpy.zeros(len(actual) + 1, dtype=numpy.int64)
+        numpy.cumsum(actual, out=indptr[1:])
+        return cls(
+            user_ids=row_ids[non_empty],
+            item_ids=numpy.arange(n_items),
+            indptr=indptr,
+            indices=indices,
+            actual=actual,
+        )
+
+    @property
+    def n_users(self) -> int:
+        """Number of holdout users"""
+        return len(self.user_ids)
+
+    @cached_property
+    def users(self) -> IdEncoder:
+        """Encoder of the user ids to their rows, built once and reused by every lookup"""
+        return IdEncoder(self.user_ids)
+
+    @cached_property
+    def items(self) -> IdEncoder:
+        """Encoder of the item ids to their codes, built once and reused by every lookup"""
+        return IdEncoder(self.item_ids)
+
+    @cached_property
+    def item_indices(self) -> npt.NDArray[numpy.int64]:
+        """Item ids of each user, sorted within each row, items have to be integer ids"""
+        return self.items.decode(self.indices).astype(numpy.int64)
+
+    def to_frame(
+        self, col_user: str = DEFAULT_USER_COL, col_item: str = DEFAULT_ITEM_COL
+    ) -> pandas.DataFrame:
+        """Convert the index back to a holdout dataframe
+
+        Args:
+            col_user (str, optional): column name for user. Defaults to user_id.
+            col_item (str, optional): column name for item. Defaults to item_id.
+
+        Returns:
+            pandas.DataFrame: holdout dataframe, sorted by user and item
+        """
+        return pandas.DataFrame(
+            {
+                col_user: numpy.repeat(self.user_ids, self.actual),
+                col_item: self.items.decode(self.indices),
+            }
+        )
+
+    def user_rows(
+        self, user_ids: npt.NDArray[numpy.generic], all_users: bool = True
+    ) -> npt.NDArray[numpy.int64]:
+        """Find the rows of the given users
+
+        Args:
+            user_ids (npt.NDArray[numpy.generic]): ids of the users
+            all_users (bool, optional): whether user_ids have to contain every holdout user. Defaults to True.
+
+        Returns:
+            npt.NDArray[numpy.int64]: row of each user
+        """
+        if len(user_ids) == self.n_users and numpy.array_equal(user_ids, self.user_ids):
+            return numpy.arange(self.n_users, dtype=numpy.int64)
+
+        rows: npt.NDArray[numpy.int64] = self.users.encode(
+            user_ids, strict=False
+        ).astype(numpy.int64)
+        if all_users:
+            n_pred_users = len(numpy.unique(rows[rows >= 0]))
+            # repeated users would be averaged more than once
+            if (
+                rows.min(initial=0) < 0
+                or n_pred_users != self.n_users
+                or len(rows) != n_pred_users
+            ):
+                raise ValueError(
+                    f"Missing predictions for some users: ground truth users: {self.n_users}, "
+                    f"predicted users: {n_pred_users}, scored rows: {len(rows)}"
+                )
+        elif (rows < 0).any():
+            raise ValueError("Scored users have to be holdout users")
+        return rows
+
+    def csr(
+        self, rows: npt.NDArray[numpy.int64], item_codes: bool = False
+    ) -> tuple[npt.NDArray[numpy.int64], npt.NDArray[numpy.int64]]:
+        """CSR-style arrays of the given rows, the cached arrays are returned when rows cover every user in order
+
+        Args:
+            rows (npt.NDArray[numpy.int64]): rows to select, see `user_rows`
+            item_codes (bool, optional): whether to return item codes rather than item ids. Defaults to False.
+
+        Returns:
+            tuple[npt.NDArray[numpy.int64], npt.NDArray[numpy.int64]]: indptr and indices arrays of the rows
+        """
+        indices = self.indices if item_codes else self.item_indices
+        if self._all_rows(rows):
+            return self.indptr, indices
+        return csr_take_rows(self.indptr, indices, rows=rows)
+
+    def encode_recs(
+        self,
+        recs_df: pandas.DataFrame,
+        max_cutoff: int,
+        col_user: str = DEFAULT_USER_COL,
+        col_item: str = DEFAULT_ITEM_COL,
+        item_ids: bool = False,
+    ) -> npt.NDArray[numpy.int_]:
+        """Encode recommendations as a dense matrix of item codes aligned to the holdout users
+
+        Recommended items which are not holdout items can never be hits, they are encoded as -1 like the
+        missing ranks.
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations dataframe, has to contain the rank column
+            max_cutoff (int): largest cutoff used to compute recommendations
+            col_user (str, optional): column name for user. Defaults to user_id.
+            col_item (str, optional): column name for item. Defaults to item_id.
+            item_ids (bool, optional): whether to keep the item ids rather than encoding them, items have to be
+                integer ids. Defaults to False.
+
+        Returns:
+            npt.NDArray[numpy.int_]: (n_users, max_cutoff) item codes (or int64 ids) sorted by rank, codes are
+            int32 unless there are more than 2^31 - 1 items
+        """
+        return self.encode_rec_batches(
+            [recs_df],
+            max_cutoff=max_cutoff,
+            col_user=col_user,
+            col_item=col_item,
+            item_ids=item_ids,
+        )
+
+    def encode_rec_batches(  # pylint: disable=too-many-arguments
+        self,
+        batches: Iterable[pandas.DataFrame],
+        max_cutoff: int,
+        col_user: str = DEFAULT_USER_COL,
+        col_item: str = DEFAULT_ITEM_COL,
+        item_ids: bool = False,
+    ) -> npt.NDArray[numpy.int_]:
+        """Encode recommendations read in batches, such as the record batches of a Parquet file, see `encode_recs`
+
+        Each batch is scattered into the dense matrix as soon as it is read, hence only one batch is held in
+        memory at a time and the recommendations of a user may span several batches.
+
+        Args:
+            batches (Iterable[pandas.DataFrame]): recommendations dataframes, each has to contain the rank column.
+            max_cutoff (int): largest cutoff used to compute recommendations
+            col_user (str, optional): column name for user. Defaults to user_id.
+            col_item (str, optional): column name for item. Defaults to item_id.
+            item_ids (bool, optional): whether to keep the item ids rather than encoding them, items have to be
+                integer ids. Defaults to False.
+
+        Returns:
+            npt.NDArray[numpy.int_]: (n_users, max_cutoff) item codes (or int64 ids) sorted by rank, codes are
+            int32 unless there are more than 2^31 - 1 items
+        """
+        top_items = numpy.full(
+            (self.n_users, max_cutoff),
+            -1,
+            dtype=numpy.int64 if item_ids else self.items.dtype,
+        )
+        predicted = numpy.zeros(self.n_users, dtype=numpy.bool_)
+        unknown_users = 0
+        for recs_df in batches:
+            recs_df = recs_df[recs_df["rank"] <= max_cutoff]
+            pred_rows = self.users.encode(recs_df[col_user], strict=False)
+            known = pred_rows >= 0
+            if not known.all():
+                unknown_users += recs_df.loc[~known, col_user].nunique()
+                recs_df, pred_rows = recs_df[known], pred_rows[known]
+            predicted[pred_rows] = True
+            top_items[pred_rows, recs_df["rank"].to_numpy() - 1] = (
+                recs_df[col_item].to_numpy(dtype=numpy.int64)
+                if item_ids
+                else self.items.encode(recs_df[col_item], strict=False)
+            )
+
+        # Make sure the prediction and true data frames have the same set of users
+        n_pred_users = int(predicted.sum()) + unknown_users
+        if unknown_users or n_pred_users != self.n_users:
+            raise ValueError(
+                f"Missing predictions for some users: ground truth users: {self.n_users}, "
+                f"predicted users: {n_pred_users}"
+            )
+        return top_items
+
+    def hit_matrix(
+        self,
+        top_items: npt.NDArray[numpy.int_],
+        rows: npt.NDArray[numpy.int64],
+        item_codes: bool = False,
+    ) -> HitMatrix:
+        """Compute the dense hit matrix of the given rows
+
+        Args:
+            top_items (npt.NDArray[numpy.int_]): (len(rows), max_cutoff) top-k items of each row, padded with -1
+            rows (npt.NDArray[numpy.int64]): rows of the users, see `user_rows`
+            item_codes (bool, optional): whether top_items holds item codes rather than item ids.
+                Defaults to False.
+
+        Returns:
+            HitMatrix: hit matrix of the users, sharing the cached IDCG when rows cover every user in order
+        """
+        indptr, indices = self.csr(rows, item_codes=item_codes)
+        hit_matrix = get_hit_matrix_from_topk(
+            top_items, indptr=indptr, indices=indices, user_ids=self.users.decode(rows)
+        )
+        if self._all_rows(rows):
+            hit_matrix.idcg = self.idcg
+        if item_codes:
+            # the beyond-accuracy metrics need the item ids
+            hit_matrix.top_items = None
+        return hit_matrix
+
+    def _all_rows(self, rows: npt.NDArray[numpy.int64]) -> bool:
+        """Whether rows cover every user in order"""
+        return len(rows) == self.n_users and bool(
+            (rows == numpy.arange(self.n_users)).all()
+        )
@@ -1,2 +1,17 @@
 from .factory import MetricFactory
-from .metrics import MAP, NDCG, F1Score, Precision, Recall
+from .metrics import (
+    AUC,
+    MAP,
+    MRR,
+    NDCG,
+    AveragePopularity,
+    Coverage,
+    F1Score,
+    Gini,
+    HitRate,
+    IntraListDiversity,
+    Novelty,
+    Precision,
+    Recall,
+    RPrecision,
+)
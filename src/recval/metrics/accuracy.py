@@ -1,7 +1,10 @@
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 
 from recval.constants import DEFAULT_USER_COL
+from recval.metrics.context import MetricContext
+from recval.metrics.metrics_utils import HitMatrix
 
 
 def recall(
@@ -64,3 +67,106 @@ def f1_score(
         / ((prec_rec_df["precision"] + prec_rec_df["recall"]) + np.finfo(float).eps)
     )
     return prec_rec_df[[DEFAULT_USER_COL, "f1_score"]]
+
+
+def hit_rate(
+    df_hit_count: pd.DataFrame,
+    col_user: str = DEFAULT_USER_COL,
+) -> pd.DataFrame:
+    """Compute HitRate for each user, 1 when at least one ground truth item is recommended.
+
+    Args:
+        df_hit_count (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        col_user (str, optional): column containing user_id. Defaults to user_id.
+
+    Returns:
+        pd.DataFrame: dataframe containing hit rate for each user.
+    """
+    hr = (df_hit_count["hit"] > 0).astype(np.float_)
+    users = df_hit_count[col_user]
+    return pd.DataFrame(zip(users, hr), columns=[col_user, "hit_rate"])
+
+
+def recall_from_hits(hit_matrix: HitMatrix, cutoff: int) -> npt.NDArray[np.float_]:
+    """Compute Recall for each user from the dense hit matrix.
+
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: recall for each user.
+    """
+    return hit_matrix.hit_count(cutoff) / hit_matrix.actual
+
+
+def precision_from_hits(hit_matrix: HitMatrix, cutoff: int) -> npt.NDArray[np.float_]:
+    """Compute Precision for each user from the dense hit matrix.
+
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: precision for each user.
+    """
+    return hit_matrix.hit_count(cutoff) / cutoff
+
+
+def f1_score_from_hits(hit_matrix: HitMatrix, cutoff: int) -> npt.NDArray[np.float_]:
+    """Compute F1_score for each user from the dense hit matrix.
+
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: f1_score for each user.
+    """
+    rec = recall_from_hits(hit_matrix, cutoff)
+    prec = precision_from_hits(hit_matrix, cutoff)
+    return 2 * (prec * rec) / ((prec + rec) + np.finfo(float).eps)
+
+
+def hit_rate_from_hits(hit_matrix: HitMatrix, cutoff: int) -> npt.NDArray[np.float_]:
+    """Compute HitRate for each user from the dense hit matrix.
+
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: hit rate for each user.
+    """
+    hr: npt.NDArray[np.float_] = (
+        hit_matrix.hits[:, :cutoff].any(axis=1).astype(np.float_)
+    )
+    return hr
+
+
+def f1_score_from_context(context: MetricContext) -> npt.NDArray[np.float_]:
+    """Compute F1_score for each user from the recall and precision of the context, without merging them.
+
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+
+    Returns:
+        npt.NDArray[np.float_]: f1_score for each user.
+    """
+    rec = context.recall
+    prec = context.precision
+    f1: npt.NDArray[np.float_] = 2 * (prec * rec) / ((prec + rec) + np.finfo(float).eps)
+    return f1
+
+
+def hit_rate_from_context(context: MetricContext) -> npt.NDArray[np.float_]:
+    """Compute HitRate for each user from the hit counts of the context.
+
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+
+    Returns:
+        npt.NDArray[np.float_]: hit rate for each user.
+    """
+    hr: npt.NDArray[np.float_] = (context.hit_count > 0).astype(np.float_)
+    return hr
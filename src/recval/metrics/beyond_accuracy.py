@@ -0,0 +1,162 @@
+import numpy as np
+import numpy.typing as npt
+
+from recval.constants import DEFAULT_BATCH_SIZE
+
+
+def recommendation_counts(
+    top_items: npt.NDArray[np.int_], cutoff: int, n_items: int
+) -> npt.NDArray[np.float64]:
+    """Count how many times each item is recommended within the cutoff.
+
+    Args:
+        top_items (npt.NDArray[np.int_]): (n_users, max_cutoff) top-k items of each user, padded with -1.
+        cutoff (int): cutoff used to retrieve recommendations
+        n_items (int): number of items in the catalogue.
+
+    Returns:
+        npt.NDArray[np.float64]: number of recommendations of each item.
+    """
+    items = top_items[:, :cutoff].ravel()
+    return np.bincount(items[items >= 0], minlength=n_items).astype(np.float64)
+
+
+def coverage_from_counts(item_counts: npt.NDArray[np.float64]) -> float:
+    """Catalogue coverage, fraction of the items recommended at least once.
+    Info: https://dl.acm.org/doi/10.1145/1864708.1864761
+    Args:
+        item_counts (npt.NDArray[np.float64]): number of recommendations of each item.
+
+    Returns:
+        float: catalogue coverage.
+    """
+    return float(np.count_nonzero(item_counts) / len(item_counts))
+
+
+def gini_from_counts(item_counts: npt.NDArray[np.float64]) -> float:
+    """Gini index of the recommendations, 0 when every item is recommended equally often and close to 1 when
+    a few items get all the recommendations.
+    Info: https://en.wikipedia.org/wiki/Gini_coefficient
+    Args:
+        item_counts (npt.NDArray[np.float64]): number of recommendations of each item.
+
+    Returns:
+        float: Gini index.
+    """
+    n_items = len(item_counts)
+    total = item_counts.sum()
+    if total == 0:
+        return 0.0
+    index = np.arange(1, n_items + 1)
+    return float(
+        ((2 * index - n_items - 1) * np.sort(item_counts)).sum() / (n_items * total)
+    )
+
+
+def novelty(
+    top_items: npt.NDArray[np.int_],
+    cutoff: int,
+    item_popularity: npt.NDArray[np.float_],
+) -> npt.NDArray[np.float_]:
+    """Novelty, mean self-information of the recommended items.
+    Info: https://dl.acm.org/doi/10.1145/2043932.2043955
+    Args:
+        top_items (npt.NDArray[np.int_]): (n_users, max_cutoff) top-k items of each user, padded with -1.
+        cutoff (int): cutoff used to retrieve recommendations
+        item_popularity (npt.NDArray[np.float_]): number of interactions of each item, items without
+            interactions count as interacted once.
+
+    Returns:
+        npt.NDArray[np.float_]: novelty for each user.
+    """
+    popularity = np.maximum(np.asarray(item_popularity, dtype=np.float64), 1)
+    self_information = -np.log2(popularity / popularity.sum())
+    return _mean_item_values(top_items, cutoff, self_information)
+
+
+def average_popularity(
+    top_items: npt.NDArray[np.int_],
+    cutoff: int,
+    item_popularity: npt.NDArray[np.float_],
+) -> npt.NDArray[np.float_]:
+    """Average Recommendation Popularity (ARP), mean popularity of the recommended items.
+    Info: https://arxiv.org/abs/1901.07555
+    Args:
+        top_items (npt.NDArray[np.int_]): (n_users, max_cutoff) top-k items of each user, padded with -1.
+        cutoff (int): cutoff used to retrieve recommendations
+        item_popularity (npt.NDArray[np.float_]): number of interactions of each item.
+
+    Returns:
+        npt.NDArray[np.float_]: ARP for each user.
+    """
+    return _mean_item_values(
+        top_items, cutoff, np.asarray(item_popularity, dtype=np.float64)
+    )
+
+
+def intra_list_diversity(
+    top_items: npt.NDArray[np.int_],
+    cutoff: int,
+    item_embeddings: npt.NDArray[np.float_],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> npt.NDArray[np.float_]:
+    """Intra-List Diversity (ILD), mean cosine distance between the pairs of recommended items.
+    Info: https://dl.acm.org/doi/10.1145/1060745.1060754
+    Args:
+        top_items (npt.NDArray[np.int_]): (n_users, max_cutoff) top-k items of each user, padded with -1.
+        cutoff (int): cutoff used to retrieve recommendations
+        item_embeddings (npt.NDArray[np.float_]): (n_items, n_features) embedding of each item.
+        batch_size (int, optional): number of users whose embeddings are gathered at once. Defaults to 10_000.
+
+    Returns:
+        npt.NDArray[np.float_]: ILD for each user, 0 for users with less than 2 recommended items.
+    """
+    n_users = top_items.shape[0]
+    ild = np.zeros(n_users)
+    for start in range(0, n_users, batch_size):
+        items = top_items[start : start + batch_size, :cutoff]
+        valid = items >= 0
+        # (batch_size, cutoff, n_features) normalized embeddings, zero for the padded ranks
+        embeddings = np.asarray(item_embeddings[np.maximum(items, 0)], dtype=np.float64)
+        norms = np.linalg.norm(embeddings, axis=2, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        embeddings *= valid[..., None]
+        # the sum of the similarities of every pair is the squared norm of the sum of the embeddings,
+        # minus the similarities of each embedding with itself
+        sum_norm = np.square(embeddings.sum(axis=1)).sum(axis=1)
+        self_norm = np.square(embeddings).sum(axis=(1, 2))
+        n_valid = valid.sum(axis=1)
+        n_pairs = n_valid * (n_valid - 1)
+        mean_similarity = np.divide(
+            sum_norm - self_norm,
+            n_pairs,
+            out=np.ones(len(items)),
+            where=n_pairs > 0,
+        )
+        ild[start : start + batch_size] = 1 - mean_similarity
+    return ild
+
+
+def _mean_item_values(
+    top_items: npt.NDArray[np.int_],
+    cutoff: int,
+    item_values: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float_]:
+    """Mean value of the recommended items of each user.
+
+    Args:
+        top_items (npt.NDArray[np.int_]): (n_users, max_cutoff) top-k items of each user, padded with -1.
+        cutoff (int): cutoff used to retrieve recommendations
+        item_values (npt.NDArray[np.float64]): value of each item.
+
+    Returns:
+        npt.NDArray[np.float_]: mean value for each user, 0 for users without recommended items.
+    """
+    items = top_items[:, :cutoff]
+    valid = items >= 0
+    totals = np.where(valid, item_values[np.maximum(items, 0)], 0.0).sum(axis=1)
+    n_valid = valid.sum(axis=1)
+    means: npt.NDArray[np.float_] = np.divide(
+        totals, n_valid, out=np.zeros(len(items)), where=n_valid > 0
+    )
+    return means
@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from recval.constants import DEFAULT_USER_COL
+
+
+@dataclass
+class MetricContext:
+    """Hit dataframes at one cutoff, with the intermediate results shared by the metrics
+
+    Every intermediate result is computed on first access and reused by the following metrics, per-user sums
+    over the hits are grouped sums over the row of the user in df_hit_count, so that no metric has to copy,
+    group or merge the dataframes again.
+
+    Attributes:
+        df_hit (pd.DataFrame): dataframe of recommendation hits, sorted by col_user and rank.
+        df_hit_count (pd.DataFrame): dataframe of hit counts vs actual relevant items per user.
+        cutoff (int): cutoff used to compute the recommendation.
+        col_user (str, optional): column containing user_ids. Defaults to `user_id`.
+    """
+
+    df_hit: pd.DataFrame
+    df_hit_count: pd.DataFrame
+    cutoff: int
+    col_user: str = DEFAULT_USER_COL
+
+    @cached_property
+    def n_users(self) -> int:
+        """Number of users"""
+        return len(self.df_hit_count)
+
+    @cached_property
+    def hit_rows(self) -> npt.NDArray[np.int_]:
+        """Row of df_hit_count of the user of each hit"""
+        rows: npt.NDArray[np.int_] = pd.Index(
+            self.df_hit_count[self.col_user]
+        ).get_indexer(self.df_hit[self.col_user])
+        return rows
+
+    @cached_property
+    def ranks(self) -> npt.NDArray[np.int_]:
+        """Rank of each hit"""
+        # ranks may be stored as int16, they are widened before any arithmetic
+        ranks: npt.NDArray[np.int_] = self.df_hit["rank"].to_numpy(dtype=np.int64)
+        return ranks
+
+    @cached_property
+    def hit_positions(self) -> npt.NDArray[np.int_]:
+        """Position of each hit among the hits of its user, starting from 1"""
+        positions: npt.NDArray[np.int_] = (
+            self.df_hit.groupby(self.col_user, sort=False).cumcount().to_numpy() + 1
+        )
+        return positions
+
+    @cached_property
+    def hit_count(self) -> npt.NDArray[np.int_]:
+        """Number of hits of each user"""
+        hit_count: npt.NDArray[np.int_] = self.df_hit_count["hit"].to_numpy()
+        return hit_count
+
+    @cached_property
+    def actual(self) -> npt.NDArray[np.int_]:
+        """Number of ground truth items of each user"""
+        actual: npt.NDArray[np.int_] = self.df_hit_count["actual"].to_numpy()
+        return actual
+
+    @cached_property
+    def recall(self) -> npt.NDArray[np.float_]:
+        """Recall of each user"""
+        recall_: npt.NDArray[np.float_] = self.hit_count / self.actual
+        return recall_
+
+    @cached_property
+    def precision(self) -> npt.NDArray[np.float_]:
+        """Precision of each user"""
+        precision_: npt.NDArray[np.float_] = self.hit_count / self.cutoff
+        return precision_
+
+    def user_sum(self, values: npt.NDArray[Any]) -> npt.NDArray[np.float_]:
+        """Sum values of the hits over the hits of each user
+
+        Args:
+            values (npt.NDArray[Any]): value of each hit.
+
+        Returns:
+            npt.NDArray[np.float_]: sum for each user, 0 for users without hits.
+        """
+        return np.bincount(
+            self.hit_rows, weights=values, minlength=self.n_users
+        ).astype(np.float_, copy=False)
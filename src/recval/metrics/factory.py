@@ -1,7 +1,22 @@
 from typing import Any
 
 from .metric_interface import MetricInterface
-from .metrics import MAP, NDCG, F1Score, Precision, Recall
+from .metrics import (
+    AUC,
+    MAP,
+    MRR,
+    NDCG,
+    AveragePopularity,
+    Coverage,
+    F1Score,
+    Gini,
+    HitRate,
+    IntraListDiversity,
+    Novelty,
+    Precision,
+    Recall,
+    RPrecision,
+)
 
 
 class MetricFactory:
@@ -15,6 +30,15 @@ class MetricFactory:
         Recall.name_(): Recall,
         Precision.name_(): Precision,
         F1Score.name_(): F1Score,
+        MRR.name_(): MRR,
+        HitRate.name_(): HitRate,
+        RPrecision.name_(): RPrecision,
+        AUC.name_(): AUC,
+        Coverage.name_(): Coverage,
+        Gini.name_(): Gini,
+        Novelty.name_(): Novelty,
+        AveragePopularity.name_(): AveragePopularity,
+        IntraListDiversity.name_(): IntraListDiversity,
     }
 
     @classmethod
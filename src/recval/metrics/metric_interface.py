@@ -1,8 +1,13 @@
 from dataclasses import dataclass, field
+from typing import ClassVar
 
+import numpy
+import numpy.typing as npt
 import pandas
 
 from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+from recval.metrics.context import MetricContext
+from recval.metrics.metrics_utils import HitMatrix
 
 
 @dataclass
@@ -14,6 +19,11 @@ class MetricInterface:
         col_item (str, optional): column name for item. Defaults to item_id.
     """
 
+    # whether the metric is the average of a value computed for each user
+    user_averaged: ClassVar[bool] = True
+    # whether the metric needs the recommended item ids, not only the hits
+    uses_top_items: ClassVar[bool] = False
+
     col_user: str = DEFAULT_USER_COL
     col_item: str = DEFAULT_ITEM_COL
     name: str = field(init=False)
@@ -41,13 +51,87 @@ class MetricInterface:
 
     def compute_metric(
         self, df_hit: pandas.DataFrame, df_hit_count: pandas.DataFrame, cutoff: int
-    ) -> float:  # pragma: no cover
+    ) -> float:
         """
-        Compute value of the metric
+        Compute value of the metric, on a context of its own, see `compute_metric_from_context`
 
         Attributes:
             df_hit (pandas.DataFrame): dataframe of recommendation hits, sorted by col_user and rank,
             df_hit_count (pandas.DataFrame): dataframe of hit counts vs actual relevant items per user
             cutoff (int): cutoff used to compute the recommendation
         """
+        return self.compute_metric_from_context(
+            MetricContext(
+                df_hit=df_hit,
+                df_hit_count=df_hit_count,
+                cutoff=cutoff,
+                col_user=self.col_user,
+            )
+        )
+
+    def compute_metric_from_context(
+        self, context: MetricContext
+    ) -> float:  # pragma: no cover
+        """
+        Compute value of the metric reusing the intermediate results shared by the metrics at the same cutoff
+
+        Attributes:
+            context (MetricContext): hit dataframes and their intermediate results
+        """
+        raise NotImplementedError
+
+    def compute_metric_from_hits(self, hit_matrix: HitMatrix, cutoff: int) -> float:
+        """
+        Compute value of the metric from the dense hit matrix, averaged over the users
+
+        Attributes:
+            hit_matrix (HitMatrix): dense hits of the users
+            cutoff (int): cutoff used to compute the recommendation
+        """
+        return self.metric_from_partial(
+            self.partial_from_hits(hit_matrix, cutoff), len(hit_matrix.hits)
+        )
+
+    def partial_size(self) -> int:
+        """Length of the partial results of the metric, see `partial_from_hits`"""
+        return 1
+
+    def partial_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float64]:
+        """
+        Compute the partial result of the metric over a set of users, partial results of disjoint sets of
+        users are added together. Defaults to the sum of the values of the users.
+
+        Attributes:
+            hit_matrix (HitMatrix): dense hits of the users
+            cutoff (int): cutoff used to compute the recommendation
+        """
+        return numpy.array(
+            [self.compute_user_metric_from_hits(hit_matrix, cutoff).sum()],
+            dtype=numpy.float64,
+        )
+
+    def metric_from_partial(
+        self, partial: npt.NDArray[numpy.float64], n_users: float
+    ) -> float:
+        """
+        Compute value of the metric from the partial result of every user
+
+        Attributes:
+            partial (npt.NDArray[numpy.float64]): partial result of the users, see `partial_from_hits`
+            n_users (float): number of users, weighted when the users are decayed
+        """
+        return float(partial[0] / n_users)
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:  # pragma: no cover
+        """
+        Compute value of the metric for each user from the dense hit matrix
+
+        Attributes:
+            hit_matrix (HitMatrix): dense hits of the users
+            cutoff (int): cutoff used to compute the recommendation
+        """
         raise NotImplementedError
@@ -1,8 +1,40 @@
-import pandas
+from dataclasses import dataclass, field
+from typing import ClassVar
 
-from recval.metrics.accuracy import f1_score, precision, recall
+import numpy
+import numpy.typing as npt
+
+from recval.metrics.accuracy import (
+    f1_score_from_context,
+    f1_score_from_hits,
+    hit_rate_from_context,
+    hit_rate_from_hits,
+    precision_from_hits,
+    recall_from_hits,
+)
+from recval.metrics.beyond_accuracy import (
+    average_popularity,
+    coverage_from_counts,
+    gini_from_counts,
+    intra_list_diversity,
+    novelty,
+    recommendation_counts,
+)
+from recval.metrics.context import MetricContext
 from recval.metrics.metric_interface import MetricInterface
-from recval.metrics.ranking import average_precision, ndcg
+from recval.metrics.metrics_utils import HitMatrix
+from recval.metrics.ranking import (
+    auc_from_context,
+    auc_from_hits,
+    average_precision_from_context,
+    average_precision_from_hits,
+    ndcg_from_context,
+    ndcg_from_hits,
+    r_precision_from_context,
+    r_precision_from_hits,
+    reciprocal_rank_from_context,
+    reciprocal_rank_from_hits,
+)
 
 
 class NDCG(MetricInterface):  # pylint: disable=too-few-public-methods
@@ -14,15 +46,13 @@ class NDCG(MetricInterface):  # pylint: disable=too-few-public-methods
     def name_() -> str:
         return "ndcg"
 
-    def compute_metric(
-        self, df_hit: pandas.DataFrame, df_hit_count: pandas.DataFrame, cutoff: int
-    ) -> float:
-        user_metric_df = ndcg(
-            df_hit=df_hit,
-            df_hit_count=df_hit_count,
-            cutoff=cutoff,
-        )
-        return float(user_metric_df[self.name].mean())
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(ndcg_from_context(context).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return ndcg_from_hits(hit_matrix, cutoff)
 
 
 class MAP(MetricInterface):  # pylint: disable=too-few-public-methods
@@ -34,14 +64,13 @@ class MAP(MetricInterface):  # pylint: disable=too-few-public-methods
     def name_() -> str:
         return "map"
 
-    def compute_metric(
-        self, df_hit: pandas.DataFrame, df_hit_count: pandas.DataFrame, _: int
-    ) -> float:
-        user_metric_df = average_precision(
-            df_hit=df_hit,
-            df_hit_count=df_hit_count,
-        )
-        return float(user_metric_df["avg_prec"].mean())
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(average_precision_from_context(context).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return average_precision_from_hits(hit_matrix, cutoff)
 
 
 class Recall(MetricInterface):  # pylint: disable=too-few-public-methods
@@ -53,13 +82,13 @@ class Recall(MetricInterface):  # pylint: disable=too-few-public-methods
     def name_() -> str:
         return "recall"
 
-    def compute_metric(
-        self, _: pandas.DataFrame, df_hit_count: pandas.DataFrame, __: int
-    ) -> float:
-        user_metric_df = recall(
-            df_hit_count=df_hit_count,
-        )
-        return float(user_metric_df[self.name].mean())
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(context.recall.mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return recall_from_hits(hit_matrix, cutoff)
 
 
 class Precision(MetricInterface):  # pylint: disable=too-few-public-methods
@@ -71,14 +100,13 @@ class Precision(MetricInterface):  # pylint: disable=too-few-public-methods
     def name_() -> str:
         return "precision"
 
-    def compute_metric(
-        self, _: pandas.DataFrame, df_hit_count: pandas.DataFrame, cutoff: int
-    ) -> float:
-        user_metric_df = precision(
-            df_hit_count=df_hit_count,
-            cutoff=cutoff,
-        )
-        return float(user_metric_df[self.name].mean())
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(context.precision.mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return precision_from_hits(hit_matrix, cutoff)
 
 
 class F1Score(MetricInterface):  # pylint: disable=too-few-public-methods
@@ -90,11 +118,264 @@ class F1Score(MetricInterface):  # pylint: disable=too-few-public-methods
     def name_() -> str:
         return "f1_score"
 
-    def compute_metric(
-        self, _: pandas.DataFrame, df_hit_count: pandas.DataFrame, cutoff: int
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(f1_score_from_context(context).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return f1_score_from_hits(hit_matrix, cutoff)
+
+
+class MRR(MetricInterface):  # pylint: disable=too-few-public-methods
+    """Mean Reciprocal Rank (MRR).
+    Info: https://en.wikipedia.org/wiki/Mean_reciprocal_rank
+    """
+
+    @staticmethod
+    def name_() -> str:
+        return "mrr"
+
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(reciprocal_rank_from_context(context).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return reciprocal_rank_from_hits(hit_matrix, cutoff)
+
+
+class HitRate(MetricInterface):  # pylint: disable=too-few-public-methods
+    """HitRate, fraction of users with at least one hit.
+    Info: https://dl.acm.org/doi/10.1145/963770.963776
+    """
+
+    @staticmethod
+    def name_() -> str:
+        return "hit_rate"
+
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(hit_rate_from_context(context).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return hit_rate_from_hits(hit_matrix, cutoff)
+
+
+class RPrecision(MetricInterface):  # pylint: disable=too-few-public-methods
+    """R-Precision.
+    Info: https://en.wikipedia.org/wiki/Evaluation_measures_(information_retrieval)#R-precision
+    """
+
+    @staticmethod
+    def name_() -> str:
+        return "r_precision"
+
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(r_precision_from_context(context).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return r_precision_from_hits(hit_matrix, cutoff)
+
+
+@dataclass
+class AUC(MetricInterface):  # pylint: disable=too-few-public-methods
+    """Area Under the ROC Curve (AUC), full or sampled depending on the items the users are ranked against.
+    Info: https://en.wikipedia.org/wiki/Receiver_operating_characteristic#Area_under_the_curve
+
+    Attributes:
+        n_items (int): number of items each user is ranked against, the catalogue size for the full AUC or
+            the number of candidates for the sampled AUC.
+    """
+
+    n_items: int = 0
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.n_items <= 0:
+            raise ValueError(
+                f"{self.name} needs the number of items, got n_items: {self.n_items}"
+            )
+
+    @staticmethod
+    def name_() -> str:
+        return "auc"
+
+    def compute_metric_from_context(self, context: MetricContext) -> float:
+        return float(auc_from_context(context, n_items=self.n_items).mean())
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return auc_from_hits(hit_matrix, cutoff, n_items=self.n_items)
+
+
+def _top_items(hit_matrix: HitMatrix, name: str) -> npt.NDArray[numpy.int_]:
+    """Recommended item ids of the hit matrix, needed by the beyond-accuracy metrics
+
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users
+        name (str): name of the metric
+
+    Returns:
+        npt.NDArray[numpy.int_]: (n_users, max_cutoff) recommended item ids, padded with -1
+    """
+    if hit_matrix.top_items is None:
+        raise ValueError(f"{name} needs the recommended item ids, not only the hits")
+    return hit_matrix.top_items
+
+
+@dataclass
+class Coverage(
+    MetricInterface
+):  # pylint: disable=[too-few-public-methods,abstract-method]
+    """Catalogue coverage, fraction of the items recommended to at least one user.
+    Info: https://dl.acm.org/doi/10.1145/1864708.1864761
+
+    Attributes:
+        n_items (int): number of items in the catalogue, item ids have to be in [0, n_items).
+    """
+
+    user_averaged: ClassVar[bool] = False
+    uses_top_items: ClassVar[bool] = True
+
+    n_items: int = 0
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.n_items <= 0:
+            raise ValueError(
+                f"{self.name} needs the number of items, got n_items: {self.n_items}"
+            )
+
+    @staticmethod
+    def name_() -> str:
+        return "coverage"
+
+    def partial_size(self) -> int:
+        return self.n_items
+
+    def partial_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float64]:
+        # recommendation counts of the items are added across sets of users
+        item_counts = recommendation_counts(
+            _top_items(hit_matrix, self.name), cutoff=cutoff, n_items=self.n_items
+        )
+        if len(item_counts) > self.n_items:
+            raise ValueError(
+                f"Recommended item ids have to be lower than n_items: {self.n_items}"
+            )
+        return item_counts
+
+    def metric_from_partial(
+        self, partial: npt.NDArray[numpy.float64], n_users: float
     ) -> float:
-        user_metric_df = f1_score(
-            df_hit_count=df_hit_count,
-            cutoff=cutoff,
+        return coverage_from_counts(partial)
+
+
+@dataclass
+class Gini(Coverage):  # pylint: disable=[too-few-public-methods,abstract-method]
+    """Gini index of the recommendation counts of the items, measuring popularity concentration.
+    Info: https://en.wikipedia.org/wiki/Gini_coefficient
+    """
+
+    @staticmethod
+    def name_() -> str:
+        return "gini"
+
+    def metric_from_partial(
+        self, partial: npt.NDArray[numpy.float64], n_users: float
+    ) -> float:
+        return gini_from_counts(partial)
+
+
+@dataclass
+class Novelty(
+    MetricInterface
+):  # pylint: disable=[too-few-public-methods,abstract-method]
+    """Novelty, mean self-information of the recommended items.
+    Info: https://dl.acm.org/doi/10.1145/2043932.2043955
+
+    Attributes:
+        item_popularity (npt.NDArray[numpy.float_]): number of training interactions of each item, indexed by
+            item id.
+    """
+
+    uses_top_items: ClassVar[bool] = True
+
+    item_popularity: npt.NDArray[numpy.float_] = field(
+        default_factory=lambda: numpy.empty(0), repr=False
+    )
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if len(self.item_popularity) == 0:
+            raise ValueError(f"{self.name} needs the popularity of the items")
+
+    @staticmethod
+    def name_() -> str:
+        return "novelty"
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return novelty(_top_items(hit_matrix, self.name), cutoff, self.item_popularity)
+
+
+@dataclass
+class AveragePopularity(
+    Novelty
+):  # pylint: disable=[too-few-public-methods,abstract-method]
+    """Average Recommendation Popularity (ARP), measuring popularity bias.
+    Info: https://arxiv.org/abs/1901.07555
+    """
+
+    @staticmethod
+    def name_() -> str:
+        return "arp"
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return average_popularity(
+            _top_items(hit_matrix, self.name), cutoff, self.item_popularity
+        )
+
+
+@dataclass
+class IntraListDiversity(
+    MetricInterface
+):  # pylint: disable=[too-few-public-methods,abstract-method]
+    """Intra-List Diversity (ILD), mean cosine distance between the recommended items.
+    Info: https://dl.acm.org/doi/10.1145/1060745.1060754
+
+    Attributes:
+        item_embeddings (npt.NDArray[numpy.float_]): (n_items, n_features) embedding of each item, indexed by
+            item id.
+    """
+
+    uses_top_items: ClassVar[bool] = True
+
+    item_embeddings: npt.NDArray[numpy.float_] = field(
+        default_factory=lambda: numpy.empty((0, 0)), repr=False
+    )
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if len(self.item_embeddings) == 0:
+            raise ValueError(f"{self.name} needs the embeddings of the items")
+
+    @staticmethod
+    def name_() -> str:
+        return "ild"
+
+    def compute_user_metric_from_hits(
+        self, hit_matrix: HitMatrix, cutoff: int
+    ) -> npt.NDArray[numpy.float_]:
+        return intra_list_diversity(
+            _top_items(hit_matrix, self.name), cutoff, self.item_embeddings
         )
-        return float(user_metric_df[self.name].mean())
@@ -1,6 +1,81 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import numpy
+import numpy.typing as npt
 import pandas
 
 from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+from recval.profiling import add_rows, stage
+
+
+def check_common_users(
+    ground_truth_df: pandas.DataFrame,
+    pred_df: pandas.DataFrame,
+    col_user: str = DEFAULT_USER_COL,
+) -> None:
+    """Make sure the prediction and true data frames have the same set of users
+
+    Args:
+        ground_truth_df (pandas.DataFrame): Ground Truth DataFrame
+        pred_df (pandas.DataFrame): Prediction DataFrame
+        col_user (str, optional): column name for user. Defaults to user_id.
+    """
+    common_users = set(ground_truth_df[col_user]).intersection(set(pred_df[col_user]))
+    n_gt_users = ground_truth_df[col_user].nunique()
+    n_pred_users = pred_df[col_user].nunique()
+    if not len(common_users) == n_gt_users == n_pred_users:
+        raise ValueError(
+            f"Missing predictions for some users: ground truth users: {n_gt_users}, "
+            f"predicted users: {n_pred_users}, common_users: {len(common_users)}"
+        )
+
+
+def get_actual_count(
+    ground_truth_df: pandas.DataFrame,
+    col_user: str = DEFAULT_USER_COL,
+) -> pandas.DataFrame:
+    """Count the number of ground truth items for each user
+
+    Args:
+        ground_truth_df (pandas.DataFrame): Ground Truth DataFrame
+        col_user (str, optional): column name for user. Defaults to user_id.
+
+    Returns:
+        pandas.DataFrame: DataFrame of actual relevant items per user, sorted by col_user
+    """
+    return ground_truth_df.groupby(col_user, as_index=False)[col_user].agg(
+        {"actual": "count"}
+    )
+
+
+def get_hit_count(
+    df_hit: pandas.DataFrame,
+    df_actual: pandas.DataFrame,
+    col_user: str = DEFAULT_USER_COL,
+) -> pandas.DataFrame:
+    """Count the number of hits vs actual relevant items per user
+
+    Args:
+        df_hit (pandas.DataFrame): DataFrame of recommendation hits, as returned by `get_hit_rank`
+        df_actual (pandas.DataFrame): DataFrame of actual relevant items per user, as returned by `get_actual_count`
+        col_user (str, optional): column name for user. Defaults to user_id.
+
+    Returns:
+        pandas.DataFrame: DataFrame of hit counts vs actual relevant items per user
+    """
+    df_hit_count = pandas.merge(
+        df_hit.groupby(col_user, as_index=False)[col_user].agg({"hit": "count"}),
+        df_actual,
+        on=col_user,
+        how="right",
+    )
+
+    df_hit_count["hit"] = df_hit_count["hit"].fillna(0)
+
+    return df_hit_count
 
 
 def get_hit_rank(
@@ -8,6 +83,7 @@ def get_hit_rank(
     pred_df: pandas.DataFrame,
     col_user: str = DEFAULT_USER_COL,
     col_item: str = DEFAULT_ITEM_COL,
+    col_rating: str | None = None,
 ) -> tuple[pandas.DataFrame, pandas.DataFrame]:
     """Compute hit and hit ranks for each user
 
@@ -16,38 +92,215 @@ def get_hit_rank(
         pred_df (pandas.DataFrame): Prediction DataFrame
         col_user (str, optional): column name for user. Defaults to user_id.
         col_item (str, optional): column name for item. Defaults to item_id.
+        col_rating (str | None, optional): ground truth column holding the graded relevance, kept in the hits.
+            Defaults to None.
     Returns:
         tuple[pandas.DataFrame, pandas.DataFrame]:DataFrame of recommendation hits, sorted by col_user and rank,
         DataFrame of hit counts vs actual relevant items per user,
     """
 
     # Make sure the prediction and true data frames have the same set of users
-    common_users = set(ground_truth_df[col_user]).intersection(set(pred_df[col_user]))
-    # TODO: This can be made a warning
-    assert (
-        len(common_users)
-        == ground_truth_df[col_user].nunique()
-        == pred_df[col_user].nunique()
-    ), f"Missing predictions for some users: ground truth users: {ground_truth_df[col_user].nunique()}, \
-    predicted users: {pred_df[col_user].nunique()}, common_users: {len(common_users)}"
+    check_common_users(ground_truth_df, pred_df, col_user=col_user)
 
+    hit_cols = [col_user, col_item, "rank"]
+    if col_rating is not None:
+        hit_cols.append(col_rating)
+    # the hits follow the order of the predictions, which do not have to be sorted by rank
     df_hit = pandas.merge(pred_df, ground_truth_df, on=[col_user, col_item])[
-        [col_user, col_item, "rank"]
-    ]
+        hit_cols
+    ].sort_values([col_user, "rank"], kind="stable", ignore_index=True)
 
     if len(df_hit) == 0:
         raise ValueError("No hits found in prediction data.")
 
     # count the number of hits vs actual relevant items per user
-    df_hit_count = pandas.merge(
-        df_hit.groupby(col_user, as_index=False)[col_user].agg({"hit": "count"}),
-        ground_truth_df.groupby(col_user, as_index=False)[col_user].agg(
-            {"actual": "count"}
-        ),
-        on=col_user,
-        how="right",
+    df_hit_count = get_hit_count(
+        df_hit=df_hit,
+        df_actual=get_actual_count(ground_truth_df, col_user=col_user),
+        col_user=col_user,
     )
 
-    df_hit_count["hit"] = df_hit_count["hit"].fillna(0)
-
     return df_hit, df_hit_count
+
+
+def get_hit_rank_cutoffs(
+    ground_truth_df: pandas.DataFrame,
+    pred_df: pandas.DataFrame,
+    cutoffs: list[int],
+    col_user: str = DEFAULT_USER_COL,
+    col_item: str = DEFAULT_ITEM_COL,
+) -> Iterator[tuple[int, pandas.DataFrame, pandas.DataFrame]]:
+    """Compute hit and hit ranks for each user at every cutoff, joining predictions and ground truth only once
+
+    The join is performed on the predictions truncated at the largest cutoff, the hits at smaller cutoffs
+    are obtained by filtering the (much smaller) hit dataframe on the rank column. The join and the hit
+    counts are timed as the `hit_join` and `hit_count` stages of the active profile.
+
+    Args:
+        ground_truth_df (pandas.DataFrame): Ground Truth DataFrame
+        pred_df (pandas.DataFrame): Prediction DataFrame, has to contain the rank column
+        cutoffs (list[int]): cutoffs at which hits are computed
+        col_user (str, optional): column name for user. Defaults to user_id.
+        col_item (str, optional): column name for item. Defaults to item_id.
+
+    Yields:
+        Iterator[tuple[int, pandas.DataFrame, pandas.DataFrame]]: cutoff, DataFrame of recommendation hits sorted
+        by col_user and rank and DataFrame of hit counts vs actual relevant items per user, in the same order of
+        cutoffs
+    """
+    max_cutoff = max(cutoffs)
+    check_common_users(ground_truth_df, pred_df, col_user=col_user)
+
+    with stage("hit_join"):
+        # sorted once, the hits at smaller cutoffs keep the order of the user and rank
+        df_hit_max = pandas.merge(
+            pred_df[pred_df["rank"] <= max_cutoff],
+            ground_truth_df,
+            on=[col_user, col_item],
+        )[[col_user, col_item, "rank"]].sort_values(
+            [col_user, "rank"], kind="stable", ignore_index=True
+        )
+        df_actual = get_actual_count(ground_truth_df, col_user=col_user)
+        add_rows(len(df_hit_max))
+    # as in the numpy backend, smaller cutoffs without any hit have null metrics
+    if len(df_hit_max) == 0:
+        raise ValueError("No hits found in prediction data.")
+
+    for cutoff in cutoffs:
+        # the stage is closed before yielding, not to time the consumer of the hits
+        with stage("hit_count"):
+            if cutoff == max_cutoff:
+                df_hit = df_hit_max
+            else:
+                df_hit = df_hit_max[df_hit_max["rank"] <= cutoff]
+            df_hit_count = get_hit_count(
+                df_hit=df_hit, df_actual=df_actual, col_user=col_user
+            )
+            add_rows(len(df_hit))
+        yield cutoff, df_hit, df_hit_count
+
+
+@dataclass
+class HitMatrix:
+    """Dense representation of the recommendation hits of a set of users
+
+    Attributes:
+        user_ids (npt.NDArray[numpy.generic]): user id associated to each row.
+        hits (npt.NDArray[numpy.bool_]): (n_users, max_cutoff) matrix, True when the item recommended at rank
+            `column + 1` is a ground truth item of the user.
+        actual (npt.NDArray[numpy.int_]): number of ground truth items of each user.
+        idcg (dict[int, npt.NDArray[numpy.float_]]): ideal DCG of each user at each cutoff, filled lazily by
+            the ranking metrics and shared with the `HoldoutIndex` the hits are computed from.
+        top_items (npt.NDArray[numpy.int_] | None): (n_users, max_cutoff) recommended item ids, padded with -1,
+            used by the beyond-accuracy metrics. None when the items are only known through their codes.
+        hit_counts (dict[int, npt.NDArray[numpy.int_]]): number of hits of each user at each cutoff, filled lazily.
+    """
+
+    user_ids: npt.NDArray[numpy.generic]
+    hits: npt.NDArray[numpy.bool_]
+    actual: npt.NDArray[numpy.int_]
+    idcg: dict[int, npt.NDArray[numpy.float_]] = field(default_factory=dict, repr=False)
+    top_items: npt.NDArray[numpy.int_] | None = field(default=None, repr=False)
+    hit_counts: dict[int, npt.NDArray[numpy.int_]] = field(
+        default_factory=dict, repr=False
+    )
+
+    def hit_count(self, cutoff: int) -> npt.NDArray[numpy.int_]:
+        """Number of hits of each user within the given cutoff, computed once and shared by the metrics"""
+        if cutoff not in self.hit_counts:
+            self.hit_counts[cutoff] = numpy.asarray(
+                numpy.count_nonzero(self.hits[:, :cutoff], axis=1)
+            )
+        return self.hit_counts[cutoff]
+
+    def take(self, rows: npt.NDArray[numpy.int_]) -> HitMatrix:
+        """Select the hits of a subset of the users
+
+        Args:
+            rows (npt.NDArray[numpy.int_]): rows of the users to select
+
+        Returns:
+            HitMatrix: hit matrix of the selected users
+        """
+        return HitMatrix(
+            user_ids=self.user_ids[rows],
+            hits=self.hits[rows],
+            actual=self.actual[rows],
+            top_items=None if self.top_items is None else self.top_items[rows],
+        )
+
+
+def isin_sorted(
+    keys: npt.NDArray[numpy.int64], sorted_keys: npt.NDArray[numpy.int64]
+) -> npt.NDArray[numpy.bool_]:
+    """Vectorized membership test of keys against an array of sorted keys
+
+    Args:
+        keys (npt.NDArray[numpy.int64]): keys to look up
+        sorted_keys (npt.NDArray[numpy.int64]): sorted keys to look up into
+
+    Returns:
+        npt.NDArray[numpy.bool_]: True where the key is contained in sorted_keys
+    """
+    if len(sorted_keys) == 0:
+        return numpy.zeros(keys.shape, dtype=numpy.bool_)
+    pos = numpy.searchsorted(sorted_keys, keys)
+    # keys larger than every sorted key would point past the end of the array
+    pos[pos == len(sorted_keys)] = 0
+    return numpy.asarray(sorted_keys[pos] == keys)
+
+
+def get_hit_matrix_from_topk(
+    top_items: npt.NDArray[numpy.int_],
+    indptr: npt.NDArray[numpy.int64],
+    indices: npt.NDArray[numpy.int64],
+    user_ids: npt.NDArray[numpy.generic],
+) -> HitMatrix:
+    """Compute the dense hit matrix straight from the top-k items of each user
+
+    Args:
+        top_items (npt.NDArray[numpy.int_]): (n_users, max_cutoff) top-k items of each user, sorted by rank
+        indptr (npt.NDArray[numpy.int64]): CSR index pointer of the ground truth items, one row per user
+        indices (npt.NDArray[numpy.int64]): CSR ground truth items, sorted within each row
+        user_ids (npt.NDArray[numpy.generic]): user id associated to each row
+
+    Returns:
+        HitMatrix: hit matrix with one row for each user of top_items
+    """
+    n_users = top_items.shape[0]
+    actual = numpy.diff(indptr)
+    n_items = int(max(top_items.max(initial=0), indices.max(initial=0))) + 1
+
+    gt_rows = numpy.repeat(numpy.arange(n_users, dtype=numpy.int64), actual)
+    gt_keys = gt_rows * n_items + indices
+    pred_keys = numpy.arange(n_users, dtype=numpy.int64)[:, None] * n_items + top_items
+    # padded ranks (negative items) can never be hits
+    hits = isin_sorted(pred_keys, gt_keys) & (top_items >= 0)
+
+    return HitMatrix(
+        user_ids=numpy.asarray(user_ids), hits=hits, actual=actual, top_items=top_items
+    )
+
+
+def csr_take_rows(
+    indptr: npt.NDArray[numpy.int64],
+    indices: npt.NDArray[numpy.int64],
+    rows: npt.NDArray[numpy.int_],
+) -> tuple[npt.NDArray[numpy.int64], npt.NDArray[numpy.int64]]:
+    """Select a subset of rows from CSR-style arrays
+
+    Args:
+        indptr (npt.NDArray[numpy.int64]): CSR index pointer
+        indices (npt.NDArray[numpy.int64]): CSR indices
+        rows (npt.NDArray[numpy.int_]): rows to select, in the order they should be returned
+
+    Returns:
+        tuple[npt.NDArray[numpy.int64], npt.NDArray[numpy.int64]]: indptr and indices arrays of the selected rows
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    sub_indptr = numpy.zeros(len(rows) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=sub_indptr[1:])
+    # position of every selected entry in the original indices array
+    offsets = numpy.repeat(starts - sub_indptr[:-1], lengths)
+    return sub_indptr, indices[offsets + numpy.arange(sub_indptr[-1])]
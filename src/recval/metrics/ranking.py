@@ -1,14 +1,80 @@
+from functools import lru_cache
+
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 
-from recval.constants import DEFAULT_USER_COL
+from recval.constants import DEFAULT_RATING_COL, DEFAULT_USER_COL
+from recval.metrics.context import MetricContext
+from recval.metrics.metrics_utils import HitMatrix
+
+
+@lru_cache(maxsize=None)
+def discount(cutoff: int) -> npt.NDArray[np.float_]:
+    """Logarithmic discount of each rank up to the cutoff, computed once for each cutoff.
+    Args:
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: read-only discount of the ranks from 1 to cutoff.
+    """
+    discount_: npt.NDArray[np.float_] = 1 / np.log2(np.arange(2, cutoff + 2))
+    discount_.setflags(write=False)
+    return discount_
+
+
+@lru_cache(maxsize=None)
+def cumulative_discount(cutoff: int) -> npt.NDArray[np.float_]:
+    """Cumulative discount up to the cutoff, the IDCG of a user with `n` relevant items is its `min(n, cutoff)` entry.
+    Args:
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: read-only cumulative discount from 0 to cutoff ranks.
+    """
+    cum_discount = np.concatenate([[0.0], np.cumsum(discount(cutoff))])
+    cum_discount.setflags(write=False)
+    return cum_discount
+
+
+def get_ideal_dcg(
+    ground_truth_df: pd.DataFrame,
+    cutoff: int,
+    col_user: str = DEFAULT_USER_COL,
+    col_rating: str = DEFAULT_RATING_COL,
+) -> pd.DataFrame:
+    """Ideal Discounted Cumulative Gain (IDCG) with graded relevance.
+    Args:
+        ground_truth_df (pd.DataFrame): ground truth dataframe, containing the relevance of each item.
+        cutoff (int): cutoff used to retrieve recommendations
+        col_user (str, optional): column containing user_ids. Defaults to `user_id`.
+        col_rating (str, optional): column containing the relevance. Defaults to `rating`.
+
+    Returns:
+        pd.DataFrame: IDCG for each user.
+    """
+    # the ideal ranking sorts the ground truth items of each user by decreasing relevance
+    df_ideal = ground_truth_df[[col_user, col_rating]].sort_values(
+        [col_user, col_rating], ascending=[True, False]
+    )
+    ideal_rank = df_ideal.groupby(col_user, sort=False).cumcount().to_numpy()
+    in_cutoff = ideal_rank < cutoff
+    gains = df_ideal[col_rating].to_numpy(dtype=np.float_)[in_cutoff]
+    idcg = (
+        pd.Series(gains * discount(cutoff)[ideal_rank[in_cutoff]])
+        .groupby(df_ideal[col_user].to_numpy()[in_cutoff], sort=True)
+        .sum()
+    )
+    return pd.DataFrame({col_user: idcg.index, "idcg": idcg.to_numpy()})
 
 
-def ndcg(
+def ndcg(  # pylint: disable=too-many-arguments
     df_hit: pd.DataFrame,
     df_hit_count: pd.DataFrame,
     cutoff: int,
     col_user: str = DEFAULT_USER_COL,
+    col_rating: str | None = None,
+    df_idcg: pd.DataFrame | None = None,
 ) -> pd.DataFrame:
     """Normalized Discounted Cumulative Gain (nDCG).
     Info: https://en.wikipedia.org/wiki/Discounted_cumulative_gain
@@ -17,23 +83,35 @@ def ndcg(
         df_hit_count (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
         cutoff (int): cutoff used to retrieve recommendations
         col_user (str, optional): column containing user_ids. Defaults to `user_id`.
+        col_rating (str | None, optional): column of df_hit containing the graded relevance of each hit.
+            Defaults to None, meaning binary relevance.
+        df_idcg (pd.DataFrame | None, optional): IDCG for each user, as returned by `get_ideal_dcg`, required
+            with graded relevance. Defaults to None.
 
     Returns:
         pd.DataFrame: nDCG for each user.
     """
-    df_dcg = df_hit.copy()
-    # compute DCG, relevance in this case is always 1
-    df_dcg["dcg"] = 1 / np.log2(df_dcg["rank"] + 1)
+    ranks = df_hit["rank"].to_numpy()
+    # hits beyond the cutoff are still discounted by their rank
+    discount_ = discount(max(cutoff, int(ranks.max(initial=0))))
+    gains = discount_[ranks - 1]
+    if col_rating is not None:
+        gains = gains * df_hit[col_rating].to_numpy(dtype=np.float_)
     # sum up DCG
-    df_dcg = df_dcg.groupby(col_user, as_index=False, sort=False).agg({"dcg": "sum"})
-    # calculate ideal discounted cumulative gain
-    df_ndcg = pd.merge(df_dcg, df_hit_count, on=[col_user], how="right")
-    df_ndcg["idcg"] = df_ndcg["actual"].apply(
-        lambda x: sum(1 / np.log2(range(2, min(x, cutoff) + 2)))
-    )
-    df_ndcg["ndcg"] = (df_ndcg["dcg"] / df_ndcg["idcg"]).fillna(0)
+    dcg = pd.Series(gains).groupby(df_hit[col_user].to_numpy(), sort=False).sum()
+
+    df_ndcg = df_hit_count[[col_user]]
+    dcg_values = dcg.reindex(df_ndcg[col_user]).fillna(0).to_numpy()
+    if col_rating is None:
+        # ideal DCG is the cumulative discount up to the number of relevant items
+        idcg = ideal_dcg(df_hit_count["actual"].to_numpy(), cutoff)
+    elif df_idcg is not None:
+        idcg = df_idcg.set_index(col_user)["idcg"].reindex(df_ndcg[col_user]).to_numpy()
+    else:
+        raise ValueError("df_idcg is required with graded relevance.")
+    ndcg_ = np.divide(dcg_values, idcg, out=np.zeros_like(dcg_values), where=idcg > 0)
 
-    return df_ndcg[[DEFAULT_USER_COL, "ndcg"]]
+    return pd.DataFrame({col_user: df_ndcg[col_user].to_numpy(), "ndcg": ndcg_})
 
 
 def average_precision(
@@ -62,3 +140,318 @@ def average_precision(
     df_ap["avg_prec"] = df_ap["rr"] / (df_ap["actual"] + np.finfo(float).eps)
 
     return df_ap[[DEFAULT_USER_COL, "avg_prec"]]
+
+
+def reciprocal_rank(
+    df_hit: pd.DataFrame,
+    df_hit_count: pd.DataFrame,
+    col_user: str = DEFAULT_USER_COL,
+) -> pd.DataFrame:
+    """Reciprocal Rank (RR) of the first hit, averaged over the users it gives the Mean Reciprocal Rank (MRR).
+    Info: https://en.wikipedia.org/wiki/Mean_reciprocal_rank
+    Args:
+        df_hit (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        df_hit_count (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        col_user (str, optional): column containing user_ids. Defaults to `user_id`.
+
+    Returns:
+        pd.DataFrame: RR for each user.
+    """
+    first_rank = df_hit.groupby(col_user, sort=False)["rank"].min()
+    users = df_hit_count[col_user]
+    rr = 1 / first_rank.reindex(users).to_numpy(dtype=np.float_)
+    return pd.DataFrame({col_user: users.to_numpy(), "mrr": np.nan_to_num(rr)})
+
+
+def r_precision(
+    df_hit: pd.DataFrame,
+    df_hit_count: pd.DataFrame,
+    cutoff: int,
+    col_user: str = DEFAULT_USER_COL,
+) -> pd.DataFrame:
+    """R-Precision, precision at the number R of ground truth items of the user, capped at the cutoff.
+    Info: https://en.wikipedia.org/wiki/Evaluation_measures_(information_retrieval)#R-precision
+    Args:
+        df_hit (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        df_hit_count (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        cutoff (int): cutoff used to retrieve recommendations
+        col_user (str, optional): column containing user_ids. Defaults to `user_id`.
+
+    Returns:
+        pd.DataFrame: R-Precision for each user.
+    """
+    users = df_hit_count[col_user]
+    r = pd.Series(
+        np.minimum(df_hit_count["actual"].to_numpy(), cutoff), index=users.to_numpy()
+    )
+    # hits ranked within the first R recommendations of their user
+    in_r = df_hit["rank"].to_numpy() <= r.reindex(df_hit[col_user]).to_numpy()
+    r_hits = pd.Series(in_r).groupby(df_hit[col_user].to_numpy(), sort=False).sum()
+    r_prec = r_hits.reindex(users).fillna(0).to_numpy() / r.to_numpy()
+    return pd.DataFrame({col_user: users.to_numpy(), "r_precision": r_prec})
+
+
+def auc(
+    df_hit: pd.DataFrame,
+    df_hit_count: pd.DataFrame,
+    cutoff: int,
+    n_items: int,
+    col_user: str = DEFAULT_USER_COL,
+) -> pd.DataFrame:
+    """Area Under the ROC Curve (AUC) of the ranking truncated at the cutoff, see `auc_from_hits`.
+    Info: https://en.wikipedia.org/wiki/Receiver_operating_characteristic#Area_under_the_curve
+    Args:
+        df_hit (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        df_hit_count (pd.DataFrame): df containing number of hit and number of ground truth item for each user.
+        cutoff (int): cutoff used to retrieve recommendations
+        n_items (int): number of items each user is ranked against.
+        col_user (str, optional): column containing user_ids. Defaults to `user_id`.
+
+    Returns:
+        pd.DataFrame: AUC for each user.
+    """
+    # negatives ranked above each hit
+    above = df_hit["rank"].to_numpy() - (df_hit.groupby(col_user).cumcount() + 1)
+    above_sum = pd.Series(above.to_numpy()).groupby(df_hit[col_user].to_numpy()).sum()
+    users = df_hit_count[col_user]
+    auc_ = _truncated_auc(
+        hit=df_hit_count["hit"].to_numpy(),
+        above=above_sum.reindex(users).fillna(0).to_numpy(),
+        actual=df_hit_count["actual"].to_numpy(),
+        cutoff=cutoff,
+        n_items=n_items,
+    )
+    return pd.DataFrame({col_user: users.to_numpy(), "auc": auc_})
+
+
+def ndcg_from_hits(hit_matrix: HitMatrix, cutoff: int) -> npt.NDArray[np.float_]:
+    """Normalized Discounted Cumulative Gain (nDCG) from the dense hit matrix.
+    Info: https://en.wikipedia.org/wiki/Discounted_cumulative_gain
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: nDCG for each user.
+    """
+    # relevance in this case is always 1
+    dcg = hit_matrix.hits[:, :cutoff] @ discount(cutoff)
+    if cutoff not in hit_matrix.idcg:
+        hit_matrix.idcg[cutoff] = ideal_dcg(hit_matrix.actual, cutoff)
+    idcg = hit_matrix.idcg[cutoff]
+    ndcg_: npt.NDArray[np.float_] = np.divide(
+        dcg, idcg, out=np.zeros_like(dcg), where=idcg > 0
+    )
+    return ndcg_
+
+
+def ideal_dcg(actual: npt.NDArray[np.int_], cutoff: int) -> npt.NDArray[np.float_]:
+    """Ideal Discounted Cumulative Gain (IDCG), with binary relevance.
+    Args:
+        actual (npt.NDArray[np.int_]): number of ground truth items of each user.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: IDCG for each user.
+    """
+    # ideal DCG is the cumulative discount up to the number of relevant items
+    idcg: npt.NDArray[np.float_] = cumulative_discount(cutoff)[
+        np.minimum(actual, cutoff)
+    ]
+    return idcg
+
+
+def average_precision_from_hits(
+    hit_matrix: HitMatrix, cutoff: int
+) -> npt.NDArray[np.float_]:
+    """Average Precision (AP) from the dense hit matrix.
+    Info: https://en.wikipedia.org/wiki/Evaluation_measures_(information_retrieval)#Average_precision
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: AP for each user.
+    """
+    hits = hit_matrix.hits[:, :cutoff]
+    # precision at the rank of every hit, summed up
+    prec_at_rank = np.cumsum(hits, axis=1) / np.arange(1, cutoff + 1)
+    rr = (prec_at_rank * hits).sum(axis=1)
+    avg_prec: npt.NDArray[np.float_] = rr / (hit_matrix.actual + np.finfo(float).eps)
+    return avg_prec
+
+
+def reciprocal_rank_from_hits(
+    hit_matrix: HitMatrix, cutoff: int
+) -> npt.NDArray[np.float_]:
+    """Reciprocal Rank (RR) of the first hit from the dense hit matrix.
+    Info: https://en.wikipedia.org/wiki/Mean_reciprocal_rank
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: RR for each user.
+    """
+    hits = hit_matrix.hits[:, :cutoff]
+    first_rank = hits.argmax(axis=1) + 1
+    rr: npt.NDArray[np.float_] = np.where(hits.any(axis=1), 1 / first_rank, 0.0)
+    return rr
+
+
+def r_precision_from_hits(hit_matrix: HitMatrix, cutoff: int) -> npt.NDArray[np.float_]:
+    """R-Precision from the dense hit matrix.
+    Info: https://en.wikipedia.org/wiki/Evaluation_measures_(information_retrieval)#R-precision
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+
+    Returns:
+        npt.NDArray[np.float_]: R-Precision for each user.
+    """
+    r = np.minimum(hit_matrix.actual, cutoff)
+    # hits within the first r ranks, the ranks beyond r are masked out
+    in_r = np.arange(cutoff) < r[:, None]
+    r_hits = np.count_nonzero(hit_matrix.hits[:, :cutoff] & in_r, axis=1)
+    r_prec: npt.NDArray[np.float_] = r_hits / r
+    return r_prec
+
+
+def auc_from_hits(
+    hit_matrix: HitMatrix, cutoff: int, n_items: int
+) -> npt.NDArray[np.float_]:
+    """Area Under the ROC Curve (AUC) of the ranking truncated at the cutoff.
+
+    The AUC is the fraction of (ground truth, other item) pairs ranked in the right order. Ground truth items
+    missing from the top-k are ranked below the other items of the top-k and tied with the remaining ones,
+    hence the AUC is exact when the cutoff covers every item. Passing the number of candidates of each user
+    as `n_items` gives the sampled AUC.
+    Info: https://en.wikipedia.org/wiki/Receiver_operating_characteristic#Area_under_the_curve
+    Args:
+        hit_matrix (HitMatrix): dense hits of the users.
+        cutoff (int): cutoff used to retrieve recommendations
+        n_items (int): number of items each user is ranked against.
+
+    Returns:
+        npt.NDArray[np.float_]: AUC for each user.
+    """
+    hits = hit_matrix.hits[:, :cutoff]
+    # negatives ranked above each hit, its rank minus the hits up to it
+    above = (np.arange(1, cutoff + 1) - np.cumsum(hits, axis=1)) * hits
+    return _truncated_auc(
+        hit=np.count_nonzero(hits, axis=1),
+        above=above.sum(axis=1),
+        actual=hit_matrix.actual,
+        cutoff=cutoff,
+        n_items=n_items,
+    )
+
+
+def ndcg_from_context(context: MetricContext) -> npt.NDArray[np.float_]:
+    """Normalized Discounted Cumulative Gain (nDCG) from the shared intermediate results, see `ndcg`.
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+
+    Returns:
+        npt.NDArray[np.float_]: nDCG for each user.
+    """
+    ranks = context.ranks
+    # hits beyond the cutoff are still discounted by their rank
+    discount_ = discount(max(context.cutoff, int(ranks.max(initial=0))))
+    dcg = context.user_sum(discount_[ranks - 1])
+    idcg = ideal_dcg(context.actual, context.cutoff)
+    ndcg_: npt.NDArray[np.float_] = np.divide(
+        dcg, idcg, out=np.zeros_like(dcg), where=idcg > 0
+    )
+    return ndcg_
+
+
+def average_precision_from_context(context: MetricContext) -> npt.NDArray[np.float_]:
+    """Average Precision (AP) from the shared intermediate results, see `average_precision`.
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+
+    Returns:
+        npt.NDArray[np.float_]: AP for each user.
+    """
+    rr = context.user_sum(context.hit_positions / context.ranks)
+    avg_prec: npt.NDArray[np.float_] = rr / (context.actual + np.finfo(float).eps)
+    return avg_prec
+
+
+def reciprocal_rank_from_context(context: MetricContext) -> npt.NDArray[np.float_]:
+    """Reciprocal Rank (RR) of the first hit from the shared intermediate results, see `reciprocal_rank`.
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+
+    Returns:
+        npt.NDArray[np.float_]: RR for each user.
+    """
+    return context.user_sum(
+        np.where(context.hit_positions == 1, 1 / context.ranks, 0.0)
+    )
+
+
+def r_precision_from_context(context: MetricContext) -> npt.NDArray[np.float_]:
+    """R-Precision from the shared intermediate results, see `r_precision`.
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+
+    Returns:
+        npt.NDArray[np.float_]: R-Precision for each user.
+    """
+    r = np.minimum(context.actual, context.cutoff)
+    r_hits = context.user_sum(context.ranks <= r[context.hit_rows])
+    r_prec: npt.NDArray[np.float_] = r_hits / r
+    return r_prec
+
+
+def auc_from_context(context: MetricContext, n_items: int) -> npt.NDArray[np.float_]:
+    """Area Under the ROC Curve (AUC) from the shared intermediate results, see `auc_from_hits`.
+    Args:
+        context (MetricContext): hit dataframes and their intermediate results.
+        n_items (int): number of items each user is ranked against.
+
+    Returns:
+        npt.NDArray[np.float_]: AUC for each user.
+    """
+    return _truncated_auc(
+        hit=context.hit_count,
+        above=context.user_sum(context.ranks - context.hit_positions),
+        actual=context.actual,
+        cutoff=context.cutoff,
+        n_items=n_items,
+    )
+
+
+def _truncated_auc(
+    hit: npt.NDArray[np.int_],
+    above: npt.NDArray[np.int_] | npt.NDArray[np.float_],
+    actual: npt.NDArray[np.int_],
+    cutoff: int,
+    n_items: int,
+) -> npt.NDArray[np.float_]:
+    """AUC of each user from the negatives ranked above its hits.
+
+    Args:
+        hit (npt.NDArray[np.int_]): number of hits of each user within the cutoff.
+        above (npt.NDArray[np.int_]): number of negatives ranked above the hits, summed over the hits.
+        actual (npt.NDArray[np.int_]): number of ground truth items of each user.
+        cutoff (int): cutoff used to retrieve recommendations
+        n_items (int): number of items each user is ranked against.
+
+    Returns:
+        npt.NDArray[np.float_]: AUC for each user, 0 for users without negatives.
+    """
+    n_neg = n_items - actual
+    # negatives after the cutoff are tied with the missed ground truth items
+    n_neg_rest = np.maximum(n_neg - (cutoff - hit), 0)
+    correct = hit * n_neg - above + 0.5 * (actual - hit) * n_neg_rest
+    n_pairs = actual * n_neg
+    auc_: npt.NDArray[np.float_] = np.divide(
+        correct,
+        n_pairs,
+        out=np.zeros(len(n_pairs), dtype=np.float_),
+        where=n_pairs > 0,
+    )
+    return auc_
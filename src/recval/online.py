@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy
+import numpy.typing as npt
+import pandas
+
+from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+from recval.evaluator import EvalBackend, RecEvaluator
+from recval.holdout import HoldoutIndex
+
+
+@dataclass
+class OnlineRecEvaluator(RecEvaluator):  # pylint: disable=too-many-instance-attributes
+    """Evaluator updated incrementally with micro-batches of recommendations and interactions
+
+    Only the partial results of the metrics (see `RecEvaluator.metric_sums`) and the number of evaluated users
+    are kept, hence every update costs the hits of the users in its micro-batch and the current values are
+    read without revisiting the history. Metrics are always computed on the dense hit matrix.
+
+    The interactions following a recommendation may arrive in a later micro-batch, the recommendations of
+    each user are kept pending until interactions of the user arrive, and the user is evaluated in that
+    micro-batch.
+
+    Attributes:
+        window (int | None, optional): number of most recent micro-batches the metrics are computed on.
+            Defaults to None, meaning every micro-batch.
+        decay (float | None, optional): factor in (0, 1] applied to the weight of the previous micro-batches
+            at every update, for an exponential decay. Defaults to None, meaning no decay.
+        horizon (int | None, optional): number of micro-batches, the one they arrive with included, the
+            recommendations of a user wait for its interactions before expiring. Defaults to None, meaning they
+            are pending until the user interacts, which keeps the recommendations of inactive users in memory.
+    """
+
+    backend: str = EvalBackend.NUMPY
+    window: int | None = None
+    decay: float | None = None
+    horizon: int | None = None
+    n_batches: int = field(init=False, default=0)
+    _sums: npt.NDArray[numpy.float64] = field(init=False, repr=False)
+    _n_users: float = field(init=False, default=0.0, repr=False)
+    _batches: deque[tuple[npt.NDArray[numpy.float64], int]] = field(
+        init=False, default_factory=deque, repr=False
+    )
+    # pending recommendations, with the micro-batch they arrived with
+    _pending: pandas.DataFrame = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.window is not None and self.window < 1:
+            raise ValueError(f"window has to be a positive integer, got: {self.window}")
+        if self.decay is not None and not 0 < self.decay <= 1:
+            raise ValueError(f"decay has to be in (0, 1], got: {self.decay}")
+        if self.window is not None and self.decay is not None:
+            raise ValueError("Either a window or a decay can be used, not both")
+        if self.horizon is not None and self.horizon < 1:
+            raise ValueError(
+                f"horizon has to be a positive integer, got: {self.horizon}"
+            )
+        self._sums = self.empty_metric_sums()
+        self._pending = _empty_pending()
+
+    @property
+    def n_users(self) -> float:
+        """Number of users the current values are computed on, weighted by the decay"""
+        return self._n_users
+
+    @property
+    def n_pending(self) -> int:
+        """Number of users whose recommendations are waiting for their interactions"""
+        return int(self._pending[DEFAULT_USER_COL].nunique())
+
+    def update(
+        self, recs_df: pandas.DataFrame, interactions_df: pandas.DataFrame
+    ) -> int:
+        """Evaluate a micro-batch and add it to the running metrics
+
+        The recommendations of the micro-batch replace the pending ones of the same users. Users with pending
+        recommendations and interactions in the micro-batch are evaluated on these interactions, and their
+        recommendations stop being pending. Interactions of users without pending recommendations are
+        ignored, then the recommendations older than the horizon expire.
+
+        Args:
+            recs_df (pandas.DataFrame): recommendations of the micro-batch, sorted by rank within each user
+                unless they contain the rank column.
+            interactions_df (pandas.DataFrame): ground truth interactions of the micro-batch, one row for each
+                user-item pair.
+
+        Returns:
+            int: number of users evaluated in the micro-batch.
+        """
+        if "rank" not in recs_df.columns:
+            recs_df = recs_df.assign(
+                rank=recs_df.groupby(DEFAULT_USER_COL, sort=False).cumcount() + 1
+            )
+        recs_df = recs_df.loc[
+            recs_df["rank"] <= self.max_cutoff,
+            [DEFAULT_USER_COL, DEFAULT_ITEM_COL, "rank"],
+        ]
+        pending = self._pending
+        if len(recs_df) > 0:
+            pending = pandas.concat(
+                [
+                    pending[~pending[DEFAULT_USER_COL].isin(recs_df[DEFAULT_USER_COL])],
+                    recs_df.assign(**{_BATCH_COL: self.n_batches}),
+                ],
+                ignore_index=True,
+            )
+
+        users = numpy.intersect1d(
+            pending[DEFAULT_USER_COL].unique(),
+            interactions_df[DEFAULT_USER_COL].unique(),
+        )
+        batch_sums = self.empty_metric_sums()
+        if len(users) > 0:
+            matched = pending[DEFAULT_USER_COL].isin(users)
+            holdout = HoldoutIndex.from_frame(
+                interactions_df[
+                    interactions_df[DEFAULT_USER_COL].isin(users)
+                ].drop_duplicates([DEFAULT_USER_COL, DEFAULT_ITEM_COL])
+            )
+            batch_sums = self.metric_sums(
+                self._recs_hit_matrix(pending[matched], holdout)
+            )
+            pending = pending[~matched]
+        if self.horizon is not None:
+            # recommendations arrived with micro-batch b wait up to micro-batch b + horizon - 1
+            pending = pending[pending[_BATCH_COL] > self.n_batches - self.horizon + 1]
+        self._pending = pending
+        self._add(batch_sums, len(users))
+        return len(users)
+
+    def results(
+        self, verbose: bool = True, decimal_precision: int = 4
+    ) -> pandas.DataFrame:
+        """Current value of the metrics
+
+        Args:
+            verbose (bool, optional): Wheter or not print metric results. Defaults to True.
+            decimal_precision (int, optional): precision with which compute evaluation metrics. Defaults to 4.
+
+        Returns:
+            pandas.DataFrame: dataframe containing the result metrics for each cutoff.
+        """
+        if self._n_users <= 0:
+            raise ValueError("No users have been evaluated yet.")
+        # a stream may not have hit anything yet, its metrics are still reported
+        return self._results_from_sums(
+            self._sums,
+            n_users=self._n_users,
+            any_hit=True,
+            verbose=verbose,
+            decimal_precision=decimal_precision,
+        )
+
+    def reset(self) -> None:
+        """Forget every micro-batch"""
+        self.n_batches = 0
+        self._sums = self.empty_metric_sums()
+        self._n_users = 0.0
+        self._batches.clear()
+        self._pending = _empty_pending()
+
+    def _add(self, batch_sums: npt.NDArray[numpy.float64], n_users: int) -> None:
+        """Add the partial results of a micro-batch, expiring or decaying the previous ones
+
+        Args:
+            batch_sums (npt.NDArray[numpy.float64]): partial results of the micro-batch.
+            n_users (int): number of users evaluated in the micro-batch.
+        """
+        if self.decay is not None:
+            self._sums *= self.decay
+            self._n_users *= self.decay
+        self._sums += batch_sums
+        self._n_users += n_users
+        if self.window is not None:
+            self._batches.append((batch_sums, n_users))
+            if len(self._batches) > self.window:
+                old_sums, old_n_users = self._batches.popleft()
+                self._sums -= old_sums
+                self._n_users -= old_n_users
+        self.n_batches += 1
+
+
+# column of the pending recommendations holding the micro-batch they arrived with
+_BATCH_COL = "batch"
+
+
+def _empty_pending() -> pandas.DataFrame:
+    """Pending recommendations of no user"""
+    return pandas.DataFrame(
+        {
+            DEFAULT_USER_COL: pandas.Series(dtype=numpy.int64),
+            DEFAULT_ITEM_COL: pandas.Series(dtype=numpy.int64),
+            "rank": pandas.Series(dtype=numpy.int64),
+            _BATCH_COL: pandas.Series(dtype=numpy.int64),
+        }
+    )
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import mmap
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Literal
+
+import numba
+import numpy
+import numpy.typing as npt
+
+from recval.constants import SHARDS_PER_JOB
+from recval.metrics.metrics_utils import get_hit_matrix_from_topk
+from recval.utils import get_topk
+
+if TYPE_CHECKING:  # pragma: no cover
+    from recval.evaluator import RecEvaluator
+
+# arrays attached by each worker process, filled by the pool initializer
+_SHARD_STATE: dict[str, Any] = {}
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Picklable handle of an array living in a shared memory block
+
+    Attributes:
+        name (str): name of the shared memory block
+        shape (tuple[int, ...]): shape of the array
+        dtype (str): dtype of the array
+    """
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+    @classmethod
+    def create(
+        cls, array: npt.NDArray[Any], stack: ExitStack
+    ) -> tuple[SharedArray, npt.NDArray[Any]]:
+        """Copy an array into a new shared memory block, released when the stack is closed
+
+        Args:
+            array (npt.NDArray[Any]): array to share
+            stack (ExitStack): stack owning the shared memory block
+
+        Returns:
+            tuple[SharedArray, npt.NDArray[Any]]: handle of the shared array and its view in this process
+        """
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        stack.callback(shm.unlink)
+        stack.callback(shm.close)
+        shared = cls(name=shm.name, shape=array.shape, dtype=array.dtype.str)
+        view: npt.NDArray[Any] = numpy.ndarray(
+            array.shape, dtype=array.dtype, buffer=shm.buf
+        )
+        view[...] = array
+        return shared, view
+
+    def attach(self) -> tuple[npt.NDArray[Any], SharedMemory]:
+        """Map the shared array in the current process, without copying it
+
+        Returns:
+            tuple[npt.NDArray[Any], SharedMemory]: the array and the shared memory block backing it
+        """
+        # workers share the resource tracker of the creating process, which unlinks the block
+        shm = SharedMemory(name=self.name)
+        array: npt.NDArray[Any] = numpy.ndarray(
+            self.shape, dtype=numpy.dtype(self.dtype), buffer=shm.buf
+        )
+        return array, shm
+
+
+@dataclass(frozen=True)
+class MappedArray:
+    """Picklable handle of a read-only memory-mapped array, reopened by each worker
+
+    Attributes:
+        filename (str): file backing the array
+        offset (int): offset of the array data in the file
+        shape (tuple[int, ...]): shape of the array
+        dtype (str): dtype of the array
+        order (Literal["C", "F"]): memory layout of the array, either `C` or `F`
+    """
+
+    filename: str
+    offset: int
+    shape: tuple[int, ...]
+    dtype: str
+    order: Literal["C", "F"]
+
+    @staticmethod
+    def remappable(array: numpy.memmap[Any, Any]) -> bool:
+        """Whether the workers can map the memory-mapped array from its file
+
+        Views of a memory-mapped array, such as slices, have to be contiguous to be read back from a single
+        range of the file.
+
+        Args:
+            array (numpy.memmap): memory-mapped array, possibly a view
+
+        Returns:
+            bool: True when the array is a contiguous view of a mapped file
+        """
+        return (
+            array.filename is not None
+            and (array.flags.c_contiguous or array.flags.f_contiguous)
+            and _mmap_base(array) is not None
+        )
+
+    @classmethod
+    def from_memmap(cls, array: numpy.memmap[Any, Any]) -> MappedArray:
+        """Build the handle of an open memory-mapped array, see `remappable`
+
+        Args:
+            array (numpy.memmap): memory-mapped array, possibly a contiguous view
+
+        Returns:
+            MappedArray: handle of the array
+        """
+        mapped = _mmap_base(array)
+        if mapped is None or not (array.flags.c_contiguous or array.flags.f_contiguous):
+            raise ValueError("Only contiguous views of a mapped file can be remapped")
+        # views keep the offset of the array they are taken from, their data starts where their pointer is
+        start = array.offset - array.offset % mmap.ALLOCATIONGRANULARITY
+        mapped_data = numpy.frombuffer(mapped, dtype=numpy.uint8).ctypes.data
+        return cls(
+            filename=str(array.filename),
+            offset=start + array.ctypes.data - mapped_data,
+            shape=array.shape,
+            dtype=array.dtype.str,
+            order="C" if array.flags.c_contiguous else "F",
+        )
+
+    @classmethod
+    def spill(cls, array: npt.NDArray[Any], stack: ExitStack) -> MappedArray:
+        """Write an in-memory array to a temporary `.npy` file, removed when the stack is closed
+
+        The file pages live in the page cache, which the kernel can write back and evict, instead of
+        doubling the anonymous memory of the process like a shared memory copy would.
+
+        Args:
+            array (npt.NDArray[Any]): array to share
+            stack (ExitStack): stack owning the temporary file
+
+        Returns:
+            MappedArray: handle of the array
+        """
+        directory = tempfile.mkdtemp(prefix="recval-")
+        stack.callback(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "array.npy")
+        # contiguous arrays are written straight from their buffer, without an intermediate copy
+        numpy.save(path, array)
+        return cls.from_memmap(numpy.load(path, mmap_mode="r"))
+
+    def attach(self) -> tuple[npt.NDArray[Any], None]:
+        """Map the array in the current process
+
+        Returns:
+            tuple[npt.NDArray[Any], None]: the array, no shared memory block is involved
+        """
+        array: npt.NDArray[Any] = numpy.memmap(
+            self.filename,
+            dtype=numpy.dtype(self.dtype),
+            mode="r",
+            offset=self.offset,
+            shape=self.shape,
+            order=self.order,
+        )
+        return array, None
+
+
+def _mmap_base(array: npt.NDArray[Any]) -> mmap.mmap | None:
+    """Memory map backing an array, found through the chain of its bases"""
+    base: Any = array
+    while isinstance(base, numpy.ndarray):
+        base = base.base
+    return base if isinstance(base, mmap.mmap) else None
+
+
+@dataclass
+class _CSRRows:
+    """CSR-style arrays of a contiguous block of rows, see `CSRLike`"""
+
+    indptr: npt.NDArray[numpy.int64]
+    indices: npt.NDArray[numpy.int64]
+    shape: tuple[int, int]
+
+
+def resolve_n_jobs(n_jobs: int) -> int:
+    """Resolve the number of worker processes
+
+    Args:
+        n_jobs (int): number of processes, -1 meaning one for each cpu
+
+    Returns:
+        int: number of processes
+    """
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError(f"n_jobs has to be a positive integer or -1, got: {n_jobs}")
+    return n_jobs
+
+
+def sharded_metric_sums(  # pylint: disable=[too-many-arguments,too-many-locals]
+    evaluator: RecEvaluator,
+    indptr: npt.NDArray[numpy.int64],
+    indices: npt.NDArray[numpy.int64],
+    n_jobs: int,
+    scores: npt.NDArray[numpy.float_] | None = None,
+    top_items: npt.NDArray[numpy.int_] | None = None,
+    exclude_indptr: npt.NDArray[numpy.int64] | None = None,
+    exclude_indices: npt.NDArray[numpy.int64] | None = None,
+    candidates: npt.NDArray[numpy.int_] | None = None,
+    candidate_scores: bool = False,
+) -> tuple[npt.NDArray[numpy.float64], bool]:
+    """Compute the metric sums of the users in parallel, sharding them across worker processes
+
+    Users are split into contiguous row ranges, each worker computes the top-k items, hits and metric
+    partial results of its ranges and the partial results are added together. Memory-mapped arrays, and their
+    contiguous views, are reopened from their file by the workers. Other scores are spilled to a temporary file in the
+    temporary directory (`TMPDIR`) and memory-mapped, so that they are not held twice in memory, hence
+    the directory should not be a RAM-backed filesystem for large score matrices. The other arrays, at
+    most (n_users, max_cutoff) large, are copied into shared memory.
+
+    Args:
+        evaluator (RecEvaluator): evaluator whose metrics and cutoffs are computed
+        indptr (npt.NDArray[numpy.int64]): CSR index pointer of the ground truth items, one row per user
+        indices (npt.NDArray[numpy.int64]): CSR ground truth items, sorted within each row
+        n_jobs (int): number of worker processes
+        scores (npt.NDArray[numpy.float_] | None, optional): (n_users, n_items) estimated scores, either
+            scores or top_items has to be passed. Defaults to None.
+        top_items (npt.NDArray[numpy.int_] | None, optional): (n_users, max_cutoff) top-k items of each user,
+            padded with -1. Defaults to None.
+        exclude_indptr (npt.NDArray[numpy.int64] | None, optional): CSR index pointer of the items not to
+            recommend. Defaults to None.
+        exclude_indices (npt.NDArray[numpy.int64] | None, optional): CSR items not to recommend. Defaults to None.
+        candidates (npt.NDArray[numpy.int_] | None, optional): items each user is ranked against, see
+            `get_topk`. Defaults to None.
+        candidate_scores (bool, optional): whether scores holds the scores of the candidates, see `get_topk`.
+            Defaults to False.
+
+    Returns:
+        tuple[npt.NDArray[numpy.float64], bool]: partial results of the metrics over the users, see
+        `RecEvaluator.metric_sums`, and whether any hit was found
+    """
+    arrays = {
+        "indptr": indptr,
+        "indices": indices,
+        "scores": scores,
+        "top_items": top_items,
+        "exclude_indptr": exclude_indptr,
+        "exclude_indices": exclude_indices,
+        "candidates": candidates,
+    }
+    n_users = len(indptr) - 1
+    n_shards = min(n_jobs * SHARDS_PER_JOB, max(n_users, 1))
+    bounds = numpy.linspace(0, n_users, n_shards + 1).astype(numpy.int64)
+
+    metric_sums = evaluator.empty_metric_sums()
+    any_hit = False
+    with ExitStack() as stack:
+        handles: dict[str, SharedArray | MappedArray] = {}
+        for key, array in arrays.items():
+            if array is None:
+                continue
+            if isinstance(array, numpy.memmap) and MappedArray.remappable(array):
+                # memory-mapped scores are already shared through the page cache
+                handles[key] = MappedArray.from_memmap(array)
+            elif key == "scores":
+                handles[key] = MappedArray.spill(numpy.asarray(array), stack)
+            else:
+                handles[key], _ = SharedArray.create(numpy.asarray(array), stack)
+
+        # spawned workers do not inherit the numba and BLAS thread pools of this process
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=get_context("spawn"),
+            initializer=_init_shard_worker,
+            initargs=(evaluator, handles, candidate_scores),
+        ) as executor:
+            for shard_sums, shard_hit in executor.map(
+                _shard_metric_sums, bounds[:-1].tolist(), bounds[1:].tolist()
+            ):
+                metric_sums += shard_sums
+                any_hit = any_hit or shard_hit
+    return metric_sums, any_hit
+
+
+def _init_shard_worker(
+    evaluator: RecEvaluator,
+    handles: dict[str, SharedArray | MappedArray],
+    candidate_scores: bool,
+) -> None:
+    """Attach the shared arrays once for each worker process
+
+    Args:
+        evaluator (RecEvaluator): evaluator whose metrics and cutoffs are computed
+        handles (dict[str, SharedArray | MappedArray]): handles of the shared arrays
+        candidate_scores (bool): whether the shared scores hold the scores of the candidates
+    """
+    # parallelism comes from the processes, avoid oversubscribing the cores
+    numba.set_num_threads(1)
+    _SHARD_STATE["evaluator"] = evaluator
+    _SHARD_STATE["candidate_scores"] = candidate_scores
+    # keep the shared memory blocks referenced while the arrays are in use
+    _SHARD_STATE["blocks"] = []
+    for key, handle in handles.items():
+        _SHARD_STATE[key], block = handle.attach()
+        _SHARD_STATE["blocks"].append(block)
+
+
+def _shard_metric_sums(
+    start: int, stop: int
+) -> tuple[npt.NDArray[numpy.float64], bool]:
+    """Compute the metric sums of a contiguous range of users, runs in the worker processes
+
+    Args:
+        start (int): first row of the shard
+        stop (int): row after the last one of the shard
+
+    Returns:
+        tuple[npt.NDArray[numpy.float64], bool]: metric sums of the shard and whether any hit was found
+    """
+    evaluator: RecEvaluator = _SHARD_STATE["evaluator"]
+    if "top_items" in _SHARD_STATE:
+        top_items = _SHARD_STATE["top_items"][start:stop]
+    else:
+        scores = _SHARD_STATE["scores"][start:stop]
+        exclude = None
+        if "exclude_indptr" in _SHARD_STATE:
+            exclude = _csr_rows(
+                _SHARD_STATE["exclude_indptr"],
+                _SHARD_STATE["exclude_indices"],
+                start,
+                stop,
+                n_cols=scores.shape[1],
+            )
+        candidates = _SHARD_STATE.get("candidates")
+        top_items, _ = get_topk(
+            scores=scores,
+            k=evaluator.max_cutoff,
+            engine=evaluator.topk_engine,
+            exclude=exclude,
+            candidates=None if candidates is None else candidates[start:stop],
+            candidate_scores=_SHARD_STATE["candidate_scores"],
+        )
+
+    holdout = _csr_rows(
+        _SHARD_STATE["indptr"], _SHARD_STATE["indices"], start, stop, n_cols=0
+    )
+    hit_matrix = get_hit_matrix_from_topk(
+        top_items,
+        indptr=holdout.indptr,
+        indices=holdout.indices,
+        user_ids=numpy.arange(start, stop),
+    )
+    return evaluator.metric_sums(hit_matrix), bool(hit_matrix.hits.any())
+
+
+def _csr_rows(
+    indptr: npt.NDArray[numpy.int64],
+    indices: npt.NDArray[numpy.int64],
+    start: int,
+    stop: int,
+    n_cols: int,
+) -> _CSRRows:
+    """View a contiguous block of rows of CSR-style arrays, without copying the indices
+
+    Args:
+        indptr (npt.NDArray[numpy.int64]): CSR index pointer
+        indices (npt.NDArray[numpy.int64]): CSR indices
+        start (int): first row of the block
+        stop (int): row after the last one of the block
+        n_cols (int): number of columns of the matrix
+
+    Returns:
+        _CSRRows: CSR-style arrays of the block
+    """
+    return _CSRRows(
+        indptr=indptr[start : stop + 1] - indptr[start],
+        indices=indices[indptr[start] : indptr[stop]],
+        shape=(stop - start, n_cols),
+    )
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import importlib
+import os
+from types import ModuleType
+from typing import Any, Iterator, Sequence, TypeAlias
+
+import pandas
+
+from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL, PARQUET_BATCH_ROWS
+from recval.holdout import HoldoutIndex
+from recval.profiling import add_rows, stage
+
+# a Parquet file, a directory of Parquet files (hive partitioned or not) or a list of files
+ParquetSource: TypeAlias = str | os.PathLike[str] | Sequence[str | os.PathLike[str]]
+
+
+def _import_pyarrow(module: str) -> ModuleType:
+    """Import a pyarrow module, pyarrow is only needed to read and write Parquet files
+
+    Args:
+        module (str): name of the module, such as `pyarrow.dataset`.
+
+    Returns:
+        ModuleType: the module.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as err:
+        raise ImportError(
+            "Reading and writing Parquet files requires pyarrow, install it with `pip install recval[parquet]`"
+        ) from err
+
+
+def _dataset(source: ParquetSource) -> Any:
+    """Open the Parquet files as an Arrow dataset, nothing is read until it is scanned
+
+    Args:
+        source (ParquetSource): Parquet file, directory or list of files.
+
+    Returns:
+        Any: the `pyarrow.dataset.Dataset`.
+    """
+    dataset = _import_pyarrow("pyarrow.dataset")
+    if isinstance(source, (str, os.PathLike)):
+        source = os.fspath(source)
+    else:
+        source = [os.fspath(path) for path in source]
+    return dataset.dataset(source, format="parquet", partitioning="hive")
+
+
+def read_parquet_batches(
+    source: ParquetSource,
+    columns: Sequence[str],
+    batch_size: int = PARQUET_BATCH_ROWS,
+    max_rank: int | None = None,
+) -> Iterator[pandas.DataFrame]:
+    """Stream the given columns of Parquet files, one record batch at a time
+
+    Only the projected columns are decoded, and the row groups whose statistics exclude every rank up to
+    `max_rank` are skipped without being read.
+
+    Args:
+        source (ParquetSource): Parquet file, directory or list of files.
+        columns (Sequence[str]): columns to read, hive partition keys included.
+        batch_size (int, optional): largest number of rows of a batch. Defaults to 2^17.
+        max_rank (int | None, optional): largest rank to read, filtering the `rank` column. Defaults to None,
+            meaning every row.
+
+    Yields:
+        Iterator[pandas.DataFrame]: the rows of each record batch.
+    """
+    filter_ = None
+    if max_rank is not None:
+        filter_ = _import_pyarrow("pyarrow.dataset").field("rank") <= max_rank
+    batches = _dataset(source).to_batches(
+        columns=list(columns), filter=filter_, batch_size=batch_size
+    )
+    for batch in batches:
+        add_rows(batch.num_rows)
+        yield batch.to_pandas()
+
+
+def read_recs_parquet(
+    source: ParquetSource,
+    max_cutoff: int | None = None,
+    col_user: str = DEFAULT_USER_COL,
+    col_item: str = DEFAULT_ITEM_COL,
+    batch_size: int = PARQUET_BATCH_ROWS,
+) -> Iterator[pandas.DataFrame]:
+    """Stream recommendations from Parquet files, reading only the user, item and rank columns
+
+    Args:
+        source (ParquetSource): Parquet file, directory or list of files, having to contain the rank column.
+        max_cutoff (int | None, optional): largest rank to read. Defaults to None, meaning every rank.
+        col_user (str, optional): column name for user. Defaults to user_id.
+        col_item (str, optional): column name for item. Defaults to item_id.
+        batch_size (int, optional): largest number of rows of a batch. Defaults to 2^17.
+
+    Yields:
+        Iterator[pandas.DataFrame]: user, item and rank columns of each record batch.
+    """
+    return read_parquet_batches(
+        source,
+        columns=[col_user, col_item, "rank"],
+        batch_size=batch_size,
+        max_rank=max_cutoff,
+    )
+
+
+def read_holdout_parquet(
+    source: ParquetSource,
+    col_user: str = DEFAULT_USER_COL,
+    col_item: str = DEFAULT_ITEM_COL,
+) -> HoldoutIndex:
+    """Index the holdout data stored in Parquet files, reading only the user and item columns
+
+    Args:
+        source (ParquetSource): Parquet file, directory or list of files.
+        col_user (str, optional): column name for user. Defaults to user_id.
+        col_item (str, optional): column name for item. Defaults to item_id.
+
+    Returns:
+        HoldoutIndex: index of the holdout data, pass it to the evaluations.
+    """
+    with stage("read_parquet"):
+        table = _dataset(source).to_table(columns=[col_user, col_item])
+        add_rows(table.num_rows)
+        holdout_df = table.to_pandas()
+    with stage("holdout_index"):
+        return HoldoutIndex.from_frame(holdout_df, col_user=col_user, col_item=col_item)
+
+
+def write_parquet(
+    frame: pandas.DataFrame,
+    path: str | os.PathLike[str],
+    compression: str = "zstd",
+) -> None:
+    """Write a results frame to a Parquet file
+
+    Results frames are the metrics of the evaluations, such as `eval_from_recs`, or the per-user metrics
+    of `user_metrics_from_recs`. A named index, like the user id index of the per-user metrics, is written
+    as a column and restored by `pandas.read_parquet`.
+
+    Args:
+        frame (pandas.DataFrame): results frame.
+        path (str | os.PathLike[str]): path of the Parquet file.
+        compression (str, optional): compression codec. Defaults to zstd.
+    """
+    arrow = _import_pyarrow("pyarrow")
+    parquet = _import_pyarrow("pyarrow.parquet")
+    # the attributes, such as the profile of the evaluation, are not serializable
+    frame = frame.copy(deep=False)
+    frame.attrs = {}
+    table = arrow.Table.from_pandas(frame)
+    with stage("write_parquet", rows=len(frame)):
+        parquet.write_table(table, os.fspath(path), compression=compression)
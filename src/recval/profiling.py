@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Sequence, TypeAlias
+
+import pandas
+
+
+@dataclass
+class Stage:
+    """Timings of a stage, summed over its calls under the same parent stage
+
+    Attributes:
+        name (str): name of the stage.
+        calls (int): number of times the stage ran.
+        wall_time (float): total wall time, in seconds.
+        rss_increase_mb (float): largest increase of the resident set size of the process over its value at
+            the start of a call, in MiB, the memory the stage allocates at its peak.
+        rows (int): total number of rows processed, users or hits depending on the stage.
+        children (dict[str, Stage]): stages nested in this one, by name.
+    """
+
+    name: str
+    calls: int = 0
+    wall_time: float = 0.0
+    rss_increase_mb: float = 0.0
+    rows: int = 0
+    children: dict[str, Stage] = field(default_factory=dict, repr=False)
+
+    @property
+    def self_time(self) -> float:
+        """Wall time not spent in the nested stages, in seconds"""
+        return self.wall_time - sum(child.wall_time for child in self.children.values())
+
+
+@dataclass(frozen=True)
+class StageEvent:
+    """A call of a stage, passed to the profile hooks when it ends
+
+    Attributes:
+        path (str): names of the enclosing stages and of the stage, joined by `/`.
+        wall_time (float): wall time of the call, in seconds.
+        rss_increase_mb (float): peak increase of the resident set size during the call, in MiB.
+        rows (int): number of rows processed by the call.
+    """
+
+    path: str
+    wall_time: float
+    rss_increase_mb: float
+    rows: int
+
+
+# called at the end of every stage, e.g. to forward the timings to a metrics system
+ProfileHook: TypeAlias = Callable[[StageEvent], None]
+
+
+@dataclass
+class _Frame:
+    """A running stage"""
+
+    stage: Stage
+    path: str
+    start: float
+    start_rss: int
+    peak_rss: int
+    rows: int = 0
+
+
+@dataclass
+class Profile:
+    """Tree of the stages run while the profile is active, see `profiled`
+
+    Attributes:
+        hooks (list[ProfileHook], optional): called at the end of every stage. Defaults to no hooks.
+        track_memory (bool, optional): whether to measure the memory of every stage, which costs two reads
+            of /proc for each call. Defaults to True.
+        root (Stage): stage covering the whole profile, parent of the top-level stages.
+    """
+
+    hooks: list[ProfileHook] = field(default_factory=list)
+    track_memory: bool = True
+    root: Stage = field(default_factory=lambda: Stage(name="total"))
+    _stack: list[_Frame] = field(init=False, default_factory=list, repr=False)
+
+    @property
+    def wall_time(self) -> float:
+        """Wall time of the whole profile, in seconds"""
+        return self.root.wall_time
+
+    def stages(self) -> Iterator[tuple[str, Stage]]:
+        """Every stage depth first, with its path
+
+        Yields:
+            Iterator[tuple[str, Stage]]: names of the enclosing stages and of the stage joined by `/`, and the
+            stage.
+        """
+        pending = [(node.name, node) for node in self.root.children.values()]
+        pending.reverse()
+        while pending:
+            path, node = pending.pop()
+            yield path, node
+            pending.extend(
+                (f"{path}/{child.name}", child)
+                for child in reversed(node.children.values())
+            )
+
+    def __getitem__(self, path: str) -> Stage:
+        """Stage at the given path, such as `eval_from_scores/get_topk`
+
+        Args:
+            path (str): names of the enclosing stages and of the stage, joined by `/`.
+
+        Returns:
+            Stage: the stage.
+        """
+        node = self.root
+        for name in path.split("/"):
+            if name not in node.children:
+                raise KeyError(f"Stage {path} has not been profiled")
+            node = node.children[name]
+        return node
+
+    def to_frame(self) -> pandas.DataFrame:
+        """Timings of every stage
+
+        Returns:
+            pandas.DataFrame: calls, wall time, self time, share of the total wall time, memory increase and
+            rows of every stage, indexed by stage path in depth first order.
+        """
+        rows = [
+            (
+                path,
+                node.calls,
+                node.wall_time,
+                node.self_time,
+                node.wall_time / self.wall_time if self.wall_time > 0 else 0.0,
+                node.rss_increase_mb,
+                node.rows,
+            )
+            for path, node in self.stages()
+        ]
+        return pandas.DataFrame(
+            rows,
+            columns=[
+                "stage",
+                "calls",
+                "wall_time",
+                "self_time",
+                "share",
+                "rss_increase_mb",
+                "rows",
+            ],
+        ).set_index("stage")
+
+    @contextmanager
+    def activate(self) -> Iterator[None]:
+        """Collect the stages run in the block, timing the block as the root stage
+
+        Yields:
+            Iterator[None]: while the profile is active.
+        """
+        rss = 0
+        if self.track_memory:
+            rss = memory_usage()[0]
+            reset_peak_rss()
+        root = _Frame(
+            stage=self.root,
+            path="",
+            start=time.perf_counter(),
+            start_rss=rss,
+            peak_rss=rss,
+        )
+        self._stack.append(root)
+        token = _ACTIVE_PROFILE.set(self)
+        try:
+            yield
+        finally:
+            _ACTIVE_PROFILE.reset(token)
+            self._stack.pop()
+            self._end(root)
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0) -> Iterator[None]:
+        """Time a stage nested in the running one
+
+        Args:
+            name (str): name of the stage, the calls with the same name under the same parent are summed.
+            rows (int, optional): number of rows processed by the stage. Defaults to 0.
+
+        Yields:
+            Iterator[None]: while the stage runs.
+        """
+        parent = self._stack[-1]
+        node = parent.stage.children.setdefault(name, Stage(name=name))
+        rss = 0
+        if self.track_memory:
+            # the peak is reset for every stage, the parent keeps the peak it reached so far
+            rss, peak_rss = memory_usage()
+            parent.peak_rss = max(parent.peak_rss, peak_rss)
+            reset_peak_rss()
+        frame = _Frame(
+            stage=node,
+            path=f"{parent.path}/{name}" if parent.path else name,
+            start=time.perf_counter(),
+            start_rss=rss,
+            peak_rss=rss,
+            rows=rows,
+        )
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self._end(frame)
+            parent.peak_rss = max(parent.peak_rss, frame.peak_rss)
+
+    def add_rows(self, rows: int) -> None:
+        """Add rows processed by the running stage, when they are only known while it runs
+
+        Args:
+            rows (int): number of rows.
+        """
+        self._stack[-1].rows += rows
+
+    def _end(self, frame: _Frame) -> None:
+        """Add a finished call to its stage and notify the hooks
+
+        Args:
+            frame (_Frame): finished call.
+        """
+        wall_time = time.perf_counter() - frame.start
+        if self.track_memory:
+            frame.peak_rss = max(frame.peak_rss, memory_usage()[1])
+        rss_increase_mb = (frame.peak_rss - frame.start_rss) / 2**20
+        frame.stage.calls += 1
+        frame.stage.wall_time += wall_time
+        frame.stage.rows += frame.rows
+        frame.stage.rss_increase_mb = max(frame.stage.rss_increase_mb, rss_increase_mb)
+        if frame.path:
+            event = StageEvent(
+                path=frame.path,
+                wall_time=wall_time,
+                rss_increase_mb=rss_increase_mb,
+                rows=frame.rows,
+            )
+            for hook in self.hooks:
+                hook(event)
+
+
+_ACTIVE_PROFILE: ContextVar[Profile | None] = ContextVar("recval_profile", default=None)
+
+
+@contextmanager
+def profiled(
+    hooks: Sequence[ProfileHook] = (), track_memory: bool = True
+) -> Iterator[Profile]:
+    """Collect the stages run in the block into a new profile
+
+    Args:
+        hooks (Sequence[ProfileHook], optional): called at the end of every stage. Defaults to no hooks.
+        track_memory (bool, optional): whether to measure the memory of every stage. Defaults to True.
+
+    Yields:
+        Iterator[Profile]: the profile, filled while the block runs.
+    """
+    profile = Profile(hooks=list(hooks), track_memory=track_memory)
+    with profile.activate():
+        yield profile
+
+
+def active_profile() -> Profile | None:
+    """Profile collecting the stages, if any
+
+    Returns:
+        Profile | None: the innermost active profile, None outside of `profiled`.
+    """
+    return _ACTIVE_PROFILE.get()
+
+
+@contextmanager
+def stage(name: str, rows: int = 0) -> Iterator[None]:
+    """Time a stage in the active profile, nothing is measured when no profile is active
+
+    Args:
+        name (str): name of the stage.
+        rows (int, optional): number of rows processed by the stage. Defaults to 0.
+
+    Yields:
+        Iterator[None]: while the stage runs.
+    """
+    profile = _ACTIVE_PROFILE.get()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name, rows=rows):
+        yield
+
+
+def add_rows(rows: int) -> None:
+    """Add rows processed by the running stage of the active profile, if any
+
+    Args:
+        rows (int): number of rows.
+    """
+    profile = _ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.add_rows(rows)
+
+
+def reset_peak_rss() -> None:
+    """Reset the peak RSS of the process to its current RSS, supported by Linux only"""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def memory_usage() -> tuple[int, int]:
+    """Current and peak RSS of the process, in bytes
+
+    Returns:
+        tuple[int, int]: `VmRSS` and `VmHWM` of the process, the peak since the last `reset_peak_rss`. Where
+        /proc is not available both are the lifetime peak RSS.
+    """
+    rss, peak_rss = -1, -1
+    try:
+        with open("/proc/self/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak_rss = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if rss >= 0 and peak_rss >= 0:
+        return rss, peak_rss
+    # kilobytes on linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss = max_rss if sys.platform == "darwin" else max_rss * 1024
+    return max_rss, max_rss
@@ -0,0 +1,330 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy
+import numpy.typing as npt
+from strenum import StrEnum
+
+from recval.constants import BOOTSTRAP_BLOCK_BYTES, SEED
+
+
+class ResamplingMethod(StrEnum):
+    """Weights used to draw the bootstrap resamples"""
+
+    # number of draws of each user follows a Poisson(1), resamples have a random size
+    POISSON = "poisson"
+    # number of draws of each user follows a Multinomial(n_users, 1 / n_users), the classic bootstrap
+    MULTINOMIAL = "multinomial"
+
+
+def bootstrap_weights(
+    n_users: int,
+    n_resamples: int,
+    method: str = ResamplingMethod.POISSON,
+    rng: numpy.random.Generator | None = None,
+) -> npt.NDArray[numpy.float64]:
+    """Draw the weight of every user in every bootstrap resample
+
+    Args:
+        n_users (int): number of users
+        n_resamples (int): number of resamples
+        method (str, optional): either `poisson` or `multinomial`. Defaults to `poisson`.
+        rng (numpy.random.Generator | None, optional): random generator. Defaults to None, seeded from `SEED`.
+
+    Returns:
+        npt.NDArray[numpy.float64]: (n_resamples, n_users) number of times each user is drawn in each resample
+    """
+    method = ResamplingMethod(method)
+    rng = numpy.random.default_rng(SEED) if rng is None else rng
+    if method == ResamplingMethod.POISSON:
+        # inverse transform sampling, counting the Poisson(1) cdf values below a uniform draw is much
+        # faster than rng.poisson
+        uniform = rng.random((n_resamples, n_users), dtype=numpy.float32)
+        counts = numpy.zeros((n_resamples, n_users), dtype=numpy.uint8)
+        for cdf_value in _poisson_cdf():
+            counts += uniform >= cdf_value
+        return counts.astype(numpy.float64)
+    # draw n_users users with replacement for each resample, and count them all at once
+    draws = rng.integers(0, n_users, size=(n_resamples, n_users))
+    draws += numpy.arange(n_resamples)[:, None] * n_users
+    draw_counts = numpy.bincount(draws.ravel(), minlength=n_resamples * n_users)
+    return draw_counts.reshape(n_resamples, n_users).astype(numpy.float64)
+
+
+def bootstrap_means(
+    values: npt.NDArray[numpy.float_],
+    n_resamples: int,
+    method: str = ResamplingMethod.POISSON,
+    seed: int = SEED,
+    n_threads: int = 1,
+) -> npt.NDArray[numpy.float64]:
+    """Means of the user values over bootstrap resamples of the users
+
+    Resamples are drawn in blocks of weight matrices and each block is reduced with a single matrix
+    product, the memory used by each thread is bounded by a few `BOOTSTRAP_BLOCK_BYTES` whatever the
+    number of resamples. Every block has its own random stream spawned from the seed, hence the results
+    do not depend on the number of threads.
+
+    Args:
+        values (npt.NDArray[numpy.float_]): (n_users, n_stats) value of each statistic for each user
+        n_resamples (int): number of resamples
+        method (str, optional): either `poisson` or `multinomial`. Defaults to `poisson`.
+        seed (int, optional): seed of the random generator. Defaults to `SEED`.
+        n_threads (int, optional): number of threads drawing the blocks. Defaults to 1.
+
+    Returns:
+        npt.NDArray[numpy.float64]: (n_resamples, n_stats) mean of each statistic in each resample
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    n_users = values.shape[0]
+    block_size = max(1, BOOTSTRAP_BLOCK_BYTES // max(n_users * 8, 1))
+    starts = range(0, n_resamples, block_size)
+    seeds = numpy.random.SeedSequence(seed).spawn(len(starts))
+    means = numpy.empty((n_resamples, values.shape[1]))
+
+    def resample_block(start: int, block_seed: numpy.random.SeedSequence) -> None:
+        stop = min(start + block_size, n_resamples)
+        weights = bootstrap_weights(
+            n_users,
+            stop - start,
+            method=method,
+            rng=numpy.random.default_rng(block_seed),
+        )
+        totals = weights.sum(axis=1, keepdims=True)
+        # an empty poisson resample has no mean
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            means[start:stop] = (weights @ values) / totals
+
+    # random draws, comparisons and matrix products release the GIL
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        list(executor.map(resample_block, starts, seeds))
+    return means
+
+
+def bootstrap_ci(  # pylint: disable=too-many-arguments
+    values: npt.NDArray[numpy.float_],
+    n_resamples: int,
+    confidence: float = 0.95,
+    method: str = ResamplingMethod.POISSON,
+    seed: int = SEED,
+    n_threads: int = 1,
+) -> tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.float64]]:
+    """Percentile bootstrap confidence interval of the mean of the user values
+
+    Args:
+        values (npt.NDArray[numpy.float_]): (n_users, n_stats) value of each statistic for each user
+        n_resamples (int): number of resamples
+        confidence (float, optional): confidence level of the interval. Defaults to 0.95.
+        method (str, optional): either `poisson` or `multinomial`. Defaults to `poisson`.
+        seed (int, optional): seed of the random generator. Defaults to `SEED`.
+        n_threads (int, optional): number of threads drawing the resamples. Defaults to 1.
+
+    Returns:
+        tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.float64]]: lower and upper bound of each statistic
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence has to be in (0, 1), got: {confidence}")
+    means = bootstrap_means(
+        values, n_resamples=n_resamples, method=method, seed=seed, n_threads=n_threads
+    )
+    alpha = (1 - confidence) / 2
+    low, high = numpy.nanquantile(means, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+@lru_cache(maxsize=None)
+def _poisson_cdf() -> npt.NDArray[numpy.float32]:
+    """Cdf of the Poisson(1) distribution, up to the last value below 1 in float32"""
+    pmf = numpy.exp(-1.0) / numpy.cumprod(
+        numpy.concatenate([[1.0], numpy.arange(1, 20)])
+    )
+    cdf: npt.NDArray[numpy.float32] = numpy.cumsum(pmf).astype(numpy.float32)
+    # uniform draws are always below 1
+    return cdf[: numpy.searchsorted(cdf, 1.0)]
+
+
+def paired_ttest(diff: npt.NDArray[numpy.float_]) -> npt.NDArray[numpy.float64]:
+    """Two-sided paired t-test of a zero mean difference
+
+    Args:
+        diff (npt.NDArray[numpy.float_]): (n_users, n_stats) difference of each statistic for each user
+
+    Returns:
+        npt.NDArray[numpy.float64]: p-value of each statistic, NaN when the differences are constant
+    """
+    diff = numpy.asarray(diff, dtype=numpy.float64)
+    n_users = diff.shape[0]
+    std_err = diff.std(axis=0, ddof=1) / numpy.sqrt(n_users)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        t_stat = diff.mean(axis=0) / std_err
+    return numpy.array(
+        [2 * _student_t_sf(abs(t), n_users - 1) for t in t_stat], dtype=numpy.float64
+    )
+
+
+def wilcoxon_test(diff: npt.NDArray[numpy.float_]) -> npt.NDArray[numpy.float64]:
+    """Two-sided Wilcoxon signed-rank test, with the normal approximation
+
+    Zero differences are discarded and tied absolute differences get their average rank, the variance
+    of the statistic is corrected for ties.
+
+    Args:
+        diff (npt.NDArray[numpy.float_]): (n_users, n_stats) difference of each statistic for each user
+
+    Returns:
+        npt.NDArray[numpy.float64]: p-value of each statistic, NaN when all the differences are zero
+    """
+    diff = numpy.asarray(diff, dtype=numpy.float64)
+    p_values = numpy.empty(diff.shape[1])
+    for col in range(diff.shape[1]):
+        nonzero = diff[:, col][diff[:, col] != 0]
+        n_diff = len(nonzero)
+        if n_diff == 0:
+            p_values[col] = numpy.nan
+            continue
+        ranks, tie_counts = _average_ranks(numpy.abs(nonzero))
+        w_plus = ranks[nonzero > 0].sum()
+        mean = n_diff * (n_diff + 1) / 4
+        var = n_diff * (n_diff + 1) * (2 * n_diff + 1) / 24
+        var -= (tie_counts**3 - tie_counts).sum() / 48
+        z_stat = (w_plus - mean) / math.sqrt(var)
+        p_values[col] = math.erfc(abs(z_stat) / math.sqrt(2))
+    return p_values
+
+
+def paired_bootstrap_test(
+    diff: npt.NDArray[numpy.float_],
+    n_resamples: int,
+    method: str = ResamplingMethod.POISSON,
+    seed: int = SEED,
+    n_threads: int = 1,
+) -> npt.NDArray[numpy.float64]:
+    """Two-sided paired bootstrap test of a zero mean difference
+
+    The differences are centered to satisfy the null hypothesis and resampled, the p-value is the
+    fraction of resampled means at least as far from zero as the observed one.
+
+    Args:
+        diff (npt.NDArray[numpy.float_]): (n_users, n_stats) difference of each statistic for each user
+        n_resamples (int): number of resamples
+        method (str, optional): either `poisson` or `multinomial`. Defaults to `poisson`.
+        seed (int, optional): seed of the random generator. Defaults to `SEED`.
+        n_threads (int, optional): number of threads drawing the resamples. Defaults to 1.
+
+    Returns:
+        npt.NDArray[numpy.float64]: p-value of each statistic
+    """
+    diff = numpy.asarray(diff, dtype=numpy.float64)
+    observed = diff.mean(axis=0)
+    null_means = bootstrap_means(
+        diff - observed,
+        n_resamples=n_resamples,
+        method=method,
+        seed=seed,
+        n_threads=n_threads,
+    )
+    extreme = numpy.abs(null_means) >= numpy.abs(observed)
+    # the observed sample counts as one of the resamples
+    p_values: npt.NDArray[numpy.float64] = (extreme.sum(axis=0) + 1) / (n_resamples + 1)
+    return p_values
+
+
+def _average_ranks(
+    values: npt.NDArray[numpy.float64],
+) -> tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.int64]]:
+    """Ranks of the values starting from 1, tied values get the average of their ranks
+
+    Args:
+        values (npt.NDArray[numpy.float64]): values to rank
+
+    Returns:
+        tuple[npt.NDArray[numpy.float64], npt.NDArray[numpy.int64]]: rank of each value and size of each group
+        of tied values
+    """
+    order = numpy.argsort(values, kind="stable")
+    sorted_values = values[order]
+    group_starts = numpy.flatnonzero(
+        numpy.concatenate([[True], sorted_values[1:] != sorted_values[:-1]])
+    )
+    tie_counts = numpy.diff(numpy.append(group_starts, len(values)))
+    # average of the ranks from start + 1 to start + count
+    group_ranks = group_starts + (tie_counts + 1) / 2
+    ranks = numpy.empty(len(values))
+    ranks[order] = numpy.repeat(group_ranks, tie_counts)
+    return ranks, tie_counts
+
+
+def _student_t_sf(t_stat: float, dof: int) -> float:
+    """Survival function of the Student t distribution, for non negative statistics
+
+    Args:
+        t_stat (float): t statistic
+        dof (int): degrees of freedom
+
+    Returns:
+        float: probability of a statistic larger than t_stat
+    """
+    if math.isnan(t_stat) or dof < 1:
+        return math.nan
+    return 0.5 * _betainc(dof / 2, 0.5, dof / (dof + t_stat * t_stat))
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function, evaluated with its continued fraction
+
+    Args:
+        a (float): first shape parameter
+        b (float): second shape parameter
+        x (float): point in [0, 1]
+
+    Returns:
+        float: I_x(a, b)
+    """
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    log_front = (
+        math.lgamma(a + b)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + a * math.log(x)
+        + b * math.log1p(-x)
+    )
+    # the continued fraction converges quickly below the mean of the distribution
+    if x > (a + 1) / (a + b + 2):
+        return 1.0 - _betainc(b, a, 1.0 - x)
+    return math.exp(log_front) * _betacf(a, b, x) / a
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """Continued fraction of the incomplete beta function, with the modified Lentz's method
+
+    Args:
+        a (float): first shape parameter
+        b (float): second shape parameter
+        x (float): point in [0, 1]
+
+    Returns:
+        float: value of the continued fraction
+    """
+    tiny = 1e-300
+    c_term = 1.0
+    d_term = 1.0 - (a + b) * x / (a + 1)
+    d_term = 1.0 / (d_term if abs(d_term) > tiny else tiny)
+    fraction = d_term
+    for m in range(1, 1000):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d_term = 1.0 + numerator * d_term
+            d_term = 1.0 / (d_term if abs(d_term) > tiny else tiny)
+            c_term = 1.0 + numerator / c_term
+            c_term = c_term if abs(c_term) > tiny else tiny
+            delta = c_term * d_term
+            fraction *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return fraction
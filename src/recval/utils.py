@@ -1,40 +1,354 @@
-import heapq
 import logging
+import os
+from typing import Any, Callable, Protocol, TypeAlias
 
+import numba
 import numpy as np
 import numpy.typing as npt
 from numba import njit, prange
+from strenum import StrEnum
 
+from .constants import AUTO_NUMBA_MIN_SIZE, MMAP_BLOCK_BYTES, TOPK_TILE_BYTES
 from .decorators import timeit
+from .encoding import code_dtype
+from .profiling import add_rows
+
+# score matrix, either in memory, memory-mapped or the path of a `.npy` file
+ScoresLike: TypeAlias = npt.NDArray[np.float_] | str | os.PathLike[str]
+
+
+class CSRLike(Protocol):
+    """Sparse matrix in CSR format, such as `scipy.sparse.csr_matrix`"""
+
+    indptr: npt.NDArray[np.int_]
+    indices: npt.NDArray[np.int_]
+    shape: tuple[int, int]
+
+
+class TopkEngine(StrEnum):
+    """Engines available to retrieve the top-k items"""
+
+    NUMPY = "numpy"
+    NUMBA = "numba"
+    AUTO = "auto"
+
+
+def load_scores(scores: ScoresLike) -> npt.NDArray[np.float_]:
+    """Load a score matrix, `.npy` files are memory-mapped instead of being read into memory
+
+    Args:
+        scores (ScoresLike): user-item scores matrix or path of the `.npy` file containing it
+
+    Returns:
+        npt.NDArray[np.float_]: user-item scores matrix, a read-only `numpy.memmap` when loaded from file
+    """
+    if isinstance(scores, (str, os.PathLike)):
+        return np.load(scores, mmap_mode="r")  # type: ignore[no-any-return]
+    return scores
+
+
+def select_topk_engine(n_users: int, n_items: int, k: int) -> TopkEngine:
+    """Pick the fastest top-k engine for the shape of the score matrix
+
+    The numba engine scans every row once keeping a k-sized heap, hence it beats argpartition when k is small
+    compared to the number of items, and the rows are split across the available threads.
+    Small matrices stay on numpy, as they would not amortize the JIT compilation.
+
+    Args:
+        n_users (int): number of rows of the score matrix
+        n_items (int): number of columns of the score matrix
+        k (int): number of top items to retrieve
+
+    Returns:
+        TopkEngine: either numpy or numba engine
+    """
+    if n_users * n_items < AUTO_NUMBA_MIN_SIZE:
+        return TopkEngine.NUMPY
+    # heap updates get more frequent as k grows, more threads move the break-even point up
+    max_k_ratio = 8 if numba.get_num_threads() > 1 else 32
+    if k * max_k_ratio <= n_items:
+        return TopkEngine.NUMBA
+    return TopkEngine.NUMPY
 
 
 @timeit
 def get_topk(
-    scores: npt.NDArray[np.float_],
+    scores: ScoresLike,
     k: int,
+    engine: str = TopkEngine.NUMPY,
+    out: tuple[npt.NDArray[np.int_], npt.NDArray[np.float_]] | None = None,
+    exclude: CSRLike | None = None,
+    candidates: npt.NDArray[np.int_] | None = None,
+    candidate_scores: bool = False,
 ) -> tuple[npt.NDArray[np.int_], npt.NDArray[np.float_]]:
     """Retrieve the top-k items and scores from a score matrix
 
+    Items are sorted by decreasing score, ties are broken by increasing item index.
+    Excluded items get the lowest score, they are retrieved only when a row has less than k other items.
+    Rows are processed in blocks and the results written straight into the output buffers, so that no
+    temporary array of the size of the whole score matrix is ever allocated. Memory-mapped score matrices
+    are read in contiguous row blocks, the whole matrix never has to fit in memory.
+
     Args:
-        scores (npt.NDArray[np.float_]): user-item scores matix
+        scores (ScoresLike): user-item scores matix, `numpy.memmap` or path of a `.npy` file
         k (int): number of top items and scores to retrieve
+        engine (str, optional): top-k engine, either `numpy`, `numba` or `auto`. Defaults to `numpy`.
+        out (tuple[npt.NDArray[np.int_], npt.NDArray[np.float_]] | None, optional): preallocated
+            (n_users, k) top_items and top_scores buffers the results are written into. Defaults to None.
+        exclude (CSRLike | None, optional): sparse user-item matrix in CSR format, e.g. `scipy.sparse.csr_matrix`,
+            of the items not to be retrieved, such as the ones already seen in training. They are masked
+            while scanning the scores, without copying the score matrix. Defaults to None.
+        candidates (npt.NDArray[np.int_] | None, optional): (n_users, n_candidates) items each user is ranked
+            against, padded with -1 when users have less candidates. Ties are broken by candidate position.
+            Defaults to None, meaning every item is a candidate.
+        candidate_scores (bool, optional): whether scores holds the scores of the candidates, with the same shape
+            as candidates, rather than the full user-item score matrix the candidate scores are gathered from.
+            Defaults to False.
 
     Returns:
         tuple[npt.NDArray[np.int_], npt.NDArray[np.float_]]: top_items and top_scores
     """
+    scores = load_scores(scores)
     # check scores is a two dimensional array
     if score_dimensions := scores.ndim != 2:
         raise ValueError(
             f"scores has to be a 2-dimensional array, passed is {score_dimensions}-dimensional"
         )
 
-    logging.debug("Retrieving Top-K items")
+    n_users, n_items = scores.shape
+    n_ranked = n_items if candidates is None else candidates.shape[1]
+    _check_k(k, n_ranked)
+    add_rows(n_users)
+    if out is None:
+        out = (
+            # compact item indices, candidate items keep the dtype of their ids
+            np.empty(
+                (n_users, k),
+                dtype=code_dtype(n_items) if candidates is None else candidates.dtype,
+            ),
+            np.empty((n_users, k), dtype=scores.dtype),
+        )
+    top_items, top_scores = out
+    if top_items.shape != (n_users, k) or top_scores.shape != (n_users, k):
+        raise ValueError(
+            f"out buffers have to be of shape {(n_users, k)}, passed are {top_items.shape} and {top_scores.shape}"
+        )
+
+    excl_indptr, excl_indices = _exclusion_arrays(exclude, n_users)
+    excl_score = _excluded_score(scores.dtype)
+
+    if candidates is not None and len(candidates) != n_users:
+        raise ValueError(
+            f"candidates has to have one row for each user, rows in candidates: {len(candidates)}, users: {n_users}"
+        )
+    if candidate_scores and (candidates is None or candidates.shape != scores.shape):
+        raise ValueError(
+            "candidate scores have to be of the shape of candidates, passed are "
+            f"{scores.shape} and {None if candidates is None else candidates.shape}"
+        )
+
+    engine = TopkEngine(engine)
+    if engine == TopkEngine.AUTO:
+        engine = select_topk_engine(n_users, n_ranked, k)
+    topk_into = _numba_topk_kernel if engine == TopkEngine.NUMBA else _numpy_topk_into
+
+    logging.debug("Retrieving Top-K items with %s engine", engine)
+    # in-memory matrices are processed at once, memory-mapped ones and candidate scores gathered a block at a time
+    read_rows = n_users
+    if isinstance(scores, np.memmap) or candidates is not None:
+        read_rows = max(1, MMAP_BLOCK_BYTES // (n_ranked * scores.itemsize))
+    for start in range(0, n_users, read_rows):
+        stop = min(start + read_rows, n_users)
+        block_args = (
+            np.asarray(scores[start:stop]),
+            top_items[start:stop],
+            top_scores[start:stop],
+            excl_indptr[start : stop + 1],
+            excl_indices,
+            excl_score,
+        )
+        if candidates is None:
+            topk_into(*block_args)
+        else:
+            _candidates_topk_into(
+                np.asarray(candidates[start:stop]),
+                *block_args,
+                topk_into=topk_into,
+                candidate_scores=candidate_scores,
+            )
+    return top_items, top_scores
+
+
+def _check_k(k: int, n_ranked: int) -> None:
+    """Check k is within the number of items ranked for each user, the engines can not retrieve more
+
+    Args:
+        k (int): number of top items to retrieve
+        n_ranked (int): number of items ranked for each user, the items or the candidates of a row
+    """
+    if not 0 < k <= n_ranked:
+        raise ValueError(
+            f"k has to be between 1 and the number of ranked items, passed is {k}, ranked items: {n_ranked}"
+        )
+
+
+def _candidates_topk_into(
+    candidates: npt.NDArray[np.int_],
+    scores: npt.NDArray[np.float_],
+    top_items: npt.NDArray[np.int_],
+    top_scores: npt.NDArray[np.float_],
+    excl_indptr: npt.NDArray[np.int64],
+    excl_indices: npt.NDArray[np.int64],
+    excl_score: np.float_,
+    topk_into: Callable[..., None],
+    candidate_scores: bool,
+) -> None:
+    """Retrieve the top-k items and scores among the candidates of each user
+
+    Args:
+        candidates (npt.NDArray[np.int_]): (n_users, n_candidates) candidate items, padded with -1
+        scores (npt.NDArray[np.float_]): candidate scores, or full user-item scores matix
+        top_items (npt.NDArray[np.int_]): (n_users, k) buffer the top items are written into
+        top_scores (npt.NDArray[np.float_]): (n_users, k) buffer the top scores are written into
+        excl_indptr (npt.NDArray[np.int64]): CSR index pointer of the excluded items, one row per user
+        excl_indices (npt.NDArray[np.int64]): CSR excluded items
+        excl_score (np.float_): score given to padded and excluded candidates
+        topk_into (Callable[..., None]): top-k engine ranking the candidate scores
+        candidate_scores (bool): whether scores holds the candidate scores rather than the full score matrix
+    """
+    n_users = len(candidates)
+    valid = candidates >= 0
+    if not candidate_scores:
+        # gather the scores of the candidates from the full score matrix
+        scores = np.take_along_axis(scores, np.where(valid, candidates, 0), axis=1)
+
+    masked = ~valid
+    excl_start, excl_stop = excl_indptr[0], excl_indptr[-1]
+    if excl_stop > excl_start:
+        # match candidates and exclusions of each row through (row, item) keys
+        n_keys = (
+            int(max(candidates.max(), excl_indices[excl_start:excl_stop].max())) + 1
+        )
+        excl_rows = np.repeat(np.arange(n_users), np.diff(excl_indptr))
+        excl_keys = excl_rows * n_keys + excl_indices[excl_start:excl_stop]
+        masked |= np.isin(np.arange(n_users)[:, None] * n_keys + candidates, excl_keys)
+    if masked.any():
+        scores = scores.copy() if candidate_scores else scores
+        scores[masked] = excl_score
+
+    # rank the candidate positions, then map them back to items
+    positions = np.empty(top_items.shape, dtype=np.intp)
+    no_excl_indptr, no_excl_indices = _exclusion_arrays(None, n_users)
+    topk_into(
+        scores, positions, top_scores, no_excl_indptr, no_excl_indices, excl_score
+    )
+    top_items[:] = np.take_along_axis(candidates, positions, axis=1)
+
+
+def _numpy_topk_into(
+    scores: npt.NDArray[np.float_],
+    top_items: npt.NDArray[np.int_],
+    top_scores: npt.NDArray[np.float_],
+    excl_indptr: npt.NDArray[np.int64],
+    excl_indices: npt.NDArray[np.int64],
+    excl_score: np.float_,
+) -> None:
+    """Retrieve the top-k items and scores with argpartition, on cache-sized tiles of rows
+
+    Tiles containing excluded items are copied and masked, the score matrix is never modified.
+
+    Args:
+        scores (npt.NDArray[np.float_]): user-item scores matix
+        top_items (npt.NDArray[np.int_]): (n_users, k) buffer the top items are written into
+        top_scores (npt.NDArray[np.float_]): (n_users, k) buffer the top scores are written into
+        excl_indptr (npt.NDArray[np.int64]): CSR index pointer of the excluded items, one row per user
+        excl_indices (npt.NDArray[np.int64]): CSR excluded items
+        excl_score (np.float_): score given to the excluded items
+    """
+    n_users, n_items = scores.shape
+    k = top_items.shape[1]
+    # argpartition allocates an index array as large as its input, keep it within the L2 cache
+    tile_rows = max(1, TOPK_TILE_BYTES // (n_items * np.dtype(np.intp).itemsize))
+    for start in range(0, n_users, tile_rows):
+        stop = min(start + tile_rows, n_users)
+        tile = scores[start:stop]
+        excl_start, excl_stop = excl_indptr[start], excl_indptr[stop]
+        if excl_stop > excl_start:
+            tile = tile.copy()
+            excl_rows = np.repeat(
+                np.arange(stop - start), np.diff(excl_indptr[start : stop + 1])
+            )
+            tile[excl_rows, excl_indices[excl_start:excl_stop]] = excl_score
+        top_items[start:stop], top_scores[start:stop] = _get_topk_block(tile, k)
+
+
+def _excluded_score(dtype: np.dtype[Any]) -> np.float_:
+    """Score given to the excluded items, the lowest value representable by the dtype"""
+    if np.issubdtype(dtype, np.floating):
+        return dtype.type(-np.inf)  # type: ignore[no-any-return]
+    return dtype.type(np.iinfo(dtype).min)  # type: ignore[no-any-return]
+
+
+def _exclusion_arrays(
+    exclude: CSRLike | None, n_users: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """CSR index pointer and indices of the excluded items, indices sorted within each row
+
+    Args:
+        exclude (CSRLike | None): user-item matrix of the items to exclude, None to exclude nothing
+        n_users (int): number of rows of the score matrix
+
+    Returns:
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]: indptr and indices arrays
+    """
+    if exclude is None:
+        return np.zeros(n_users + 1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if exclude.shape[0] != n_users:
+        raise ValueError(
+            f"exclude has to have one row for each user, rows in exclude: {exclude.shape[0]}, users: {n_users}"
+        )
+    indptr = np.asarray(exclude.indptr, dtype=np.int64)
+    indices = np.asarray(exclude.indices, dtype=np.int64)
+    rows = np.repeat(np.arange(n_users), np.diff(indptr))
+    # the numba engine walks the exclusions of each row in increasing order
+    if ((np.diff(indices) < 0) & (np.diff(rows) == 0)).any():
+        indices = indices[np.lexsort((indices, rows))]
+    return indptr, indices
+
+
+def _get_topk_block(
+    scores: npt.NDArray[np.float_], k: int
+) -> tuple[npt.NDArray[np.int_], npt.NDArray[np.float_]]:
+    """Retrieve the top-k items and scores from an in-memory block of the score matrix
+
+    Args:
+        scores (npt.NDArray[np.float_]): user-item scores matix
+        k (int): number of top items and scores to retrieve
+
+    Returns:
+        tuple[npt.NDArray[np.int_], npt.NDArray[np.float_]]: top_items and top_scores
+    """
     # this determines the un-ordered top-k item indices for each user
     top_items = np.argpartition(scores, -k, axis=1)[:, -k:]
     top_scores = np.take_along_axis(scores, top_items, axis=1)
 
-    # sort top k items
-    sort_ind = np.argsort(-top_scores)
+    # argpartition picks arbitrarily among items tied with the k-th score,
+    # rows having more tied items than selected ones are ranked with a stable sort
+    kth_scores = top_scores.min(axis=1, keepdims=True)
+    tied_rows = np.flatnonzero(np.count_nonzero(scores >= kth_scores, axis=1) > k)
+    if len(tied_rows) > 0:
+        top_items[tied_rows] = np.argsort(-scores[tied_rows], axis=1, kind="stable")[
+            :, :k
+        ]
+        top_scores[tied_rows] = np.take_along_axis(
+            scores[tied_rows], top_items[tied_rows], axis=1
+        )
+
+    # sort top k items by decreasing score and increasing item index
+    index_ind = np.argsort(top_items, axis=1)
+    top_items = np.take_along_axis(top_items, index_ind, axis=1)
+    top_scores = np.take_along_axis(top_scores, index_ind, axis=1)
+    sort_ind = np.argsort(-top_scores, axis=1, kind="stable")
 
     top_items = np.take_along_axis(top_items, sort_ind, axis=1)
     top_scores = np.take_along_axis(top_scores, sort_ind, axis=1)
@@ -42,10 +356,43 @@ def get_topk(
     return top_items, top_scores
 
 
-@njit(cache=True, parallel=True)  # type: ignore # pragma: no cover
+@njit(cache=True)  # type: ignore # pragma: no cover
+def _heap_is_worse(
+    scores: npt.NDArray[np.float_],
+    items: npt.NDArray[np.int64],
+    i: int,
+    j: int,
+) -> bool:
+    """Whether heap entry i ranks after heap entry j: lower score or same score and higher item index"""
+    return scores[i] < scores[j] or (scores[i] == scores[j] and items[i] > items[j])  # type: ignore
+
+
+@njit(cache=True)  # type: ignore # pragma: no cover
+def _heap_sift_down(
+    scores: npt.NDArray[np.float_],
+    items: npt.NDArray[np.int64],
+    pos: int,
+    size: int,
+) -> None:
+    """Restore the min-heap property of the first size entries, starting from pos"""
+    while True:
+        worst = pos
+        left = 2 * pos + 1
+        right = left + 1
+        if left < size and _heap_is_worse(scores, items, left, worst):
+            worst = left
+        if right < size and _heap_is_worse(scores, items, right, worst):
+            worst = right
+        if worst == pos:
+            return
+        scores[pos], scores[worst] = scores[worst], scores[pos]
+        items[pos], items[worst] = items[worst], items[pos]
+        pos = worst
+
+
 def numba_get_topk(
     scores: npt.NDArray[np.float_], k: int
-) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float_]]:
     """Retrieve the top-k items and scores from a score matrix
 
     Args:
@@ -53,34 +400,75 @@ def numba_get_topk(
         k (int): number of top items and scores to retrieve
 
     Returns:
-        tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]: top_items and top_scores
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.float_]]: top_items and top_scores
     """
-    n_users, n_items = scores.shape
-    # convert scores to float32
-    scores = scores.astype(np.float32)
-
-    top_scores, top_items = np.zeros((n_users, k), dtype=np.float32), np.zeros(
-        (n_users, k), dtype=np.int64
+    n_users = scores.shape[0]
+    _check_k(k, scores.shape[1])
+    top_items = np.empty((n_users, k), dtype=np.int64)
+    top_scores = np.empty((n_users, k), dtype=scores.dtype)
+    excl_indptr, excl_indices = _exclusion_arrays(None, n_users)
+    _numba_topk_kernel(
+        scores,
+        top_items,
+        top_scores,
+        excl_indptr,
+        excl_indices,
+        _excluded_score(scores.dtype),
     )
+    return top_items, top_scores
+
+
+@njit(cache=True, parallel=True)  # type: ignore # pragma: no cover
+def _numba_topk_kernel(
+    scores: npt.NDArray[np.float_],
+    top_items: npt.NDArray[np.int_],
+    top_scores: npt.NDArray[np.float_],
+    excl_indptr: npt.NDArray[np.int64],
+    excl_indices: npt.NDArray[np.int64],
+    excl_score: np.float_,
+) -> None:
+    """Write the top-k items and scores of each row of the score matrix into the output buffers
+
+    Every row is scanned once keeping a min-heap of its k best items, stored directly
+    in the output buffers, rows are processed in parallel.
+    Excluded items are given excl_score while scanning the row, the score matrix is never modified.
+
+    Args:
+        scores (npt.NDArray[np.float_]): user-item scores matix
+        top_items (npt.NDArray[np.int_]): (n_users, k) buffer the top items are written into
+        top_scores (npt.NDArray[np.float_]): (n_users, k) buffer the top scores are written into
+        excl_indptr (npt.NDArray[np.int64]): CSR index pointer of the excluded items, one row per user
+        excl_indices (npt.NDArray[np.int64]): CSR excluded items, sorted within each row
+        excl_score (np.float_): score given to the excluded items
+    """
+    n_users, n_items = scores.shape
+    k = top_items.shape[1]
     # user cycle
     for i in prange(n_users):  # pylint: disable=not-an-iterable
+        heap_scores, heap_items = top_scores[i], top_items[i]
+        excl_pos, excl_end = excl_indptr[i], excl_indptr[i + 1]
         # item cycle
-        # declare type of the lists
-        user_scores = [np.float32(x) for x in range(0)]
-        item_idx = [np.int64(x) for x in range(0)]
-        score_idx_list = list(zip(user_scores, item_idx))
-        heapq.heapify(score_idx_list)
         for j in range(n_items):
-            candidate_score = scores[i][j]
+            score = scores[i, j]
+            # both items and exclusions are visited in increasing order
+            while excl_pos < excl_end and excl_indices[excl_pos] < j:
+                excl_pos += 1
+            if excl_pos < excl_end and excl_indices[excl_pos] == j:
+                score = excl_score
             if j < k:
-                heapq.heappush(score_idx_list, (candidate_score, j))  # type: ignore
-            elif candidate_score > score_idx_list[0][0]:
-                # pop smallest value and push new tup
-                heapq.heapreplace(score_idx_list, (candidate_score, j))  # type: ignore
-        topk = heapq.nlargest(k, score_idx_list)
-
-        for idx in range(k):
-            top_scores[i][idx] = topk[idx][0]
-            top_items[i][idx] = topk[idx][1]
-
-    return top_items, top_scores
+                # fill the heap with the first k items
+                heap_scores[j] = score
+                heap_items[j] = j
+                if j == k - 1:
+                    for pos in range(k // 2 - 1, -1, -1):
+                        _heap_sift_down(heap_scores, heap_items, pos, k)
+            elif score > heap_scores[0]:
+                # later items win over the heap root only with a strictly higher score
+                heap_scores[0] = score
+                heap_items[0] = j
+                _heap_sift_down(heap_scores, heap_items, 0, k)
+        # heap sort, moving the worst item to the end of the row
+        for size in range(k - 1, 0, -1):
+            heap_scores[0], heap_scores[size] = heap_scores[size], heap_scores[0]
+            heap_items[0], heap_items[size] = heap_items[size], heap_items[0]
+            _heap_sift_down(heap_scores, heap_items, 0, size)
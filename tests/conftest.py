@@ -1,8 +1,11 @@
+from types import SimpleNamespace
+
 import numpy as np
 import pandas as pd
 import pytest
 
 from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+from recval.holdout import HoldoutIndex
 
 
 @pytest.fixture()
@@ -83,3 +86,119 @@ def dummy_userids_scores_holdout():
     )
 
     return users, scores, holdout_df
+
+
+@pytest.fixture()
+def random_recs_gt():
+    # 50 users with 10 ranked recs each over 30 items, every user has at least one ground truth item
+    rng = np.random.default_rng(2022)
+    n_users, n_items, max_cutoff = 50, 30, 10
+    users = np.repeat(np.arange(n_users), max_cutoff)
+    items = np.concatenate(
+        [rng.choice(n_items, size=max_cutoff, replace=False) for _ in range(n_users)]
+    )
+    recs_df = pd.DataFrame(
+        zip(users, items), columns=[DEFAULT_USER_COL, DEFAULT_ITEM_COL]
+    )
+    recs_df["rank"] = np.tile(np.arange(1, max_cutoff + 1), n_users)
+
+    gt_items = [
+        rng.choice(n_items, size=rng.integers(1, 8), replace=False)
+        for _ in range(n_users)
+    ]
+    users_gt = np.repeat(np.arange(n_users), [len(x) for x in gt_items])
+    gt_df = pd.DataFrame(
+        zip(users_gt, np.concatenate(gt_items)),
+        columns=[DEFAULT_USER_COL, DEFAULT_ITEM_COL],
+    )
+    return recs_df, gt_df, max_cutoff
+
+
+@pytest.fixture()
+def recs_gt_batches(random_recs_gt):  # pylint: disable=redefined-outer-name
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    # 5 micro-batches of 10 users each
+    batches = [
+        (
+            recs_df[recs_df["user_id"] // 10 == batch],
+            gt_df[gt_df["user_id"] // 10 == batch],
+        )
+        for batch in range(5)
+    ]
+    return batches, max_cutoff
+
+
+@pytest.fixture()
+def recs_gt_parquet(random_recs_gt, tmp_path):  # pylint: disable=redefined-outer-name
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    # hive partitioned recommendations, with a column the evaluation does not read
+    recs_dir = tmp_path / "recs"
+    partitioned = recs_df.assign(
+        bucket=recs_df[DEFAULT_USER_COL] % 3, score=np.float32(1.0)
+    )
+    partitioned.to_parquet(recs_dir, partition_cols=["bucket"], row_group_size=64)
+    holdout_path = tmp_path / "holdout.parquet"
+    gt_df.to_parquet(holdout_path)
+    return recs_df, gt_df, max_cutoff, recs_dir, holdout_path
+
+
+@pytest.fixture()
+def random_scores_holdout():
+    # 40 users scored over 25 items, every user has at least one ground truth item
+    rng = np.random.default_rng(2022)
+    n_users, n_items = 40, 25
+    user_ids = np.arange(100, 100 + n_users)
+    scores = rng.random((n_users, n_items))
+    gt_items = [
+        rng.choice(n_items, size=rng.integers(1, 6), replace=False)
+        for _ in range(n_users)
+    ]
+    users_gt = np.repeat(user_ids, [len(x) for x in gt_items])
+    holdout_df = pd.DataFrame(
+        zip(users_gt, np.concatenate(gt_items)),
+        columns=[DEFAULT_USER_COL, DEFAULT_ITEM_COL],
+    )
+    return user_ids, scores, holdout_df
+
+
+@pytest.fixture()
+def make_csr():
+    def _make_csr(mask, shuffle=False):
+        # minimal CSR matrix with the attributes of scipy.sparse.csr_matrix
+        rows, cols = np.nonzero(mask)
+        if shuffle:
+            # indices in decreasing order within each row
+            order = np.lexsort((-cols, rows))
+            rows, cols = rows[order], cols[order]
+        indptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(rows, minlength=len(mask)))]
+        )
+        return SimpleNamespace(indptr=indptr, indices=cols, shape=mask.shape)
+
+    return _make_csr
+
+
+@pytest.fixture()
+def make_hit_matrix():
+    def _make_hit_matrix(gt_df, recs_df, max_cutoff):
+        # dense hits of the recommendations, as computed by the numpy backend
+        holdout = HoldoutIndex.from_frame(gt_df)
+        top_items = holdout.encode_recs(recs_df, max_cutoff=max_cutoff)
+        return holdout.hit_matrix(
+            top_items, rows=np.arange(holdout.n_users), item_codes=True
+        )
+
+    return _make_hit_matrix
+
+
+@pytest.fixture()
+def top_items_embeddings():
+    rng = np.random.default_rng(2022)
+    n_users, n_items, max_cutoff = 30, 20, 6
+    top_items = np.stack(
+        [rng.choice(n_items, size=max_cutoff, replace=False) for _ in range(n_users)]
+    )
+    # users with fewer recommendations than max_cutoff are padded with -1
+    top_items[:5, 3:] = -1
+    top_items[5, 1:] = -1
+    return top_items, rng.random((n_items, 4)) - 0.5, n_items
@@ -1,7 +1,16 @@
 import numpy as np
 import pytest
 
-from recval.metrics.accuracy import f1_score, precision, recall
+from recval.metrics.accuracy import (
+    f1_score,
+    f1_score_from_hits,
+    hit_rate,
+    hit_rate_from_hits,
+    precision,
+    precision_from_hits,
+    recall,
+    recall_from_hits,
+)
 from recval.metrics.metrics_utils import get_hit_rank
 
 
@@ -26,3 +35,28 @@ def test_f1_score(dummy_recs_gt_cutoff):
     assert rec_df["f1_score"].values == pytest.approx(
         np.array([2 * (1 / 3 * 1 / 2) / (1 / 3 + 1 / 2), 0.0, 1.0])
     )
+
+
+def test_hit_rate(dummy_recs_gt_cutoff):
+    recs_df, gt_df, _ = dummy_recs_gt_cutoff
+    _, df_hit_count = get_hit_rank(ground_truth_df=gt_df, pred_df=recs_df)
+    hr_df = hit_rate(df_hit_count=df_hit_count)
+    assert (hr_df["hit_rate"].values == np.array([1.0, 0.0, 1.0])).all()
+
+
+@pytest.mark.parametrize(
+    "dense_fn, fn",
+    [
+        (recall_from_hits, lambda hc, _: recall(hc)["recall"]),
+        (precision_from_hits, lambda hc, c: precision(hc, c)["precision"]),
+        (f1_score_from_hits, lambda hc, c: f1_score(hc, c)["f1_score"]),
+        (hit_rate_from_hits, lambda hc, _: hit_rate(hc)["hit_rate"]),
+    ],
+)
+def test_accuracy_from_hits(random_recs_gt, make_hit_matrix, dense_fn, fn):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    hit_matrix = make_hit_matrix(gt_df, recs_df, max_cutoff=max_cutoff)
+    for cutoff in [1, 5, max_cutoff]:
+        _, df_hit_count = get_hit_rank(gt_df, recs_df[recs_df["rank"] <= cutoff])
+        expected = fn(df_hit_count, cutoff).values
+        assert dense_fn(hit_matrix, cutoff) == pytest.approx(expected)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from recval.metrics.beyond_accuracy import (
+    average_popularity,
+    coverage_from_counts,
+    gini_from_counts,
+    intra_list_diversity,
+    novelty,
+    recommendation_counts,
+)
+
+
+def test_coverage_gini():
+    top_items = np.array([[0, 1, -1], [0, 2, 1]])
+    item_counts = recommendation_counts(top_items, cutoff=2, n_items=5)
+    np.testing.assert_array_equal(item_counts, [2, 1, 1, 0, 0])
+    assert coverage_from_counts(item_counts) == pytest.approx(3 / 5)
+    # mean absolute difference of the counts over twice their mean
+    diffs = np.abs(item_counts[:, None] - item_counts[None, :]).sum()
+    assert gini_from_counts(item_counts) == pytest.approx(
+        diffs / (2 * len(item_counts) ** 2 * item_counts.mean())
+    )
+    assert gini_from_counts(np.ones(5)) == 0.0
+    assert gini_from_counts(np.zeros(5)) == 0.0
+
+
+def test_novelty_average_popularity(top_items_embeddings):
+    top_items, _, n_items = top_items_embeddings
+    popularity = np.arange(n_items, dtype=np.float64)
+    for cutoff in [1, 3, 6]:
+        items = [row[row >= 0] for row in top_items[:, :cutoff]]
+        expected_arp = [popularity[row].mean() for row in items]
+        np.testing.assert_allclose(
+            average_popularity(top_items, cutoff, popularity), expected_arp
+        )
+        # items never interacted with count as interacted once
+        share = np.maximum(popularity, 1) / np.maximum(popularity, 1).sum()
+        expected_novelty = [-np.log2(share[row]).mean() for row in items]
+        np.testing.assert_allclose(
+            novelty(top_items, cutoff, popularity), expected_novelty
+        )
+
+
+def test_intra_list_diversity(top_items_embeddings):
+    top_items, embeddings, _ = top_items_embeddings
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    for cutoff in [1, 3, 6]:
+        expected = []
+        for row in top_items[:, :cutoff]:
+            row = row[row >= 0]
+            if len(row) < 2:
+                expected.append(0.0)
+                continue
+            similarity = normalized[row] @ normalized[row].T
+            n_pairs = len(row) * (len(row) - 1)
+            expected.append(1 - (similarity.sum() - np.trace(similarity)) / n_pairs)
+        # users are gathered in batches
+        for batch_size in [7, 100]:
+            np.testing.assert_allclose(
+                intra_list_diversity(top_items, cutoff, embeddings, batch_size),
+                expected,
+            )
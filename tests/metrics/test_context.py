@@ -0,0 +1,92 @@
+import pytest
+
+from recval.metrics import MetricFactory
+from recval.metrics.accuracy import (
+    f1_score,
+    f1_score_from_context,
+    hit_rate,
+    hit_rate_from_context,
+    precision,
+    recall,
+)
+from recval.metrics.context import MetricContext
+from recval.metrics.metrics_utils import get_hit_rank
+from recval.metrics.ranking import (
+    auc,
+    auc_from_context,
+    average_precision,
+    average_precision_from_context,
+    ndcg,
+    ndcg_from_context,
+    r_precision,
+    r_precision_from_context,
+    reciprocal_rank,
+    reciprocal_rank_from_context,
+)
+
+
+@pytest.mark.parametrize(
+    "context_fn, fn",
+    [
+        (lambda ctx: ctx.recall, lambda h, hc, _: recall(hc)["recall"]),
+        (lambda ctx: ctx.precision, lambda h, hc, c: precision(hc, c)["precision"]),
+        (f1_score_from_context, lambda h, hc, c: f1_score(hc, c)["f1_score"]),
+        (hit_rate_from_context, lambda h, hc, _: hit_rate(hc)["hit_rate"]),
+        (ndcg_from_context, lambda h, hc, c: ndcg(h, hc, c)["ndcg"]),
+        (
+            average_precision_from_context,
+            lambda h, hc, _: average_precision(h, hc)["avg_prec"],
+        ),
+        (reciprocal_rank_from_context, lambda h, hc, _: reciprocal_rank(h, hc)["mrr"]),
+        (
+            r_precision_from_context,
+            lambda h, hc, c: r_precision(h, hc, c)["r_precision"],
+        ),
+        (
+            lambda ctx: auc_from_context(ctx, n_items=30),
+            lambda h, hc, c: auc(h, hc, c, n_items=30)["auc"],
+        ),
+    ],
+)
+def test_metrics_from_context(random_recs_gt, context_fn, fn):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    for cutoff in [1, 5, max_cutoff]:
+        df_hit, df_hit_count = get_hit_rank(gt_df, recs_df[recs_df["rank"] <= cutoff])
+        context = MetricContext(df_hit=df_hit, df_hit_count=df_hit_count, cutoff=cutoff)
+        expected = fn(df_hit, df_hit_count, cutoff).values
+        assert context_fn(context) == pytest.approx(expected)
+
+
+def test_context_memoises_intermediates(dummy_recs_gt_cutoff):
+    recs_df, gt_df, cutoff = dummy_recs_gt_cutoff
+    df_hit, df_hit_count = get_hit_rank(ground_truth_df=gt_df, pred_df=recs_df)
+    context = MetricContext(df_hit=df_hit, df_hit_count=df_hit_count, cutoff=cutoff)
+    recall_, hit_positions = context.recall, context.hit_positions
+    f1_score_from_context(context)
+    assert context.recall is recall_
+    assert context.hit_positions is hit_positions
+    assert list(context.user_sum(context.ranks)) == [1, 0, 6]
+
+
+@pytest.mark.parametrize(
+    "name, fn",
+    [
+        ("recall", lambda h, hc, _: recall(hc)["recall"]),
+        ("precision", lambda h, hc, c: precision(hc, c)["precision"]),
+        ("f1_score", lambda h, hc, c: f1_score(hc, c)["f1_score"]),
+        ("ndcg", lambda h, hc, c: ndcg(h, hc, c)["ndcg"]),
+        ("map", lambda h, hc, _: average_precision(h, hc)["avg_prec"]),
+        ("mrr", lambda h, hc, _: reciprocal_rank(h, hc)["mrr"]),
+        ("hit_rate", lambda h, hc, _: hit_rate(hc)["hit_rate"]),
+        ("r_precision", lambda h, hc, c: r_precision(h, hc, c)["r_precision"]),
+        ("auc", lambda h, hc, c: auc(h, hc, c, n_items=30)["auc"]),
+    ],
+)
+def test_metric_call(random_recs_gt, name, fn):
+    # metrics called on the hit dataframes compute them on a context of their own
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    metric = MetricFactory.from_name(name, **({"n_items": 30} if name == "auc" else {}))
+    for cutoff in [1, 5, max_cutoff]:
+        df_hit, df_hit_count = get_hit_rank(gt_df, recs_df[recs_df["rank"] <= cutoff])
+        expected = fn(df_hit, df_hit_count, cutoff).mean()
+        assert metric(df_hit, df_hit_count, cutoff) == pytest.approx(expected)
@@ -1,9 +1,17 @@
 # get_hit_rank
 import numpy as np
+import pandas as pd
 import pytest
 
 from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
-from recval.metrics.metrics_utils import get_hit_rank
+from recval.holdout import HoldoutIndex
+from recval.metrics.metrics_utils import (
+    csr_take_rows,
+    get_hit_matrix_from_topk,
+    get_hit_rank,
+    get_hit_rank_cutoffs,
+    isin_sorted,
+)
 
 
 def test_get_hit_rank(dummy_recs_gt_cutoff):
@@ -30,3 +38,67 @@ def test_get_hit_rank_no_hits(no_hit_recs_gt):
     recs_df, gt_df = no_hit_recs_gt
     with pytest.raises(ValueError):
         get_hit_rank(ground_truth_df=gt_df, pred_df=recs_df)
+
+
+def test_get_hit_rank_missing_users(dummy_recs_gt_cutoff):
+    recs_df, gt_df, _ = dummy_recs_gt_cutoff
+    with pytest.raises(ValueError, match="Missing predictions"):
+        get_hit_rank(
+            ground_truth_df=gt_df, pred_df=recs_df[recs_df[DEFAULT_USER_COL] != 2]
+        )
+
+
+def test_get_hit_rank_cutoffs(random_recs_gt):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    cutoffs = [1, 5, max_cutoff]
+    # the hits are sorted by user and rank whatever the order of the recommendations
+    shuffled_df = recs_df.sample(frac=1, random_state=0)
+    for cutoff, df_hit, df_hit_count in get_hit_rank_cutoffs(
+        ground_truth_df=gt_df, pred_df=shuffled_df, cutoffs=cutoffs
+    ):
+        assert df_hit.equals(df_hit.sort_values([DEFAULT_USER_COL, "rank"]))
+        expected_hit, expected_hit_count = get_hit_rank(
+            ground_truth_df=gt_df, pred_df=recs_df[recs_df["rank"] <= cutoff]
+        )
+        pd.testing.assert_frame_equal(
+            df_hit.reset_index(drop=True), expected_hit.reset_index(drop=True)
+        )
+        pd.testing.assert_frame_equal(df_hit_count, expected_hit_count)
+
+
+def test_get_hit_rank_cutoffs_no_hits(no_hit_recs_gt):
+    recs_df, gt_df = no_hit_recs_gt
+    with pytest.raises(ValueError):
+        list(get_hit_rank_cutoffs(ground_truth_df=gt_df, pred_df=recs_df, cutoffs=[3]))
+
+
+def test_isin_sorted():
+    sorted_keys = np.array([1, 4, 9], dtype=np.int64)
+    keys = np.array([0, 1, 5, 9, 12], dtype=np.int64)
+    assert (isin_sorted(keys, sorted_keys) == np.isin(keys, sorted_keys)).all()
+    assert not isin_sorted(keys, sorted_keys[:0]).any()
+
+
+def test_get_hit_matrix_from_topk(dummy_userids_scores_holdout):
+    users, _, holdout_df = dummy_userids_scores_holdout
+    top_items = np.array([[4, 3, 2], [4, 3, 2], [4, -1, 2]])
+    indptr, indices = HoldoutIndex.from_frame(holdout_df).csr(rows=np.arange(3))
+    assert (indptr == np.array([0, 1, 3, 6])).all()
+    assert (indices == np.array([0, 1, 2, 2, 3, 4])).all()
+
+    hit_matrix = get_hit_matrix_from_topk(
+        top_items, indptr=indptr, indices=indices, user_ids=np.array(users)
+    )
+    expected_hits = np.array(
+        [[False, False, False], [False, False, True], [True, False, True]]
+    )
+    assert (hit_matrix.hits == expected_hits).all()
+    assert (hit_matrix.actual == np.array([1, 2, 3])).all()
+
+
+def test_csr_take_rows():
+    indptr = np.array([0, 2, 2, 5, 6])
+    indices = np.array([1, 3, 0, 2, 4, 7])
+    sub_indptr, sub_indices = csr_take_rows(indptr, indices, rows=np.array([3, 1, 0]))
+    assert (sub_indptr == np.array([0, 1, 1, 3])).all()
+    assert (sub_indices == np.array([7, 1, 3])).all()
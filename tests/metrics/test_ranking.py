@@ -1,8 +1,21 @@
 import numpy as np
 import pytest
 
-from recval.metrics.metrics_utils import get_hit_rank
-from recval.metrics.ranking import average_precision, ndcg
+from recval.metrics.metrics_utils import HitMatrix, get_hit_rank
+from recval.metrics.ranking import (
+    auc,
+    auc_from_hits,
+    average_precision,
+    average_precision_from_hits,
+    cumulative_discount,
+    get_ideal_dcg,
+    ndcg,
+    ndcg_from_hits,
+    r_precision,
+    r_precision_from_hits,
+    reciprocal_rank,
+    reciprocal_rank_from_hits,
+)
 
 
 def test_ndcg(dummy_recs_gt_cutoff):
@@ -14,8 +27,119 @@ def test_ndcg(dummy_recs_gt_cutoff):
     )
 
 
+def test_ndcg_graded_relevance(dummy_recs_gt_cutoff):
+    recs_df, gt_df, cutoff = dummy_recs_gt_cutoff
+    gt_df["rating"] = [3, 1, 2, 2, 1, 2, 3]
+    df_hit, df_hit_count = get_hit_rank(
+        ground_truth_df=gt_df, pred_df=recs_df, col_rating="rating"
+    )
+    df_idcg = get_ideal_dcg(gt_df, cutoff=cutoff)
+    ndcg_df = ndcg(
+        df_hit=df_hit,
+        df_hit_count=df_hit_count,
+        cutoff=cutoff,
+        col_rating="rating",
+        df_idcg=df_idcg,
+    )
+    # user 1 hits the item with relevance 3 at rank 1, user 3 ranks its items by increasing relevance
+    assert ndcg_df["ndcg"].values == pytest.approx(
+        np.array(
+            [
+                3 / (3 + 1 / np.log2(3)),
+                0.0,
+                (1 + 2 / np.log2(3) + 3 / 2) / (3 + 2 / np.log2(3) + 1 / 2),
+            ]
+        )
+    )
+    with pytest.raises(ValueError):
+        ndcg(df_hit, df_hit_count, cutoff=cutoff, col_rating="rating")
+
+
+def test_cumulative_discount():
+    table = cumulative_discount(5)
+    assert table is cumulative_discount(5)
+    assert not table.flags.writeable
+    assert table == pytest.approx(
+        np.concatenate([[0.0], np.cumsum(1 / np.log2(np.arange(2, 7)))])
+    )
+
+
 def test_average_precision(dummy_recs_gt_cutoff):
     recs_df, gt_df, _ = dummy_recs_gt_cutoff
     df_hit, df_hit_count = get_hit_rank(ground_truth_df=gt_df, pred_df=recs_df)
     ap_df = average_precision(df_hit=df_hit, df_hit_count=df_hit_count)
     assert ap_df["avg_prec"].values == pytest.approx(np.array([0.5, 0.0, 1.0]))
+
+
+def test_ndcg_from_hits(random_recs_gt, make_hit_matrix):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    hit_matrix = make_hit_matrix(gt_df, recs_df, max_cutoff=max_cutoff)
+    for cutoff in [1, 5, max_cutoff]:
+        df_hit, df_hit_count = get_hit_rank(gt_df, recs_df[recs_df["rank"] <= cutoff])
+        expected = ndcg(df_hit=df_hit, df_hit_count=df_hit_count, cutoff=cutoff)
+        assert ndcg_from_hits(hit_matrix, cutoff) == pytest.approx(
+            expected["ndcg"].values
+        )
+
+
+def test_average_precision_from_hits(random_recs_gt, make_hit_matrix):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    hit_matrix = make_hit_matrix(gt_df, recs_df, max_cutoff=max_cutoff)
+    for cutoff in [1, 5, max_cutoff]:
+        df_hit, df_hit_count = get_hit_rank(gt_df, recs_df[recs_df["rank"] <= cutoff])
+        expected = average_precision(df_hit=df_hit, df_hit_count=df_hit_count)
+        assert average_precision_from_hits(hit_matrix, cutoff) == pytest.approx(
+            expected["avg_prec"].values
+        )
+
+
+def test_reciprocal_rank_r_precision(dummy_recs_gt_cutoff):
+    recs_df, gt_df, cutoff = dummy_recs_gt_cutoff
+    df_hit, df_hit_count = get_hit_rank(ground_truth_df=gt_df, pred_df=recs_df)
+    rr_df = reciprocal_rank(df_hit=df_hit, df_hit_count=df_hit_count)
+    assert rr_df["mrr"].values == pytest.approx(np.array([1.0, 0.0, 1.0]))
+    # user 1 has 2 ground truth items and hits one of its first 2 recommendations
+    r_prec_df = r_precision(df_hit=df_hit, df_hit_count=df_hit_count, cutoff=cutoff)
+    assert r_prec_df["r_precision"].values == pytest.approx(np.array([0.5, 0.0, 1.0]))
+
+
+@pytest.mark.parametrize(
+    "dense_fn, fn",
+    [
+        (reciprocal_rank_from_hits, lambda h, hc, _: reciprocal_rank(h, hc)["mrr"]),
+        (r_precision_from_hits, lambda h, hc, c: r_precision(h, hc, c)["r_precision"]),
+        (
+            lambda hm, c: auc_from_hits(hm, c, n_items=30),
+            lambda h, hc, c: auc(h, hc, c, n_items=30)["auc"],
+        ),
+    ],
+)
+def test_rank_metrics_from_hits(random_recs_gt, make_hit_matrix, dense_fn, fn):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    hit_matrix = make_hit_matrix(gt_df, recs_df, max_cutoff=max_cutoff)
+    for cutoff in [1, 5, max_cutoff]:
+        df_hit, df_hit_count = get_hit_rank(gt_df, recs_df[recs_df["rank"] <= cutoff])
+        expected = fn(df_hit, df_hit_count, cutoff).values
+        assert dense_fn(hit_matrix, cutoff) == pytest.approx(expected)
+
+
+def test_auc_full_ranking():
+    rng = np.random.default_rng(2022)
+    n_users, n_items = 20, 12
+    hits = np.stack(
+        [rng.permutation(n_items) < rng.integers(1, 6) for _ in range(n_users)]
+    )
+    hit_matrix = HitMatrix(
+        user_ids=np.arange(n_users), hits=hits, actual=hits.sum(axis=1)
+    )
+    # fraction of (positive, negative) pairs with the positive ranked first
+    expected = [
+        (np.flatnonzero(row)[:, None] < np.flatnonzero(~row)[None, :]).mean()
+        for row in hits
+    ]
+    assert auc_from_hits(hit_matrix, n_items, n_items=n_items) == pytest.approx(
+        expected
+    )
+    # missed positives are tied with the negatives after the cutoff
+    truncated = auc_from_hits(hit_matrix, 1, n_items=n_items)
+    assert (truncated >= 0).all() and (truncated <= 1).all()
@@ -0,0 +1,114 @@
+import json
+from typing import Any
+
+import numpy as np
+import pytest
+
+from recval.benchmark import (
+    BenchmarkCase,
+    benchmark_cases,
+    compare_to_baseline,
+    main,
+    results_to_json,
+    run_case,
+    synthetic_data,
+)
+from recval.constants import DEFAULT_ITEM_COL, DEFAULT_USER_COL
+
+
+def test_synthetic_data():
+    scores, holdout_df = synthetic_data(500, 200, max_holdout=10)
+    assert scores.shape == (500, 200)
+    assert not holdout_df.duplicated().any()
+    actual = holdout_df.groupby(DEFAULT_USER_COL).size()
+    assert len(actual) == 500
+    assert actual.min() == 1 and actual.max() == 10
+    # power-law popularity, the head items are drawn much more often than the tail ones
+    counts = np.sort(np.bincount(holdout_df[DEFAULT_ITEM_COL], minlength=200))[::-1]
+    assert counts[:20].sum() > counts[-100:].sum()
+    # seeded, the same data is drawn again
+    scores_again, holdout_again = synthetic_data(500, 200, max_holdout=10)
+    np.testing.assert_array_equal(scores, scores_again)
+    assert holdout_df.equals(holdout_again)
+
+
+def test_benchmark_cases():
+    cases = benchmark_cases(
+        n_users=[10, 20],
+        n_items=[30],
+        cutoffs=[[5], [5, 10]],
+        metric_sets=["accuracy"],
+        backends=["pandas", "numpy"],
+    )
+    assert len(cases) == 8
+    assert len({case.name for case in cases}) == 8
+    with pytest.raises(ValueError):
+        benchmark_cases([10], [30], [[5]], ["diversity"], ["numpy"])
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_run_case(backend):
+    case = BenchmarkCase(
+        n_users=200, n_items=100, cutoffs=(5, 10), metric_set="ranking", backend=backend
+    )
+    result = run_case(case, repeat=1)
+    assert list(result.stages) == [
+        "holdout_index",
+        "get_topk",
+        "recs_from_scores",
+        "hits",
+        "eval_from_scores",
+        "eval_from_recs",
+    ]
+    for timing in result.stages.values():
+        assert timing.wall_time > 0
+        assert timing.peak_rss_mb > 0
+        assert 0 <= timing.rss_increase_mb <= timing.peak_rss_mb
+    report = results_to_json([result])
+    assert json.loads(json.dumps(report))["cases"][case.name]["case"]["cutoffs"] == [
+        5,
+        10,
+    ]
+
+
+def test_compare_to_baseline():
+    def report(wall_time: float, rss_increase_mb: float) -> dict[str, Any]:
+        stage = {
+            "wall_time": wall_time,
+            "peak_rss_mb": 100.0,
+            "rss_increase_mb": rss_increase_mb,
+        }
+        return {"cases": {"case": {"stages": {"get_topk": stage}}}}
+
+    baseline = report(1.0, 10.0)
+    assert not compare_to_baseline(report(1.2, 12.0), baseline)
+    regressions = compare_to_baseline(report(1.5, 20.0), baseline)
+    assert [regression.measure for regression in regressions] == [
+        "wall_time",
+        "rss_increase_mb",
+    ]
+    assert regressions[0].ratio == pytest.approx(1.5)
+    # increases below the noise floor are ignored
+    assert not compare_to_baseline(report(0.002, 0.5), report(0.001, 0.1))
+    # cases missing from the baseline are skipped
+    assert not compare_to_baseline(report(1.5, 20.0), {"cases": {}})
+    # as well as their stages
+    assert not compare_to_baseline(
+        report(1.5, 20.0), {"cases": {"case": {"stages": {}}}}
+    )
+
+
+def test_main(tmp_path):
+    args = ["--n-users", "100", "--n-items", "50", "--cutoffs", "5", "--repeat", "1"]
+    output = tmp_path / "report.json"
+    assert main(args + ["--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert len(report["cases"]) == 4
+    assert "numpy" in report["environment"]
+    # the same run is within the tolerance of itself, an impossibly fast baseline is not
+    assert main(args + ["--baseline", str(output), "--tolerance", "100"]) == 0
+    for case in report["cases"].values():
+        for timing in case["stages"].values():
+            timing["wall_time"] = -1.0
+    output.write_text(json.dumps(report))
+    assert main(args + ["--baseline", str(output)]) == 1
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from recval.encoding import IdEncoder, code_dtype, rank_dtype
+
+
+def test_code_dtype():
+    assert code_dtype(10) == np.int32
+    assert code_dtype(2**31 - 1) == np.int32
+    assert code_dtype(2**31) == np.int64
+
+
+def test_rank_dtype():
+    assert rank_dtype(100) == np.int16
+    assert rank_dtype(2**15 - 1) == np.int16
+    assert rank_dtype(2**15) == np.int32
+
+
+def test_id_encoder():
+    encoder = IdEncoder(np.array(["u1", "u2", "u3"]))
+    assert len(encoder) == 3
+
+    codes = encoder.encode(["u2", "u3", "u1", "u2"])
+    assert codes.dtype == np.int32
+    np.testing.assert_array_equal(codes, [1, 2, 0, 1])
+    np.testing.assert_array_equal(encoder.decode(codes), ["u2", "u3", "u1", "u2"])
+
+    # ids keep their order when the encoder is built from them
+    np.testing.assert_array_equal(IdEncoder(np.array([7, 3, 5])).encode([3, 7]), [1, 0])
+
+
+def test_id_encoder_unknown_ids():
+    encoder = IdEncoder(np.array([10, 20, 30]))
+    with pytest.raises(ValueError):
+        encoder.encode([10, 40])
+    np.testing.assert_array_equal(encoder.encode([10, 40], strict=False), [0, -1])
+    with pytest.raises(ValueError):
+        IdEncoder(np.array([1, 2, 1]))
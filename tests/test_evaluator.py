@@ -1,6 +1,9 @@
+import numpy as np
+import pandas as pd
 import pytest
 
 from recval.evaluator import RecEvaluator
+from recval.holdout import HoldoutIndex
 
 
 def test_receval_invalid_metrics():
@@ -78,3 +81,713 @@ def test_receval_eval_from_scores_missing_users_ids(dummy_userids_scores_holdout
     assert res_df[res_df["metric"] == "precision"].value.values[0] == pytest.approx(
         0.4444, rel=1e-3
     )
+
+
+def test_receval_cutoff_without_hits(random_recs_gt):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    # the first recommendation of every user is never a ground truth item
+    users = recs_df["user_id"].unique()
+    first_df = pd.DataFrame({"user_id": users, "item_id": 10_000, "rank": 1})
+    shifted_df = pd.concat([first_df, recs_df.assign(rank=recs_df["rank"] + 1)])
+    metric_list = ["recall", "precision", "ndcg", "map", "mrr", "r_precision", "auc"]
+    res_dfs = [
+        RecEvaluator(
+            metrics=metric_list,
+            cutoffs=[1, max_cutoff + 1],
+            backend=backend,
+            metric_params={"auc": {"n_items": 30}},
+        ).eval_from_recs(shifted_df, holdout_data=gt_df, verbose=False)
+        for backend in ["pandas", "numpy"]
+    ]
+    pd.testing.assert_frame_equal(res_dfs[0], res_dfs[1])
+    ranked_df = res_dfs[0][res_dfs[0]["metric"] != "auc"]
+    assert (ranked_df.loc[ranked_df["cutoff"] == 1, "value"] == 0).all()
+    assert (res_dfs[0].loc[res_dfs[0]["cutoff"] > 1, "value"] > 0).all()
+
+
+def test_receval_invalid_backend():
+    with pytest.raises(ValueError):
+        _ = RecEvaluator(cutoffs=[5], metrics=["recall"], backend="spark")
+
+
+def test_receval_numpy_backend(random_recs_gt):
+    metric_list = ["recall", "precision", "f1_score", "ndcg", "map"]
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    cutoff_list = [1, 5, max_cutoff]
+    expected_df = RecEvaluator(metrics=metric_list, cutoffs=cutoff_list).eval_from_recs(
+        recs_df=recs_df, holdout_data=gt_df, verbose=False
+    )
+    result_df = RecEvaluator(
+        metrics=metric_list, cutoffs=cutoff_list, backend="numpy"
+    ).eval_from_recs(recs_df=recs_df, holdout_data=gt_df, verbose=False)
+    pd.testing.assert_frame_equal(result_df, expected_df)
+
+
+def test_receval_eval_from_scores_numpy_backend(dummy_userids_scores_holdout):
+    metric_list = ["recall", "precision", "f1_score", "ndcg", "map"]
+    cutoff_list = [1, 3]
+    users, scores, holdout_df = dummy_userids_scores_holdout
+    expected_df = RecEvaluator(
+        metrics=metric_list, cutoffs=cutoff_list
+    ).eval_from_scores(
+        scores=scores, user_ids=users, holdout_data=holdout_df, verbose=False
+    )
+    res_df = RecEvaluator(
+        metrics=metric_list, cutoffs=cutoff_list, backend="numpy"
+    ).eval_from_scores(
+        scores=scores, user_ids=users, holdout_data=holdout_df, verbose=False
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_receval_numpy_backend_repeated_users(random_scores_holdout, n_jobs):
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(
+        metrics=["recall"], cutoffs=[5], backend="numpy", n_jobs=n_jobs
+    )
+    with pytest.raises(ValueError):
+        evaluator.eval_from_scores(
+            scores=np.vstack([scores, scores[:1]]),
+            user_ids=np.append(user_ids, user_ids[0]),
+            holdout_data=holdout_df,
+            verbose=False,
+        )
+
+
+def test_receval_eval_from_score_batches(random_scores_holdout):
+    metric_list = ["recall", "precision", "f1_score", "ndcg", "map"]
+    cutoff_list = [1, 5, 10]
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=metric_list, cutoffs=cutoff_list)
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+
+    # iterable of batches, in shuffled user order
+    order = np.random.default_rng(0).permutation(len(user_ids))
+    batches = (
+        (user_ids[order[i : i + 7]], scores[order[i : i + 7]])
+        for i in range(0, len(order), 7)
+    )
+    res_df = evaluator.eval_from_score_batches(
+        batches=batches, holdout_data=holdout_df, verbose=False
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+    # callable scoring a slice of users
+    res_df = evaluator.eval_from_score_batches(
+        batches=lambda users: scores[users - 100],
+        holdout_data=holdout_df,
+        batch_size=9,
+        verbose=False,
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+def test_receval_eval_from_score_batches_missing_users(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=["recall"], cutoffs=[5])
+    with pytest.raises(ValueError):
+        evaluator.eval_from_score_batches(
+            batches=[(user_ids[:10], scores[:10])], holdout_data=holdout_df
+        )
+    with pytest.raises(ValueError):
+        evaluator.eval_from_score_batches(
+            batches=[(user_ids, scores), (user_ids[:1], scores[:1])],
+            holdout_data=holdout_df,
+        )
+
+
+def test_receval_eval_from_score_batches_no_hits(dummy_userids_scores_holdout):
+    users, _, holdout_df = dummy_userids_scores_holdout
+    # top item is 3 for user 0 and 0 for users 1 and 2, never in their holdout
+    scores = np.eye(5)[[3, 0, 0]]
+    evaluator = RecEvaluator(metrics=["recall"], cutoffs=[1])
+    with pytest.raises(ValueError):
+        evaluator.eval_from_score_batches(
+            batches=[(users, scores)], holdout_data=holdout_df
+        )
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_receval_eval_from_scores_memmap(tmp_path, random_scores_holdout, backend):
+    user_ids, scores, holdout_df = random_scores_holdout
+    scores_path = tmp_path / "scores.npy"
+    np.save(scores_path, scores)
+    evaluator = RecEvaluator(
+        metrics=["recall", "ndcg"], cutoffs=[1, 5], backend=backend
+    )
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    res_df = evaluator.eval_from_scores(
+        scores=scores_path, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+def test_receval_topk_engine(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    res_dfs = [
+        RecEvaluator(
+            metrics=["recall", "ndcg"], cutoffs=[1, 5], topk_engine=engine
+        ).eval_from_scores(
+            scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+        )
+        for engine in ["numpy", "numba"]
+    ]
+    pd.testing.assert_frame_equal(res_dfs[0], res_dfs[1])
+    with pytest.raises(ValueError):
+        RecEvaluator(metrics=["recall"], cutoffs=[1], topk_engine="torch")
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_receval_eval_from_scores_exclude(random_scores_holdout, make_csr, backend):
+    user_ids, scores, holdout_df = random_scores_holdout
+    # exclude the 3 best items of every user
+    seen = np.argsort(-scores, axis=1)[:, :3]
+    seen_mask = np.zeros(scores.shape, dtype=bool)
+    np.put_along_axis(seen_mask, seen, True, axis=1)
+    exclude = make_csr(seen_mask)
+    masked_scores = scores.copy()
+    np.put_along_axis(masked_scores, seen, -np.inf, axis=1)
+
+    evaluator = RecEvaluator(
+        metrics=["recall", "ndcg"], cutoffs=[1, 5], backend=backend
+    )
+    expected_df = evaluator.eval_from_scores(
+        scores=masked_scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    res_df = evaluator.eval_from_scores(
+        scores=scores,
+        user_ids=user_ids,
+        holdout_data=holdout_df,
+        verbose=False,
+        exclude=exclude,
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+def test_receval_eval_from_scores_candidates(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    # every user is ranked against its holdout items and 10 sampled items
+    rng = np.random.default_rng(0)
+    holdout_items = holdout_df.groupby("user_id")["item_id"].apply(list)
+    candidates = np.full((len(user_ids), 15), -1)
+    for row, user in enumerate(user_ids):
+        items = np.unique(
+            np.concatenate(
+                [holdout_items[user], rng.choice(25, size=10, replace=False)]
+            )
+        )
+        candidates[row, : len(items)] = items
+    aligned_scores = np.take_along_axis(scores, np.maximum(candidates, 0), axis=1)
+
+    res_dfs = [
+        RecEvaluator(
+            metrics=["recall", "ndcg"], cutoffs=[1, 5], backend=backend, n_jobs=n_jobs
+        ).eval_from_scores(
+            scores=cand_scores,
+            user_ids=user_ids,
+            holdout_data=holdout_df,
+            verbose=False,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
+        )
+        for backend, n_jobs in [("pandas", 1), ("numpy", 1), ("numpy", 2)]
+        for cand_scores, candidate_scores in [(scores, False), (aligned_scores, True)]
+    ]
+    for res_df in res_dfs[1:]:
+        pd.testing.assert_frame_equal(res_df, res_dfs[0])
+
+
+def test_receval_n_jobs_eval_from_recs(random_recs_gt):
+    metric_list = ["recall", "precision", "f1_score", "ndcg", "map"]
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    cutoff_list = [1, 5, max_cutoff]
+    expected_df = RecEvaluator(metrics=metric_list, cutoffs=cutoff_list).eval_from_recs(
+        recs_df=recs_df, holdout_data=gt_df, verbose=False
+    )
+    result_df = RecEvaluator(
+        metrics=metric_list, cutoffs=cutoff_list, n_jobs=2
+    ).eval_from_recs(recs_df=recs_df, holdout_data=gt_df, verbose=False)
+    pd.testing.assert_frame_equal(result_df, expected_df)
+
+
+def test_receval_n_jobs_eval_from_scores(tmp_path, random_scores_holdout, make_csr):
+    user_ids, scores, holdout_df = random_scores_holdout
+    scores_path = tmp_path / "scores.npy"
+    np.save(scores_path, scores)
+    exclude = make_csr(np.random.default_rng(0).random(scores.shape) < 0.2)
+    metric_list = ["recall", "ndcg", "map"]
+    expected_df = RecEvaluator(metrics=metric_list, cutoffs=[1, 5]).eval_from_scores(
+        scores=scores,
+        user_ids=user_ids,
+        holdout_data=holdout_df,
+        verbose=False,
+        exclude=exclude,
+    )
+    evaluator = RecEvaluator(
+        metrics=metric_list, cutoffs=[1, 5], topk_engine="numba", n_jobs=2
+    )
+    # in-memory scores are spilled to a temporary file, memory-mapped ones are reopened by the workers
+    for shared_scores in [scores, scores_path]:
+        res_df = evaluator.eval_from_scores(
+            scores=shared_scores,
+            user_ids=user_ids,
+            holdout_data=holdout_df,
+            verbose=False,
+            exclude=exclude,
+        )
+        pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+def test_receval_n_jobs_memmap_views(tmp_path, random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    # the scores are stored after 7 other rows and before 3 other columns, scoring lower than every item
+    padded = np.full((len(scores) + 7, scores.shape[1] + 3), -1.0)
+    padded[7:, : scores.shape[1]] = scores
+    scores_path = tmp_path / "scores.npy"
+    np.save(scores_path, padded)
+    mapped = np.load(scores_path, mmap_mode="r")
+    # a contiguous row slice is remapped at its own offset, a column slice is spilled
+    row_view = mapped[7:, :]
+    assert row_view.flags.c_contiguous and row_view.shape[1] > scores.shape[1]
+    column_view = mapped[7:, : scores.shape[1]]
+    assert not column_view.flags.c_contiguous
+    expected_df = RecEvaluator(
+        metrics=["recall", "ndcg"], cutoffs=[1, 5]
+    ).eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    for view in [row_view, column_view]:
+        for n_jobs in [1, 2]:
+            evaluator = RecEvaluator(
+                metrics=["recall", "ndcg"], cutoffs=[1, 5], n_jobs=n_jobs
+            )
+            res_df = evaluator.eval_from_scores(
+                scores=view, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+            )
+            pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+def test_receval_invalid_n_jobs():
+    with pytest.raises(ValueError):
+        _ = RecEvaluator(cutoffs=[5], metrics=["recall"], n_jobs=0)
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_receval_holdout_index(random_scores_holdout, backend):
+    user_ids, scores, holdout_df = random_scores_holdout
+    holdout = HoldoutIndex.from_frame(holdout_df)
+    evaluator = RecEvaluator(
+        metrics=["recall", "ndcg"], cutoffs=[1, 5], backend=backend
+    )
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    # the same index is reused across evaluations
+    for _ in range(2):
+        res_df = evaluator.eval_from_scores(
+            scores=scores, user_ids=user_ids, holdout_data=holdout, verbose=False
+        )
+        pd.testing.assert_frame_equal(res_df, expected_df)
+    res_df = evaluator.eval_from_score_batches(
+        batches=[(user_ids[:20], scores[:20]), (user_ids[20:], scores[20:])],
+        holdout_data=holdout,
+        verbose=False,
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+    if backend == "numpy":
+        assert set(holdout.idcg) == {1, 5}
+
+
+def test_receval_user_metrics(random_scores_holdout):
+    metric_list = ["recall", "precision", "f1_score", "ndcg", "map"]
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=metric_list, cutoffs=[1, 5])
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+
+    user_df = evaluator.user_metrics_from_scores(
+        scores=scores[::-1], user_ids=user_ids[::-1], holdout_data=holdout_df
+    )
+    np.testing.assert_array_equal(user_df.index, user_ids[::-1])
+    assert (user_df.dtypes == np.float32).all()
+    assert list(user_df.columns) == [
+        f"{metric}@{cutoff}" for cutoff in [1, 5] for metric in metric_list
+    ]
+    # averaging the users gives back the evaluation results
+    means = user_df.mean()
+    for _, row in expected_df.iterrows():
+        assert means[f"{row.metric}@{row.cutoff}"] == pytest.approx(row.value, rel=1e-5)
+
+    recs_df = RecEvaluator.recs_from_scores(scores, cutoff=5, user_ids=user_ids)
+    recs_user_df = evaluator.user_metrics_from_recs(recs_df, holdout_data=holdout_df)
+    pd.testing.assert_frame_equal(recs_user_df, user_df.sort_index())
+
+
+def test_receval_user_metrics_no_hits(no_hit_recs_gt, dummy_userids_scores_holdout):
+    evaluator = RecEvaluator(metrics=["recall"], cutoffs=[1])
+    recs_df, gt_df = no_hit_recs_gt
+    with pytest.raises(ValueError, match="No hits"):
+        evaluator.user_metrics_from_recs(recs_df, holdout_data=gt_df)
+    users, _, holdout_df = dummy_userids_scores_holdout
+    # top item is 3 for user 0 and 0 for users 1 and 2, never in their holdout
+    with pytest.raises(ValueError, match="No hits"):
+        evaluator.user_metrics_from_scores(
+            np.eye(5)[[3, 0, 0]], holdout_data=holdout_df, user_ids=users
+        )
+
+
+def test_receval_eval_segments(random_scores_holdout):
+    metric_list = ["recall", "ndcg"]
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=metric_list, cutoffs=[1, 5])
+    # the last 5 users have no segment
+    segments = pd.Series(np.where(user_ids % 2 == 0, "even", "odd"), index=user_ids)[
+        :-5
+    ]
+
+    res_df = evaluator.eval_segments_from_scores(
+        scores=scores,
+        user_ids=user_ids,
+        holdout_data=holdout_df,
+        segments=segments,
+        verbose=False,
+    )
+    assert list(res_df["segment"].unique()) == ["all", "even", "odd"]
+    global_df = res_df[res_df["segment"] == "all"].drop(columns=["segment", "n_users"])
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    pd.testing.assert_frame_equal(global_df.reset_index(drop=True), expected_df)
+
+    for segment, segment_users in segments.groupby(segments).groups.items():
+        rows = np.isin(user_ids, segment_users)
+        expected_df = evaluator.eval_from_scores(
+            scores=scores[rows],
+            user_ids=user_ids[rows],
+            holdout_data=holdout_df[holdout_df["user_id"].isin(segment_users)],
+            verbose=False,
+        )
+        segment_df = res_df[res_df["segment"] == segment]
+        assert (segment_df["n_users"] == rows.sum()).all()
+        np.testing.assert_allclose(segment_df["value"], expected_df["value"])
+
+    recs_df = RecEvaluator.recs_from_scores(scores, cutoff=5, user_ids=user_ids)
+    recs_res_df = evaluator.eval_segments_from_recs(
+        recs_df, holdout_data=holdout_df, segments=segments.to_dict(), verbose=False
+    )
+    pd.testing.assert_frame_equal(recs_res_df, res_df)
+
+
+def test_receval_eval_segments_verbose(dummy_userids_scores_holdout, capsys):
+    user_ids, scores, holdout_df = dummy_userids_scores_holdout
+    evaluator = RecEvaluator(metrics=["recall"], cutoffs=[2])
+    res_df = evaluator.eval_segments_from_scores(
+        scores=scores,
+        user_ids=user_ids,
+        holdout_data=holdout_df,
+        segments={0: "a", 1: "a", 2: "b"},
+        decimal_precision=2,
+    )
+    # one line for each segment, metric and cutoff
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == [
+        f"{row.segment} - recall@2: {round(row.value, 2)}"
+        for row in res_df.itertuples()
+    ]
+    assert [line.split(" - ")[0] for line in lines] == ["all", "a", "b"]
+
+
+def test_receval_bootstrap_ci(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=["recall", "ndcg"], cutoffs=[1, 5])
+    user_df = evaluator.user_metrics_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df
+    )
+    ci_df = evaluator.bootstrap_ci(user_df, n_resamples=200, verbose=False)
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    pd.testing.assert_frame_equal(
+        ci_df[["metric", "cutoff", "value"]], expected_df, rtol=1e-6
+    )
+    assert (ci_df["ci_low"] <= ci_df["value"]).all()
+    assert (ci_df["value"] <= ci_df["ci_high"]).all()
+
+
+def test_receval_bootstrap_ci_verbose(random_scores_holdout, capsys):
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=["recall", "ndcg"], cutoffs=[5])
+    user_df = evaluator.user_metrics_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df
+    )
+    capsys.readouterr()
+    ci_df = evaluator.bootstrap_ci(user_df, n_resamples=50, decimal_precision=3)
+    # the value and its interval, one line for each metric and cutoff
+    assert capsys.readouterr().out.splitlines() == [
+        f"{row.metric}@{row.cutoff}: {round(row.value, 3)} "
+        f"[{round(row.ci_low, 3)}, {round(row.ci_high, 3)}]"
+        for row in ci_df.itertuples()
+    ]
+
+
+def test_receval_compare(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=["recall", "ndcg"], cutoffs=[1, 5])
+    holdout = HoldoutIndex.from_frame(holdout_df)
+    # a model scoring the holdout items first is much better
+    better_scores = scores.copy()
+    better_scores[
+        holdout.users.encode(holdout_df["user_id"]), holdout_df["item_id"]
+    ] += 1
+
+    res_df = evaluator.compare(
+        scores,
+        better_scores,
+        holdout_data=holdout,
+        user_ids=user_ids,
+        n_resamples=200,
+        verbose=False,
+    )
+    for model, model_scores in [("a", scores), ("b", better_scores)]:
+        expected_df = evaluator.eval_from_scores(
+            scores=model_scores,
+            user_ids=user_ids,
+            holdout_data=holdout_df,
+            verbose=False,
+        )
+        np.testing.assert_allclose(res_df[f"value_{model}"], expected_df["value"])
+    np.testing.assert_allclose(res_df["delta"], res_df["value_b"] - res_df["value_a"])
+    assert (res_df[["ttest_pvalue", "wilcoxon_pvalue", "bootstrap_pvalue"]] < 0.01).all(
+        axis=None
+    )
+
+    # recommendations are aligned to the score rows of the other model
+    recs_df = RecEvaluator.recs_from_scores(scores, cutoff=5, user_ids=user_ids)
+    recs_res_df = evaluator.compare(
+        recs_df,
+        better_scores[::-1],
+        holdout_data=holdout_df,
+        user_ids=user_ids[::-1],
+        n_resamples=200,
+        verbose=False,
+    )
+    pd.testing.assert_frame_equal(recs_res_df, res_df)
+
+
+def test_receval_compare_verbose(random_scores_holdout, capsys):
+    user_ids, scores, holdout_df = random_scores_holdout
+    evaluator = RecEvaluator(metrics=["recall"], cutoffs=[1, 5])
+    res_df = evaluator.compare(
+        scores,
+        scores[:, ::-1],
+        holdout_data=holdout_df,
+        user_ids=user_ids,
+        n_resamples=50,
+        decimal_precision=3,
+    )
+    # both values, their difference and the t-test p-value, one line for each metric and cutoff
+    assert capsys.readouterr().out.splitlines() == [
+        f"recall@{row.cutoff}: {round(row.value_a, 3)} -> {round(row.value_b, 3)} "
+        f"(delta: {round(row.delta, 3)}, t-test p: {round(row.ttest_pvalue, 3)})"
+        for row in res_df.itertuples()
+    ]
+
+
+def test_receval_beyond_accuracy(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    n_items = scores.shape[1]
+    rng = np.random.default_rng(0)
+    metric_list = ["recall", "coverage", "gini", "novelty", "arp", "ild"]
+    metric_params = {
+        "coverage": {"n_items": n_items},
+        "gini": {"n_items": n_items},
+        "novelty": {"item_popularity": rng.integers(0, 50, size=n_items)},
+        "arp": {"item_popularity": rng.integers(0, 50, size=n_items)},
+        "ild": {"item_embeddings": rng.random((n_items, 8))},
+    }
+    evaluator = RecEvaluator(
+        metrics=metric_list,
+        cutoffs=[1, 5],
+        backend="numpy",
+        metric_params=metric_params,
+    )
+    res_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    top_items = np.argsort(-scores, axis=1, kind="stable")[:, :5]
+    coverage = res_df[(res_df["metric"] == "coverage") & (res_df["cutoff"] == 5)]
+    assert coverage["value"].item() == len(np.unique(top_items)) / n_items
+
+    # every evaluation path adds the same partial results
+    recs_df = RecEvaluator.recs_from_scores(scores, cutoff=5, user_ids=user_ids)
+    pd.testing.assert_frame_equal(
+        evaluator.eval_from_recs(recs_df, holdout_data=holdout_df, verbose=False),
+        res_df,
+    )
+    pd.testing.assert_frame_equal(
+        evaluator.eval_from_score_batches(
+            batches=[(user_ids[:15], scores[:15]), (user_ids[15:], scores[15:])],
+            holdout_data=holdout_df,
+            verbose=False,
+        ),
+        res_df,
+    )
+    sharded = RecEvaluator(
+        metrics=metric_list, cutoffs=[1, 5], n_jobs=2, metric_params=metric_params
+    )
+    for eval_df in [
+        sharded.eval_from_scores(
+            scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+        ),
+        sharded.eval_from_recs(recs_df, holdout_data=holdout_df, verbose=False),
+    ]:
+        pd.testing.assert_frame_equal(eval_df, res_df)
+
+    segments = pd.Series(user_ids % 2, index=user_ids)
+    segments_df = evaluator.eval_segments_from_recs(
+        recs_df, holdout_data=holdout_df, segments=segments, verbose=False
+    )
+    even_df = evaluator.eval_from_recs(
+        recs_df[recs_df["user_id"] % 2 == 0],
+        holdout_data=holdout_df[holdout_df["user_id"] % 2 == 0],
+        verbose=False,
+    )
+    np.testing.assert_allclose(
+        segments_df[segments_df["segment"] == 0]["value"], even_df["value"]
+    )
+
+    # catalogue metrics have no value for each user
+    with pytest.raises(ValueError):
+        _ = evaluator.user_metrics_from_recs(recs_df, holdout_data=holdout_df)
+
+
+def test_receval_beyond_accuracy_invalid(random_recs_gt, make_hit_matrix):
+    # side information is required
+    for metric in ["coverage", "novelty", "ild"]:
+        with pytest.raises(ValueError):
+            _ = RecEvaluator(metrics=[metric], cutoffs=[5], backend="numpy")
+    # item ids beyond the catalogue size
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    evaluator = RecEvaluator(
+        metrics=["coverage"],
+        cutoffs=[5],
+        backend="numpy",
+        metric_params={"coverage": {"n_items": 5}},
+    )
+    with pytest.raises(ValueError, match="lower than n_items"):
+        evaluator.eval_from_recs(recs_df, holdout_data=gt_df, verbose=False)
+    # hits computed on item codes do not carry the item ids
+    hit_matrix = make_hit_matrix(gt_df, recs_df, max_cutoff)
+    with pytest.raises(ValueError, match="recommended item ids"):
+        evaluator.metrics_objs[0].partial_from_hits(hit_matrix, 5)
+    # the pandas backend only sees the hits
+    with pytest.raises(ValueError):
+        _ = RecEvaluator(
+            metrics=["coverage"],
+            cutoffs=[5],
+            metric_params={"coverage": {"n_items": 5}},
+        )
+
+
+def test_receval_rank_metrics(random_recs_gt):
+    metric_list = ["mrr", "hit_rate", "r_precision", "auc"]
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    cutoff_list = [1, 5, max_cutoff]
+    res_dfs = [
+        RecEvaluator(
+            metrics=metric_list,
+            cutoffs=cutoff_list,
+            backend=backend,
+            metric_params={"auc": {"n_items": 30}},
+        ).eval_from_recs(recs_df=recs_df, holdout_data=gt_df, verbose=False)
+        for backend in ["pandas", "numpy"]
+    ]
+    pd.testing.assert_frame_equal(res_dfs[1], res_dfs[0])
+    assert len(res_dfs[0]) == len(metric_list) * len(cutoff_list)
+    # the metrics of the first hit and of the hits ranked above do not depend on the order of the rows
+    evaluators = [
+        RecEvaluator(
+            metrics=metric_list + ["map"],
+            cutoffs=cutoff_list,
+            backend=backend,
+            metric_params={"auc": {"n_items": 30}},
+        )
+        for backend in ["pandas", "numpy"]
+    ]
+    expected_df = evaluators[1].eval_from_recs(
+        recs_df, holdout_data=gt_df, verbose=False
+    )
+    shuffled_df = recs_df.sample(frac=1, random_state=0)
+    for evaluator in evaluators:
+        res_df = evaluator.eval_from_recs(
+            shuffled_df, holdout_data=gt_df, verbose=False
+        )
+        pd.testing.assert_frame_equal(res_df, expected_df)
+    # the AUC needs the number of items the users are ranked against
+    with pytest.raises(ValueError, match="n_items"):
+        _ = RecEvaluator(metrics=["auc"], cutoffs=cutoff_list)
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_receval_csr_holdout(random_scores_holdout, make_csr, backend):
+    user_ids, scores, holdout_df = random_scores_holdout
+    mask = np.zeros(scores.shape, dtype=np.bool_)
+    mask[holdout_df["user_id"] - user_ids[0], holdout_df["item_id"]] = True
+    holdout_csr = make_csr(mask)
+    evaluator = RecEvaluator(
+        metrics=["recall", "ndcg"], cutoffs=[1, 5], backend=backend
+    )
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    # rows of the holdout matrix are the user ids
+    res_df = evaluator.eval_from_scores(
+        scores=scores[::-1],
+        user_ids=np.arange(len(user_ids))[::-1],
+        holdout_data=holdout_csr,
+        verbose=False,
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+    recs_df = RecEvaluator.recs_from_scores(
+        scores, cutoff=5, user_ids=np.arange(len(user_ids))
+    )
+    res_df = evaluator.eval_from_recs(recs_df, holdout_data=holdout_csr, verbose=False)
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+
+def test_receval_compact_dtypes(random_scores_holdout):
+    user_ids, scores, holdout_df = random_scores_holdout
+    recs_df = RecEvaluator.recs_from_scores(scores, cutoff=5, user_ids=user_ids)
+    assert recs_df["item_id"].dtype == np.int32
+    assert recs_df["rank"].dtype == np.int16
+    np.testing.assert_array_equal(
+        recs_df["rank"], np.tile(np.arange(1, 6), len(user_ids))
+    )
+
+    # string user ids are encoded for the join and give the same results
+    evaluator = RecEvaluator(metrics=["recall", "ndcg", "map"], cutoffs=[1, 5])
+    expected_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=user_ids, holdout_data=holdout_df, verbose=False
+    )
+    str_ids = np.array([f"user_{user_id}" for user_id in user_ids], dtype=object)
+    str_holdout_df = holdout_df.assign(
+        user_id=holdout_df["user_id"].map(lambda user_id: f"user_{user_id}")
+    )
+    res_df = evaluator.eval_from_scores(
+        scores=scores, user_ids=str_ids, holdout_data=str_holdout_df, verbose=False
+    )
+    pd.testing.assert_frame_equal(res_df, expected_df)
+
+    # recommendations without the rank column are ranked in the order of their rows
+    unranked_df = recs_df.drop(columns="rank")
+    res_df = evaluator.eval_from_recs(
+        unranked_df, holdout_data=holdout_df, verbose=False
+    )
+    assert unranked_df["rank"].dtype == np.int16
+    pd.testing.assert_frame_equal(res_df, expected_df)
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recval.constants import DEFAULT_USER_COL
+from recval.holdout import HoldoutIndex
+
+
+def test_holdout_index_from_frame(random_scores_holdout):
+    user_ids, _, holdout_df = random_scores_holdout
+    holdout = HoldoutIndex.from_frame(holdout_df.sample(frac=1, random_state=0))
+    np.testing.assert_array_equal(holdout.user_ids, user_ids)
+    np.testing.assert_array_equal(
+        holdout.actual, holdout_df.groupby("user_id").size().to_numpy()
+    )
+    np.testing.assert_array_equal(holdout.indptr[1:], np.cumsum(holdout.actual))
+    for row, user_id in enumerate(user_ids):
+        items = holdout.item_indices[holdout.indptr[row] : holdout.indptr[row + 1]]
+        expected = holdout_df.loc[holdout_df["user_id"] == user_id, "item_id"]
+        np.testing.assert_array_equal(items, np.sort(expected))
+    pd.testing.assert_frame_equal(
+        holdout.to_frame(),
+        holdout_df.sort_values(["user_id", "item_id"], ignore_index=True),
+    )
+
+
+def test_holdout_index_from_csr(random_scores_holdout, make_csr):
+    user_ids, scores, holdout_df = random_scores_holdout
+    expected_df = holdout_df.sort_values(["user_id", "item_id"], ignore_index=True)
+    mask = np.zeros(scores.shape, dtype=np.bool_)
+    mask[holdout_df["user_id"] - user_ids[0], holdout_df["item_id"]] = True
+    # an empty row is not a holdout user
+    mask = np.vstack([mask, np.zeros((1, mask.shape[1]), dtype=np.bool_)])
+    all_ids = np.append(user_ids, 0)
+    for shuffle in [False, True]:
+        holdout = HoldoutIndex.from_csr(make_csr(mask, shuffle=shuffle), all_ids)
+        np.testing.assert_array_equal(holdout.user_ids, user_ids)
+        pd.testing.assert_frame_equal(holdout.to_frame(), expected_df)
+
+    # duplicated items and unsorted user ids
+    csr = make_csr(mask)
+    csr.indptr = csr.indptr * 2
+    csr.indices = np.repeat(csr.indices, 2)
+    row_ids = all_ids[::-1]
+    holdout = HoldoutIndex.from_csr(csr, row_ids)
+    relabeled_df = holdout_df.assign(
+        user_id=row_ids[holdout_df["user_id"] - user_ids[0]]
+    )
+    pd.testing.assert_frame_equal(
+        holdout.to_frame(),
+        relabeled_df.sort_values(["user_id", "item_id"], ignore_index=True),
+    )
+    with pytest.raises(ValueError):
+        HoldoutIndex.from_csr(csr, user_ids)
+
+
+def test_holdout_index_user_rows(random_scores_holdout):
+    user_ids, _, holdout_df = random_scores_holdout
+    holdout = HoldoutIndex.from_frame(holdout_df)
+    np.testing.assert_array_equal(
+        holdout.user_rows(user_ids[::-1]), np.arange(len(user_ids))[::-1]
+    )
+    np.testing.assert_array_equal(
+        holdout.user_rows(user_ids[[3, 1]], all_users=False), [3, 1]
+    )
+    with pytest.raises(ValueError):
+        holdout.user_rows(user_ids[:10])
+    # every user is there, one of them twice
+    with pytest.raises(ValueError):
+        holdout.user_rows(np.append(user_ids, user_ids[0]))
+    with pytest.raises(ValueError):
+        holdout.user_rows(np.array([0]), all_users=False)
+
+
+def test_holdout_index_hit_matrix(random_recs_gt):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    holdout = HoldoutIndex.from_frame(gt_df)
+    top_items = holdout.encode_recs(recs_df, max_cutoff=max_cutoff)
+    hit_matrix = holdout.hit_matrix(
+        top_items, rows=np.arange(holdout.n_users), item_codes=True
+    )
+    # hits found by joining the dataframes
+    joined = recs_df.merge(gt_df.assign(hit=True), how="left")
+    expected_hits = (
+        joined.sort_values([DEFAULT_USER_COL, "rank"])["hit"]
+        .fillna(False)
+        .to_numpy(dtype=np.bool_)
+        .reshape(-1, max_cutoff)
+    )
+    np.testing.assert_array_equal(
+        hit_matrix.user_ids, np.unique(gt_df[DEFAULT_USER_COL])
+    )
+    np.testing.assert_array_equal(hit_matrix.hits, expected_hits)
+    np.testing.assert_array_equal(
+        hit_matrix.actual, gt_df.groupby(DEFAULT_USER_COL).size().to_numpy()
+    )
+    # the ideal DCG cache is shared only when the hits cover every user in order
+    assert hit_matrix.idcg is holdout.idcg
+    subset = holdout.hit_matrix(
+        top_items[[2, 0]], rows=np.array([2, 0]), item_codes=True
+    )
+    np.testing.assert_array_equal(subset.hits, expected_hits[[2, 0]])
+    assert subset.idcg is not holdout.idcg
+
+
+def test_holdout_index_encode_rec_batches(random_recs_gt):
+    recs_df, gt_df, max_cutoff = random_recs_gt
+    holdout = HoldoutIndex.from_frame(gt_df)
+    expected = holdout.encode_recs(recs_df, max_cutoff=max_cutoff)
+    # shuffled batches, the recommendations of a user span several of them
+    shuffled = recs_df.sample(frac=1, random_state=2022)
+    batches = [
+        shuffled.iloc[start : start + 64] for start in range(0, len(recs_df), 64)
+    ]
+    np.testing.assert_array_equal(
+        holdout.encode_rec_batches(batches, max_cutoff=max_cutoff), expected
+    )
+    with pytest.raises(ValueError):
+        holdout.encode_rec_batches(
+            [batch[batch[DEFAULT_USER_COL] != 0] for batch in batches],
+            max_cutoff=max_cutoff,
+        )
+
+
+def test_holdout_index_string_ids():
+    gt_df = pd.DataFrame(
+        {"user_id": ["u2", "u1", "u2", "u3"], "item_id": ["b", "a", "c", "a"]}
+    )
+    holdout = HoldoutIndex.from_frame(gt_df)
+    np.testing.assert_array_equal(holdout.user_ids, ["u1", "u2", "u3"])
+    np.testing.assert_array_equal(holdout.items.encode(["c", "a"]), [2, 0])
+    recs_df = pd.DataFrame(
+        {
+            "user_id": ["u3", "u1", "u2", "u2"],
+            "item_id": ["a", "z", "c", "a"],
+            "rank": [1, 1, 1, 2],
+        }
+    )
+    # items which are not holdout items are encoded as -1 like the missing ranks
+    top_items = holdout.encode_recs(recs_df, max_cutoff=2)
+    np.testing.assert_array_equal(top_items, [[-1, -1], [2, 0], [0, -1]])
+    rows = holdout.user_rows(np.array(["u3", "u1"]), all_users=False)
+    hit_matrix = holdout.hit_matrix(top_items[rows], rows=rows, item_codes=True)
+    np.testing.assert_array_equal(hit_matrix.user_ids, ["u3", "u1"])
+    np.testing.assert_array_equal(hit_matrix.hits, [[True, False], [False, False]])
+    with pytest.raises(ValueError):
+        holdout.encode_recs(
+            pd.concat([recs_df, recs_df.assign(user_id="u4")]), max_cutoff=2
+        )
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recval.evaluator import RecEvaluator
+from recval.online import OnlineRecEvaluator
+
+
+def test_online_evaluator(recs_gt_batches):
+    batches, max_cutoff = recs_gt_batches
+    metric_list = ["recall", "ndcg", "mrr"]
+    cutoff_list = [1, 5, max_cutoff]
+    evaluator = RecEvaluator(metrics=metric_list, cutoffs=cutoff_list)
+    online = OnlineRecEvaluator(metrics=metric_list, cutoffs=cutoff_list)
+    with pytest.raises(ValueError):
+        online.results()
+
+    for n_batches, (recs_df, gt_df) in enumerate(batches, start=1):
+        # the rank is inferred from the order of the recommendations
+        assert online.update(recs_df.drop(columns="rank"), gt_df) == 10
+        expected_df = evaluator.eval_from_recs(
+            pd.concat([recs for recs, _ in batches[:n_batches]]),
+            holdout_data=pd.concat([gt for _, gt in batches[:n_batches]]),
+            verbose=False,
+        )
+        pd.testing.assert_frame_equal(online.results(verbose=False), expected_df)
+    assert online.n_batches == 5
+
+    online.reset()
+    assert online.n_users == 0
+
+
+def test_online_evaluator_partial_users(recs_gt_batches):
+    batches, max_cutoff = recs_gt_batches
+    recs_df, gt_df = batches[0]
+    online = OnlineRecEvaluator(metrics=["recall"], cutoffs=[max_cutoff], horizon=1)
+    # only users with both recommendations and interactions are evaluated
+    assert online.update(recs_df, gt_df[gt_df["user_id"] < 4]) == 4
+    # recommendations not followed by interactions within the horizon expire
+    assert online.n_pending == 0
+    assert online.update(recs_df[recs_df["user_id"] >= 20], gt_df) == 0
+    assert online.n_users == 4
+
+
+def test_online_evaluator_late_interactions(recs_gt_batches):
+    batches, max_cutoff = recs_gt_batches
+    metric_list = ["recall", "ndcg"]
+    evaluator = RecEvaluator(metrics=metric_list, cutoffs=[1, max_cutoff])
+    online = OnlineRecEvaluator(metrics=metric_list, cutoffs=[1, max_cutoff])
+    recs = pd.concat([recs for recs, _ in batches])
+    gts = pd.concat([gt for _, gt in batches])
+    no_recs = recs.iloc[:0]
+    no_interactions = gts.iloc[:0]
+
+    # every recommendation is served before its interactions arrive
+    assert online.update(recs[recs["user_id"] < 30], no_interactions) == 0
+    assert online.n_pending == 30
+    assert online.update(recs[recs["user_id"] >= 30], gts[gts["user_id"] < 20]) == 20
+    assert online.update(no_recs, gts[gts["user_id"] >= 20]) == 30
+    assert online.n_pending == 0
+    expected_df = evaluator.eval_from_recs(recs, holdout_data=gts, verbose=False)
+    pd.testing.assert_frame_equal(online.results(verbose=False), expected_df)
+
+    # newer recommendations replace the pending ones of the same user
+    online.reset()
+    recs_df, gt_df = batches[0]
+    reranked = recs_df.assign(rank=max_cutoff + 1 - recs_df["rank"])
+    online.update(recs_df, no_interactions)
+    online.update(reranked, no_interactions)
+    assert online.n_pending == 10
+    online.update(no_recs, gt_df)
+    expected_df = evaluator.eval_from_recs(reranked, holdout_data=gt_df, verbose=False)
+    pd.testing.assert_frame_equal(online.results(verbose=False), expected_df)
+
+
+def test_online_evaluator_horizon(recs_gt_batches):
+    batches, max_cutoff = recs_gt_batches
+    (recs_df, gt_df), (other_recs, _) = batches[:2]
+    online = OnlineRecEvaluator(metrics=["recall"], cutoffs=[max_cutoff], horizon=2)
+    online.update(recs_df, gt_df.iloc[:0])
+    online.update(other_recs, gt_df[gt_df["user_id"] < 5])
+    # the recommendations of the first micro-batch expire after the second one
+    assert online.n_pending == 10
+    assert online.update(other_recs.iloc[:0], gt_df) == 0
+    assert online.n_users == 5
+
+
+def test_online_evaluator_window(recs_gt_batches):
+    batches, max_cutoff = recs_gt_batches
+    evaluator = RecEvaluator(metrics=["recall", "ndcg"], cutoffs=[max_cutoff])
+    online = OnlineRecEvaluator(
+        metrics=["recall", "ndcg"], cutoffs=[max_cutoff], window=2
+    )
+    for n_batches, (recs_df, gt_df) in enumerate(batches, start=1):
+        online.update(recs_df, gt_df)
+        window = batches[max(n_batches - 2, 0) : n_batches]
+        expected_df = evaluator.eval_from_recs(
+            pd.concat([recs for recs, _ in window]),
+            holdout_data=pd.concat([gt for _, gt in window]),
+            verbose=False,
+        )
+        pd.testing.assert_frame_equal(online.results(verbose=False), expected_df)
+
+
+def test_online_evaluator_decay(recs_gt_batches):
+    batches, max_cutoff = recs_gt_batches
+    evaluator = RecEvaluator(metrics=["recall"], cutoffs=[max_cutoff])
+    online = OnlineRecEvaluator(metrics=["recall"], cutoffs=[max_cutoff], decay=0.5)
+    for recs_df, gt_df in batches:
+        online.update(recs_df, gt_df)
+
+    user_values = [
+        evaluator.user_metrics_from_recs(recs_df, holdout_data=gt_df).to_numpy()
+        for recs_df, gt_df in batches
+    ]
+    weights = 0.5 ** np.arange(len(batches))[::-1]
+    expected = sum(w * values.sum() for w, values in zip(weights, user_values)) / sum(
+        w * len(values) for w, values in zip(weights, user_values)
+    )
+    assert online.results(verbose=False)["value"].item() == pytest.approx(expected)
+    assert online.n_users == pytest.approx(10 * weights.sum())
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"window": 0},
+        {"decay": 0.0},
+        {"decay": 1.5},
+        {"window": 2, "decay": 0.5},
+        {"horizon": 0},
+    ],
+)
+def test_online_evaluator_invalid(params):
+    with pytest.raises(ValueError):
+        _ = OnlineRecEvaluator(metrics=["recall"], cutoffs=[5], **params)
@@ -0,0 +1,109 @@
+from contextlib import ExitStack
+from pathlib import Path
+
+import numba
+import numpy as np
+import pytest
+
+from recval.evaluator import RecEvaluator
+from recval.holdout import HoldoutIndex
+from recval.parallel import (
+    _SHARD_STATE,
+    MappedArray,
+    SharedArray,
+    _init_shard_worker,
+    _shard_metric_sums,
+    resolve_n_jobs,
+)
+from recval.utils import get_topk
+
+
+@pytest.fixture()
+def shard_worker():
+    # the worker functions run in this process, its state and numba threads are restored afterwards
+    n_threads = numba.get_num_threads()
+    yield
+    _SHARD_STATE.clear()
+    numba.set_num_threads(n_threads)
+
+
+def test_shared_array():
+    array = np.arange(12, dtype=np.int32).reshape(3, 4)
+    with ExitStack() as stack:
+        handle, view = SharedArray.create(array, stack)
+        attached, block = handle.attach()
+        np.testing.assert_array_equal(attached, array)
+        view[0, 0] = -1
+        assert attached[0, 0] == -1
+        del attached, view
+        block.close()
+
+        spilled = MappedArray.spill(np.asfortranarray(array), stack)
+        assert spilled.order == "F"
+        mapped, no_block = spilled.attach()
+        assert no_block is None
+        np.testing.assert_array_equal(mapped, array)
+        del mapped
+    # the temporary file is removed with the stack
+    assert not Path(spilled.filename).exists()
+
+
+def test_mapped_array_views(tmp_path):
+    path = tmp_path / "array.npy"
+    np.save(path, np.arange(60, dtype=np.float32).reshape(10, 6))
+    mapped = np.load(path, mmap_mode="r")
+    for view in [mapped, mapped[3:], mapped[4:7]]:
+        assert MappedArray.remappable(view)
+        attached, _ = MappedArray.from_memmap(view).attach()
+        np.testing.assert_array_equal(attached, view)
+        del attached
+    # a column slice is not contiguous in the file
+    assert not MappedArray.remappable(mapped[:, 1:3])
+    with pytest.raises(ValueError):
+        MappedArray.from_memmap(mapped[:, 1:3])
+    del mapped
+
+
+def test_resolve_n_jobs():
+    assert resolve_n_jobs(-1) >= 1
+    assert resolve_n_jobs(3) == 3
+    with pytest.raises(ValueError):
+        resolve_n_jobs(-2)
+
+
+@pytest.mark.usefixtures("shard_worker")
+@pytest.mark.parametrize("from_scores", [True, False])
+def test_shard_metric_sums(random_scores_holdout, make_csr, from_scores):
+    user_ids, scores, holdout_df = random_scores_holdout
+    holdout = HoldoutIndex.from_frame(holdout_df)
+    evaluator = RecEvaluator(["recall", "ndcg", "map"], [1, 5], backend="numpy")
+    exclude_mask = np.random.default_rng(0).random(scores.shape) < 0.2
+    exclude = make_csr(exclude_mask)
+    top_items, _ = get_topk(scores, k=evaluator.max_cutoff, exclude=exclude)
+    expected = evaluator.metric_sums(
+        holdout.hit_matrix(top_items, rows=np.arange(len(user_ids)))
+    )
+
+    arrays = {"indptr": holdout.indptr, "indices": holdout.item_indices}
+    if from_scores:
+        arrays.update(
+            exclude_indptr=exclude.indptr.astype(np.int64),
+            exclude_indices=exclude.indices.astype(np.int64),
+        )
+    else:
+        arrays["top_items"] = top_items
+    with ExitStack() as stack:
+        handles: dict[str, SharedArray | MappedArray] = {
+            key: SharedArray.create(array, stack)[0] for key, array in arrays.items()
+        }
+        if from_scores:
+            handles["scores"] = MappedArray.spill(scores, stack)
+        _init_shard_worker(evaluator, handles, False)
+        assert numba.get_num_threads() == 1
+        # shards cover contiguous rows, their sums add up to the sums over every user
+        shards = [
+            _shard_metric_sums(start, stop) for start, stop in [(0, 13), (13, 40)]
+        ]
+        _SHARD_STATE.clear()
+    np.testing.assert_allclose(sum(sums for sums, _ in shards), expected)
+    assert any(any_hit for _, any_hit in shards)
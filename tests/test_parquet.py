@@ -0,0 +1,112 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recval.constants import DEFAULT_USER_COL
+from recval.evaluator import RecEvaluator
+from recval.parquet import (
+    read_holdout_parquet,
+    read_parquet_batches,
+    read_recs_parquet,
+    write_parquet,
+)
+
+
+def test_read_parquet(recs_gt_parquet):
+    recs_df, gt_df, _, recs_dir, holdout_path = recs_gt_parquet
+    batches = list(read_recs_parquet(recs_dir, batch_size=16))
+    assert all(len(batch) <= 16 for batch in batches)
+    assert all(list(batch.columns) == list(recs_df.columns) for batch in batches)
+    read = pd.concat(batches).sort_values([DEFAULT_USER_COL, "rank"])
+    np.testing.assert_array_equal(read.to_numpy(), recs_df.to_numpy())
+    # ranks beyond the cutoff are filtered while reading
+    top = pd.concat(read_recs_parquet(recs_dir, max_cutoff=3))
+    assert len(top) == 3 * recs_df[DEFAULT_USER_COL].nunique()
+    buckets = pd.concat(read_parquet_batches(recs_dir, columns=["bucket"]))
+    assert set(buckets["bucket"]) == {0, 1, 2}
+
+    holdout = read_holdout_parquet(holdout_path)
+    assert holdout.n_users == gt_df[DEFAULT_USER_COL].nunique()
+    assert len(holdout.indices) == len(gt_df)
+    # a list of files
+    files = sorted(recs_dir.glob("*/*.parquet"))
+    listed = pd.concat(read_recs_parquet([str(path) for path in files]))
+    assert len(listed) == len(recs_df)
+
+
+def test_parquet_requires_pyarrow(monkeypatch, tmp_path):
+    import_module = importlib.import_module
+
+    def no_pyarrow(name, package=None):
+        if name.startswith("pyarrow"):
+            raise ImportError(f"No module named {name}")
+        return import_module(name, package)
+
+    monkeypatch.setattr(importlib, "import_module", no_pyarrow)
+    with pytest.raises(ImportError, match=r"recval\[parquet\]"):
+        read_holdout_parquet(tmp_path / "holdout.parquet")
+
+
+@pytest.mark.parametrize(
+    "metrics, backend, n_jobs",
+    [
+        (["precision", "recall", "ndcg"], "pandas", 1),
+        (["recall", "ndcg", "coverage"], "numpy", 1),
+        (["recall", "ndcg"], "numpy", 2),
+    ],
+)
+def test_eval_from_recs_parquet(recs_gt_parquet, metrics, backend, n_jobs):
+    recs_df, gt_df, _, recs_dir, holdout_path = recs_gt_parquet
+    evaluator = RecEvaluator(
+        metrics,
+        [3, 10],
+        backend=backend,
+        n_jobs=n_jobs,
+        metric_params={"coverage": {"n_items": 30}},
+    )
+    expected = evaluator.eval_from_recs(recs_df.copy(), gt_df, verbose=False)
+    results = evaluator.eval_from_recs_parquet(
+        recs_dir, read_holdout_parquet(holdout_path), batch_size=32, verbose=False
+    )
+    pd.testing.assert_frame_equal(results, expected)
+
+
+def test_user_metrics_parquet(recs_gt_parquet, tmp_path):
+    recs_df, gt_df, _, recs_dir, _ = recs_gt_parquet
+    evaluator = RecEvaluator(["recall", "ndcg"], [3, 10], backend="numpy", profile=True)
+    expected = evaluator.user_metrics_from_recs(recs_df.copy(), gt_df)
+    user_metrics = evaluator.user_metrics_from_recs_parquet(recs_dir, gt_df)
+    pd.testing.assert_frame_equal(user_metrics, expected)
+    profile = user_metrics.attrs["profile"]
+    assert profile["user_metrics_from_recs_parquet/encode_recs"].rows == len(recs_df)
+
+    # results round trip, with the user id index
+    path = tmp_path / "user_metrics.parquet"
+    write_parquet(user_metrics, path)
+    pd.testing.assert_frame_equal(pd.read_parquet(path), expected)
+    results = evaluator.eval_from_recs_parquet(recs_dir, gt_df, verbose=False)
+    write_parquet(results, path)
+    pd.testing.assert_frame_equal(pd.read_parquet(path), results)
+
+
+def test_eval_from_recs_parquet_missing_users(recs_gt_parquet):
+    _, gt_df, _, recs_dir, _ = recs_gt_parquet
+    evaluator = RecEvaluator(["recall"], [3], backend="numpy")
+    missing = gt_df.assign(**{DEFAULT_USER_COL: gt_df[DEFAULT_USER_COL] + 1000})
+    with pytest.raises(ValueError):
+        evaluator.eval_from_recs_parquet(
+            recs_dir, pd.concat([gt_df, missing]), verbose=False
+        )
+
+
+def test_eval_from_recs_parquet_no_hits(no_hit_recs_gt, tmp_path):
+    recs_df, gt_df = no_hit_recs_gt
+    recs_path = tmp_path / "recs.parquet"
+    recs_df.to_parquet(recs_path)
+    evaluator = RecEvaluator(["recall"], [3], backend="numpy")
+    with pytest.raises(ValueError, match="No hits"):
+        evaluator.eval_from_recs_parquet(recs_path, gt_df, verbose=False)
+    with pytest.raises(ValueError, match="No hits"):
+        evaluator.user_metrics_from_recs_parquet(recs_path, gt_df)
@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pytest
+
+from recval.evaluator import RecEvaluator
+from recval.profiling import (
+    StageEvent,
+    active_profile,
+    add_rows,
+    memory_usage,
+    profiled,
+    reset_peak_rss,
+    stage,
+)
+
+
+def test_profiled_stages():
+    events: list[StageEvent] = []
+    with profiled(hooks=[events.append]) as profile:
+        assert active_profile() is profile
+        with stage("outer", rows=10):
+            for _ in range(3):
+                with stage("inner"):
+                    add_rows(5)
+        with stage("last"):
+            pass
+    assert active_profile() is None
+
+    assert [path for path, _ in profile.stages()] == ["outer", "outer/inner", "last"]
+    outer, inner = profile["outer"], profile["outer/inner"]
+    assert (outer.calls, outer.rows) == (1, 10)
+    assert (inner.calls, inner.rows) == (3, 15)
+    assert outer.wall_time >= inner.wall_time
+    assert outer.self_time == pytest.approx(outer.wall_time - inner.wall_time)
+    assert profile.wall_time >= outer.wall_time + profile["last"].wall_time
+    with pytest.raises(KeyError):
+        _ = profile["outer/missing"]
+
+    # one event for each call, in the order the calls end
+    assert [event.path for event in events] == [
+        "outer/inner",
+        "outer/inner",
+        "outer/inner",
+        "outer",
+        "last",
+    ]
+    assert [event.rows for event in events] == [5, 5, 5, 10, 0]
+
+    frame = profile.to_frame()
+    assert list(frame.index) == ["outer", "outer/inner", "last"]
+    assert frame.loc["outer/inner", "calls"] == 3
+    assert (frame["share"] <= 1).all()
+
+
+def test_stage_without_profile():
+    with stage("unprofiled", rows=1):
+        add_rows(1)
+    assert active_profile() is None
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/clear_refs"), reason="peak RSS can not be reset"
+)
+def test_profiled_memory():
+    with profiled() as profile:
+        with stage("allocate"):
+            with stage("small"):
+                small = np.ones(2**10)
+            # touch every page of 64MiB
+            large = np.ones(2**23)
+        with stage("after"):
+            pass
+    del small, large
+    assert profile["allocate"].rss_increase_mb >= 60
+    assert profile["allocate/small"].rss_increase_mb < 10
+    assert profile["after"].rss_increase_mb < 10
+    assert profile.root.rss_increase_mb >= 60
+
+    with profiled(track_memory=False) as profile:
+        with stage("allocate"):
+            large = np.ones(2**23)
+    assert profile["allocate"].rss_increase_mb == 0
+
+
+def test_memory_usage_without_proc(monkeypatch):
+    def no_proc(*_, **__):
+        raise OSError("/proc is not available")
+
+    # both fall back to the lifetime peak RSS of the process
+    monkeypatch.setattr("recval.profiling.open", no_proc, raising=False)
+    reset_peak_rss()
+    rss, peak_rss = memory_usage()
+    assert rss == peak_rss > 0
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_evaluator_profile(dummy_userids_scores_holdout, backend):
+    user_ids, scores, holdout_df = dummy_userids_scores_holdout
+    events: list[StageEvent] = []
+    evaluator = RecEvaluator(
+        ["recall", "ndcg"],
+        [2, 3],
+        backend=backend,
+        profile=True,
+        profile_hooks=[events.append],
+    )
+    results = evaluator.eval_from_scores(
+        scores, holdout_df, user_ids=user_ids, verbose=False
+    )
+    profile = results.attrs["profile"]
+    stages = dict(profile.stages())
+    assert stages["eval_from_scores"].calls == 1
+    assert stages["eval_from_scores/get_topk"].rows == len(user_ids)
+    metrics = (
+        "eval_from_scores/eval_from_recs/metrics"
+        if backend == "pandas"
+        else "eval_from_scores/metrics"
+    )
+    for metric in ["recall@2", "ndcg@2", "recall@3", "ndcg@3"]:
+        assert stages[f"{metrics}/{metric}"].calls == 1
+    if backend == "pandas":
+        assert stages[f"{metrics}/hit_join"].calls == 1
+        assert stages[f"{metrics}/hit_count"].calls == 2
+    else:
+        assert stages["eval_from_scores/hit_matrix"].rows == len(user_ids)
+    assert {event.path for event in events} == set(stages)
+
+    # a new profile for each evaluation
+    results = evaluator.eval_from_scores(
+        scores, holdout_df, user_ids=user_ids, verbose=False
+    )
+    assert results.attrs["profile"] is not profile
+    assert results.attrs["profile"]["eval_from_scores"].calls == 1
+
+
+def test_evaluator_without_profile(dummy_userids_scores_holdout):
+    user_ids, scores, holdout_df = dummy_userids_scores_holdout
+    evaluator = RecEvaluator(["recall"], [3])
+    results = evaluator.eval_from_scores(
+        scores, holdout_df, user_ids=user_ids, verbose=False
+    )
+    assert "profile" not in results.attrs
+
+    # evaluations within an active profile are collected into it
+    with profiled() as profile:
+        evaluator.eval_from_scores(scores, holdout_df, user_ids=user_ids, verbose=False)
+        evaluator.eval_from_scores(scores, holdout_df, user_ids=user_ids, verbose=False)
+    assert profile["eval_from_scores"].calls == 2
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from recval.stats import (
+    bootstrap_ci,
+    bootstrap_means,
+    bootstrap_weights,
+    paired_bootstrap_test,
+    paired_ttest,
+    wilcoxon_test,
+)
+
+
+@pytest.mark.parametrize("method", ["poisson", "multinomial"])
+def test_bootstrap_weights(method):
+    weights = bootstrap_weights(1000, 200, method=method, rng=np.random.default_rng(0))
+    assert weights.shape == (200, 1000)
+    # every user is drawn once on average, with unit variance
+    assert weights.mean() == pytest.approx(1.0, abs=0.01)
+    assert weights.var() == pytest.approx(1.0, abs=0.02)
+    if method == "multinomial":
+        assert (weights.sum(axis=1) == 1000).all()
+
+
+def test_bootstrap_weights_invalid_method():
+    with pytest.raises(ValueError):
+        bootstrap_weights(10, 10, method="jackknife")
+
+
+@pytest.mark.parametrize("method", ["poisson", "multinomial"])
+def test_bootstrap_means(method):
+    values = np.random.default_rng(0).random((500, 3))
+    means = bootstrap_means(values, n_resamples=300, method=method, seed=1)
+    assert means.shape == (300, 3)
+    assert means.mean(axis=0) == pytest.approx(values.mean(axis=0), abs=0.01)
+    # standard error of the mean
+    assert means.std(axis=0) == pytest.approx(
+        values.std(axis=0) / np.sqrt(len(values)), rel=0.2
+    )
+    # same seed, same resamples, whatever the number of threads
+    np.testing.assert_array_equal(
+        means,
+        bootstrap_means(values, n_resamples=300, method=method, seed=1, n_threads=4),
+    )
+
+
+def test_bootstrap_ci():
+    values = np.random.default_rng(0).random((500, 2))
+    low, high = bootstrap_ci(values, n_resamples=200)
+    assert (low < values.mean(axis=0)).all() and (values.mean(axis=0) < high).all()
+    with pytest.raises(ValueError):
+        bootstrap_ci(values, n_resamples=200, confidence=1.5)
+
+
+def test_paired_ttest():
+    diff = np.array([[1.0, 2.0, 3.0, 4.0, 5.0], [0.0] * 5]).T
+    p_values = paired_ttest(diff)
+    # t = 4.2426 with 4 degrees of freedom
+    assert p_values[0] == pytest.approx(0.0132356, rel=1e-5)
+    assert np.isnan(p_values[1])
+    # a small statistic, t = 0.3105 with 4 degrees of freedom
+    assert paired_ttest(np.array([[1.0, 2.0, -1.0, 0.5, -1.5]]).T)[0] == pytest.approx(
+        0.7717151, rel=1e-5
+    )
+    # a null mean difference, and a constant one without variance
+    p_values = paired_ttest(np.array([[1.0, -1.0, 1.0, -1.0], [2.0] * 4]).T)
+    np.testing.assert_array_equal(p_values, [1.0, 0.0])
+
+
+def test_wilcoxon_test():
+    diff = np.array([[1.0, 2.0, 3.0, 4.0, 5.0], [0.0] * 5, [1, -1, 2, -2, 0]]).T
+    p_values = wilcoxon_test(diff)
+    # W+ = 15 with 5 differences
+    assert p_values[0] == pytest.approx(0.0431144, rel=1e-5)
+    assert np.isnan(p_values[1])
+    # symmetric differences, with ties and a zero
+    assert p_values[2] == pytest.approx(1.0)
+
+
+def test_paired_bootstrap_test():
+    rng = np.random.default_rng(0)
+    diff = np.stack([rng.normal(0.5, 1, 400), rng.normal(0, 1, 400)], axis=1)
+    p_values = paired_bootstrap_test(diff, n_resamples=500)
+    assert p_values[0] == pytest.approx(1 / 501)
+    assert p_values[1] > 0.05
@@ -4,7 +4,7 @@ import pytest
 from hypothesis import given
 from hypothesis.extra.numpy import arrays
 
-from recval.utils import get_topk, numba_get_topk
+from recval.utils import TopkEngine, get_topk, numba_get_topk, select_topk_engine
 
 
 @given(
@@ -39,3 +39,219 @@ def test_get_topk_scores_wrong_shape():
     scores = np.random.rand(10, 10, 10)
     with pytest.raises(ValueError):
         get_topk(scores, k=1)
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+@pytest.mark.parametrize("k", [0, 7])
+def test_get_topk_k_out_of_range(make_csr, engine, k):
+    rng = np.random.default_rng(0)
+    scores = rng.random((4, 6))
+    exclude = make_csr(rng.random((4, 6)) < 0.5)
+    with pytest.raises(ValueError, match="ranked items: 6"):
+        get_topk(scores, k=k, engine=engine)
+    with pytest.raises(ValueError, match="ranked items: 6"):
+        get_topk(scores, k=k, engine=engine, exclude=exclude)
+    # candidates narrow the ranked items to the candidates of each row
+    candidates = np.tile(np.array([0, 2, 4]), (4, 1))
+    for kwargs in [{}, {"exclude": exclude}]:
+        with pytest.raises(ValueError, match="ranked items: 3"):
+            get_topk(scores, k=4, engine=engine, candidates=candidates, **kwargs)
+    with pytest.raises(ValueError):
+        numba_get_topk(scores, k=k)
+
+
+@pytest.mark.parametrize("block_bytes", [8, 100, 2**20])
+def test_get_topk_memmap(tmp_path, monkeypatch, block_bytes):
+    monkeypatch.setattr("recval.utils.MMAP_BLOCK_BYTES", block_bytes)
+    scores = np.random.default_rng(0).random((13, 7))
+    scores_path = tmp_path / "scores.npy"
+    np.save(scores_path, scores)
+
+    expected_items, expected_scores = get_topk(scores, k=3)
+    for scores_mmap in [
+        scores_path,
+        str(scores_path),
+        np.load(scores_path, mmap_mode="r"),
+    ]:
+        top_items, top_scores = get_topk(scores_mmap, k=3)
+        assert (top_items == expected_items).all()
+        assert (top_scores == expected_scores).all()
+
+
+@given(
+    scores=arrays(np.float_, elements=st.integers(-3, 3).map(float), shape=(4, 9)),
+    k=st.integers(1, 9),
+)
+def test_get_topk_tie_order(scores, k):
+    # ties are broken by increasing item index, as a stable sort would do
+    top_items, top_scores = get_topk(scores, k)
+    expected_items = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    assert (top_items == expected_items).all()
+    assert (top_scores == np.take_along_axis(scores, expected_items, axis=1)).all()
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("k", [1, 4, 20])
+def test_get_topk_numba_engine(dtype, k):
+    scores = np.random.default_rng(0).integers(0, 5, size=(30, 20)).astype(dtype)
+    expected_items, expected_scores = get_topk(scores, k, engine="numpy")
+    top_items, top_scores = get_topk(scores, k, engine="numba")
+    assert (top_items == expected_items).all()
+    assert (top_scores == expected_scores).all()
+    assert top_scores.dtype == expected_scores.dtype == dtype
+
+
+def test_get_topk_auto_engine():
+    scores = np.random.default_rng(0).random((6, 10))
+    expected_items, _ = get_topk(scores, k=3)
+    top_items, _ = get_topk(scores, k=3, engine="auto")
+    assert (top_items == expected_items).all()
+    with pytest.raises(ValueError):
+        get_topk(scores, k=3, engine="torch")
+
+
+def test_select_topk_engine(monkeypatch):
+    assert select_topk_engine(n_users=10, n_items=100, k=10) == TopkEngine.NUMPY
+    monkeypatch.setattr("recval.utils.numba.get_num_threads", lambda: 1)
+    assert select_topk_engine(10_000, 10_000, k=100) == TopkEngine.NUMBA
+    assert select_topk_engine(10_000, 10_000, k=1_000) == TopkEngine.NUMPY
+    monkeypatch.setattr("recval.utils.numba.get_num_threads", lambda: 8)
+    assert select_topk_engine(10_000, 10_000, k=1_000) == TopkEngine.NUMBA
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+def test_get_topk_out_buffers(monkeypatch, engine):
+    # force several tiles of rows
+    monkeypatch.setattr("recval.utils.TOPK_TILE_BYTES", 100)
+    scores = np.random.default_rng(0).random((11, 6)).astype(np.float32)
+    expected_items, expected_scores = get_topk(scores, k=3)
+
+    out = (np.full((11, 3), -1, dtype=np.int32), np.zeros((11, 3), dtype=np.float32))
+    top_items, top_scores = get_topk(scores, k=3, engine=engine, out=out)
+    assert top_items is out[0] and top_scores is out[1]
+    assert (out[0] == expected_items).all()
+    assert (out[1] == expected_scores).all()
+
+
+def test_get_topk_compact_items():
+    scores = np.random.default_rng(0).random((5, 6)).astype(np.float32)
+    top_items, top_scores = get_topk(scores, k=3)
+    assert top_items.dtype == np.int32
+    assert top_scores.dtype == np.float32
+    candidates = np.tile(np.arange(6, dtype=np.int64), (5, 1))
+    assert get_topk(scores, k=3, candidates=candidates)[0].dtype == np.int64
+
+
+def test_get_topk_out_buffers_wrong_shape():
+    scores = np.random.default_rng(0).random((5, 6))
+    out = (np.empty((5, 2), dtype=np.int64), np.empty((5, 3)))
+    with pytest.raises(ValueError):
+        get_topk(scores, k=3, out=out)
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_get_topk_exclude(monkeypatch, make_csr, engine, shuffle):
+    monkeypatch.setattr("recval.utils.TOPK_TILE_BYTES", 200)
+    rng = np.random.default_rng(0)
+    scores = rng.random((12, 15))
+    mask = rng.random((12, 15)) < 0.3
+    scores_copy = scores.copy()
+
+    top_items, top_scores = get_topk(
+        scores, k=5, engine=engine, exclude=make_csr(mask, shuffle=shuffle)
+    )
+    expected_items, expected_scores = get_topk(np.where(mask, -np.inf, scores), k=5)
+    assert (top_items == expected_items).all()
+    assert (top_scores == expected_scores).all()
+    assert not np.take_along_axis(mask, top_items, axis=1).any()
+    # the score matrix is left untouched
+    assert (scores == scores_copy).all()
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+def test_get_topk_exclude_integer_scores(make_csr, engine):
+    rng = np.random.default_rng(0)
+    # integer scores without ties, excluded items take the lowest integer
+    scores = rng.permuted(np.tile(np.arange(15, dtype=np.int32), (6, 1)), axis=1)
+    mask = rng.random((6, 15)) < 0.3
+    top_items, top_scores = get_topk(scores, k=5, engine=engine, exclude=make_csr(mask))
+    expected_items, _ = get_topk(np.where(mask, -1, scores), k=5)
+    assert (top_items == expected_items).all()
+    assert top_scores.dtype == np.int32
+    assert not np.take_along_axis(mask, top_items, axis=1).any()
+
+
+def test_get_topk_exclude_wrong_shape(make_csr):
+    scores = np.random.default_rng(0).random((5, 6))
+    with pytest.raises(ValueError):
+        get_topk(scores, k=3, exclude=make_csr(np.ones((4, 6), dtype=bool)))
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+def test_get_topk_candidates(monkeypatch, make_csr, engine):
+    monkeypatch.setattr("recval.utils.MMAP_BLOCK_BYTES", 100)
+    rng = np.random.default_rng(0)
+    scores = rng.random((9, 30))
+    candidates = np.stack([rng.choice(30, size=8, replace=False) for _ in range(9)])
+    # the last user has only 6 candidates
+    candidates[-1, -2:] = -1
+
+    # ranking the candidates equals ranking a full matrix where the other items are masked
+    masked_scores = np.full_like(scores, -np.inf)
+    valid = candidates >= 0
+    rows = np.repeat(np.arange(9), valid.sum(axis=1))
+    masked_scores[rows, candidates[valid]] = scores[rows, candidates[valid]]
+    expected_items, expected_scores = get_topk(masked_scores, k=4)
+
+    aligned_scores = np.take_along_axis(scores, np.maximum(candidates, 0), axis=1)
+    for cand_scores, candidate_scores in [(scores, False), (aligned_scores, True)]:
+        top_items, top_scores = get_topk(
+            cand_scores,
+            k=4,
+            engine=engine,
+            candidates=candidates,
+            candidate_scores=candidate_scores,
+        )
+        assert (top_items == expected_items).all()
+        assert (top_scores == expected_scores).all()
+
+    # exclusions apply to candidate items
+    exclude = rng.random((9, 30)) < 0.3
+    expected_items, _ = get_topk(np.where(exclude, -np.inf, masked_scores), k=4)
+    top_items, _ = get_topk(
+        aligned_scores,
+        k=4,
+        engine=engine,
+        candidates=candidates,
+        candidate_scores=True,
+        exclude=make_csr(exclude),
+    )
+    assert (top_items == expected_items).all()
+
+
+def test_get_topk_candidates_padding():
+    scores = np.array([[0.3, 0.2, 0.0]])
+    candidates = np.array([[5, 7, -1]])
+    top_items, _ = get_topk(scores, k=3, candidates=candidates, candidate_scores=True)
+    assert (top_items == np.array([[5, 7, -1]])).all()
+    with pytest.raises(ValueError):
+        get_topk(scores, k=1, candidates=np.array([[1, 2, 3], [1, 2, 3]]))
+    for cand in [None, candidates[:, :2]]:
+        with pytest.raises(ValueError, match="shape of candidates"):
+            get_topk(scores, k=1, candidates=cand, candidate_scores=True)
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+def test_get_topk_candidates_full_scores_same_shape(engine):
+    # as many candidates as items, the full score matrix has the shape of candidates
+    rng = np.random.default_rng(3)
+    scores = rng.random((6, 5))
+    candidates = np.stack([rng.permutation(5) for _ in range(6)])
+    candidates[:, -1] = -1
+    top_items, top_scores = get_topk(scores, k=4, engine=engine, candidates=candidates)
+    expected_scores = -np.sort(-np.take_along_axis(scores, candidates[:, :4], axis=1))
+    np.testing.assert_array_equal(top_scores, expected_scores)
+    np.testing.assert_array_equal(
+        top_scores, np.take_along_axis(scores, top_items, axis=1)
+    )